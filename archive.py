@@ -0,0 +1,402 @@
+# Game Archive - compiled games packed into fixed-width move codes, read back through mmap
+'''
+Every parsed move is packed into one 32-bit code:
+    bits  0-1   kind: 0 castle, 1 piece move, 2 pawn move, 3 not compiled
+    bits  2-7   target square (a1 = 0 ... h8 = 63)
+    bits  8-10  piece (piece moves) or promotion piece (pawn moves), 1-5 = NBRQK
+    bits 11-12  disambig: 0 none, 1 file, 2 rank, 3 square (pawn moves: the capturing file)
+    bits 13-18  disambig value (file, rank or square index)
+    bit  19     capture
+    bit  20     check
+    bit  21     checkmate
+    bit  22     queenside castle
+    bits 23-28  origin square, when resolved on a board
+    bit  29     origin present
+Moves that did not compile keep their text in the extras section, the
+code then holds the extra's index in bits 2-31.
+
+File layout, all integers little-endian and every section 8-byte aligned:
+    header      magic, version, game and move counts, section offsets
+    moves       uint32 codes of every game, back to back
+    index       uint64 first move of every game, plus the total
+    results     uint8 result code of every game
+    tags        JSON object of every game's tag pairs, back to back
+    tag index   uint64 byte offset of every game's tags, plus the end
+    extras      text of the moves that did not compile, back to back
+    extra index uint64 byte offset of every extra, plus the end
+
+Build and inspect an archive with:
+    python archive.py build games.pgn games.chsa [--resolve]
+    python archive.py show games.chsa GAME
+'''
+import argparse
+import json
+import mmap
+import shutil
+import struct
+import sys
+import tempfile
+from array import array
+
+from ast_nodes import CastleNode, PieceMoveNode, PawnMoveNode, GameNode
+from pipeline import compile_move, read_pgn_games, resolve_moves
+
+MAGIC = b'CHESSARC'
+ARCHIVE_VERSION = 1
+# magic, version, games, moves, then the offsets of moves, index, results, tags, tag index, extras, extra index
+HEADER = struct.Struct('<8sIIQQ7Q')
+
+KIND_CASTLE, KIND_PIECE, KIND_PAWN, KIND_EXTRA = range(4)
+PIECE_CODES = {'N': 1, 'B': 2, 'R': 3, 'Q': 4, 'K': 5}
+PIECE_LETTERS = ' NBRQK'
+RESULT_CODES = {None: 0, '1-0': 1, '0-1': 2, '1/2-1/2': 3, '*': 4}
+RESULTS = [None, '1-0', '0-1', '1/2-1/2', '*']
+
+FILES = 'abcdefgh'
+RANKS = '12345678'
+SQUARE_NAMES = [file + rank for rank in RANKS for file in FILES]
+SQUARE_INDEX = {name: index for index, name in enumerate(SQUARE_NAMES)}
+
+CAPTURE_BIT   = 1 << 19
+CHECK_BIT     = 1 << 20
+CHECKMATE_BIT = 1 << 21
+QUEENSIDE_BIT = 1 << 22
+ORIGIN_BIT    = 1 << 29
+
+
+def encode_disambig(disambig):
+    if not disambig:
+        return 0
+    if len(disambig) == 2:
+        return (3 << 11) | (SQUARE_INDEX[disambig] << 13)
+    if disambig in FILES:
+        return (1 << 11) | (FILES.index(disambig) << 13)
+    return (2 << 11) | (RANKS.index(disambig) << 13)
+
+
+def decode_disambig(code):
+    kind = (code >> 11) & 3
+    value = (code >> 13) & 63
+    if kind == 0:
+        return None
+    if kind == 1:
+        return FILES[value]
+    if kind == 2:
+        return RANKS[value]
+    return SQUARE_NAMES[value]
+
+
+def encode_move(node):
+    """Packs a move node into its 32-bit code"""
+    code = 0
+    if node.check:
+        code |= CHECK_BIT
+    if node.checkmate:
+        code |= CHECKMATE_BIT
+    
+    if isinstance(node, CastleNode):
+        if node.side == "queen":
+            code |= QUEENSIDE_BIT
+        return code | KIND_CASTLE
+    
+    code |= SQUARE_INDEX[node.square] << 2
+    if node.capture:
+        code |= CAPTURE_BIT
+    if node.origin:
+        code |= ORIGIN_BIT | (SQUARE_INDEX[node.origin] << 23)
+    
+    if isinstance(node, PieceMoveNode):
+        return code | KIND_PIECE | (PIECE_CODES[node.piece] << 8) | encode_disambig(node.disambig)
+    if isinstance(node, PawnMoveNode):
+        if node.promotion:
+            code |= PIECE_CODES[node.promotion] << 8
+        return code | KIND_PAWN | encode_disambig(node.file)
+    raise ValueError(f"Invalid AST node type: {type(node)}")
+
+
+def decode_move(code):
+    """Unpacks a move code into a new node, codes of moves that did not compile are not accepted"""
+    kind = code & 3
+    check = bool(code & CHECK_BIT)
+    checkmate = bool(code & CHECKMATE_BIT)
+    if kind == KIND_CASTLE:
+        return CastleNode("queen" if code & QUEENSIDE_BIT else "king", check, checkmate)
+    
+    square = SQUARE_NAMES[(code >> 2) & 63]
+    capture = bool(code & CAPTURE_BIT)
+    origin = SQUARE_NAMES[(code >> 23) & 63] if code & ORIGIN_BIT else None
+    piece = PIECE_LETTERS[(code >> 8) & 7]
+    
+    if kind == KIND_PIECE:
+        return PieceMoveNode(piece, square, decode_disambig(code), capture, check, checkmate, origin)
+    if kind == KIND_PAWN:
+        promotion = piece if piece != ' ' else None
+        return PawnMoveNode(square, decode_disambig(code), capture, promotion, check, checkmate, origin)
+    raise ValueError(f"Move code {code:#x} holds a move that did not compile")
+
+
+def to_san(node):
+    """SAN text of a move node, the inverse of Lexer → Parser"""
+    suffix = '#' if node.checkmate else '+' if node.check else ''
+    if isinstance(node, CastleNode):
+        return ('O-O-O' if node.side == "queen" else 'O-O') + suffix
+    capture = 'x' if node.capture else ''
+    if isinstance(node, PieceMoveNode):
+        return f"{node.piece}{node.disambig or ''}{capture}{node.square}{suffix}"
+    promotion = f"={node.promotion}" if node.promotion else ''
+    return f"{node.file or ''}{capture}{node.square}{promotion}{suffix}"
+
+
+def padding(length):
+    return b'\0' * (-length % 8)
+
+
+class ArchiveWriter:
+    """Streams games into an archive, only the per-game index entries are kept in memory"""
+    def __init__(self, path, resolve=False):
+        self.path = path
+        self.resolve = resolve      # store origin squares, replaying every game on a board
+        self.file = open(path, 'wb')
+        self.file.write(b'\0' * HEADER.size)
+        
+        self.index = array('Q', [0])
+        self.results = array('B')
+        self.tag_index = array('Q', [0])
+        self.extra_index = array('Q', [0])
+        # variable-length sections are spooled until the moves section is complete
+        self.tags = tempfile.TemporaryFile()
+        self.extras = tempfile.TemporaryFile()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, *exc_info):
+        if exc_type is None:
+            self.close()
+        else:
+            self.file.close()
+            self.tags.close()
+            self.extras.close()
+    
+    def encodeMoves(self, moves, fen=None):
+        """Codes of a game's SAN moves, moves that do not compile go to the extras"""
+        if self.resolve:
+            nodes = resolve_moves(moves, fen)
+        else:
+            nodes = []
+            for move_notation in moves:
+                try:
+                    nodes.append(compile_move(move_notation).ast)
+                except Exception as e:
+                    nodes.append(e)
+        
+        codes = array('I')
+        for move_notation, node in zip(moves, nodes):
+            if isinstance(node, Exception):
+                # illegal or invalid moves keep their text
+                text = move_notation.encode('utf-8')
+                codes.append(KIND_EXTRA | ((len(self.extra_index) - 1) << 2))
+                self.extras.write(text)
+                self.extra_index.append(self.extra_index[-1] + len(text))
+            else:
+                codes.append(encode_move(node))
+        return codes
+    
+    def addGame(self, game):
+        """Appends a GameNode (headers, SAN moves and result)"""
+        codes = self.encodeMoves(game.moves, game.headers.get('FEN'))
+        if sys.byteorder == 'big':
+            codes.byteswap()
+        codes.tofile(self.file)
+        self.index.append(self.index[-1] + len(codes))
+        self.results.append(RESULT_CODES.get(game.result, 0))
+        
+        tags = json.dumps(game.headers, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        self.tags.write(tags)
+        self.tag_index.append(self.tag_index[-1] + len(tags))
+    
+    def writeSection(self, data):
+        """Writes bytes or a spooled file at the next aligned offset, returns the offset"""
+        self.file.write(padding(self.file.tell()))
+        offset = self.file.tell()
+        if isinstance(data, array):
+            if sys.byteorder == 'big':
+                data = array(data.typecode, data)
+                data.byteswap()
+            data.tofile(self.file)
+        elif isinstance(data, bytes):
+            self.file.write(data)
+        else:
+            data.seek(0)
+            shutil.copyfileobj(data, self.file)
+        return offset
+    
+    def close(self):
+        moves_offset = HEADER.size
+        offsets = [moves_offset]
+        for section in (self.index, self.results.tobytes(), self.tags, self.tag_index, self.extras,
+                        self.extra_index):
+            offsets.append(self.writeSection(section))
+        
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, ARCHIVE_VERSION, 0, len(self.results), self.index[-1], *offsets))
+        self.file.close()
+        self.tags.close()
+        self.extras.close()
+
+
+class ArchiveReader:
+    """Random access to the games of an archive, nothing is decoded until asked for"""
+    def __init__(self, path):
+        self.path = path
+        self.data = None
+        self.file = open(path, 'rb')
+        try:
+            # an empty file cannot be mapped
+            if self.file.seek(0, 2) < HEADER.size:
+                self.raiseError("not a game archive")
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.readHeader()
+        except BaseException:
+            # the caller never gets the reader, nothing else could close them
+            self.close()
+            raise
+    
+    def readHeader(self):
+        magic, version, _, self.games, self.moves, *offsets = HEADER.unpack_from(self.data)
+        if magic != MAGIC:
+            self.raiseError("not a game archive")
+        if version != ARCHIVE_VERSION:
+            self.raiseError(f"archive version {version}, expected {ARCHIVE_VERSION}")
+        (self.moves_offset, self.index_offset, self.results_offset, self.tags_offset,
+         self.tag_index_offset, self.extras_offset, self.extra_index_offset) = offsets
+        if not self.sectionsFit(offsets):
+            self.raiseError("truncated or corrupt archive")
+    
+    def sectionsFit(self, offsets):
+        """Whether the sections come in order and fill the file, the extra index runs to its end"""
+        extra_index_bytes = len(self.data) - self.extra_index_offset
+        if (offsets != sorted(offsets) or extra_index_bytes < 8 or extra_index_bytes % 8
+                or self.moves_offset + self.moves * 4 > self.index_offset
+                or self.index_offset + (self.games + 1) * 8 > self.results_offset
+                or self.tag_index_offset + (self.games + 1) * 8 > self.extras_offset):
+            return False
+        # the last entry is the end of the extras, only zero padding lies between them and the index
+        extras_end = self.extras_offset + self.entry(self.extra_index_offset, extra_index_bytes // 8 - 1)
+        return (self.extra_index_offset - 8 < extras_end <= self.extra_index_offset
+                and not self.data[extras_end:self.extra_index_offset].strip(b'\0'))
+    
+    def raiseError(self, message):
+        raise ValueError(f"{self.path}: {message}")
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def close(self):
+        if self.data is not None:
+            self.data.close()
+        self.file.close()
+    
+    def gameCount(self):
+        return self.games
+    
+    def moveCount(self):
+        return self.moves
+    
+    def entry(self, offset, index):
+        """One uint64 of an index section"""
+        return struct.unpack_from('<Q', self.data, offset + index * 8)[0]
+    
+    def checkGame(self, game):
+        if not 0 <= game < self.games:
+            raise IndexError(f"game {game} out of range, the archive holds {self.games} games")
+    
+    def gameMoveRange(self, game):
+        """Global index of the first move of a game and of the move after its last"""
+        self.checkGame(game)
+        return self.entry(self.index_offset, game), self.entry(self.index_offset, game + 1)
+    
+    def codes(self, start, stop):
+        """Move codes start..stop-1 across the whole archive"""
+        start = max(start, 0)
+        stop = min(stop, self.moves)
+        codes = array('I')
+        if start < stop:
+            codes.frombytes(self.data[self.moves_offset + start * 4:self.moves_offset + stop * 4])
+            if sys.byteorder == 'big':
+                codes.byteswap()
+        return codes
+    
+    def extra(self, index):
+        start = self.entry(self.extra_index_offset, index)
+        stop = self.entry(self.extra_index_offset, index + 1)
+        return self.data[self.extras_offset + start:self.extras_offset + stop].decode('utf-8')
+    
+    def nodes(self, start, stop):
+        """Move nodes start..stop-1, moves that did not compile come back as their SAN text"""
+        return [self.extra(code >> 2) if code & 3 == KIND_EXTRA else decode_move(code)
+                for code in self.codes(start, stop)]
+    
+    def gameNodes(self, game):
+        return self.nodes(*self.gameMoveRange(game))
+    
+    def headers(self, game):
+        self.checkGame(game)
+        start = self.entry(self.tag_index_offset, game)
+        stop = self.entry(self.tag_index_offset, game + 1)
+        return json.loads(self.data[self.tags_offset + start:self.tags_offset + stop].decode('utf-8'))
+    
+    def result(self, game):
+        self.checkGame(game)
+        return RESULTS[self.data[self.results_offset + game]]
+    
+    def game(self, game):
+        """The game as a GameNode with SAN moves, ready for the pipeline again"""
+        moves = [node if isinstance(node, str) else to_san(node) for node in self.gameNodes(game)]
+        return GameNode(self.headers(game), moves, self.result(game))
+
+
+def build_archive(pgn_filename, archive_path, resolve=False):
+    """Compiles every game of a PGN file into an archive, returns the number of games"""
+    with ArchiveWriter(archive_path, resolve) as writer:
+        for game in read_pgn_games(pgn_filename, keep_annotations=False):
+            writer.addGame(game)
+        return len(writer.results)
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(prog="archive.py", description="Build or read a binary game archive.")
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="compile a PGN file into an archive")
+    build.add_argument("pgn")
+    build.add_argument("archive")
+    build.add_argument("--resolve", action="store_true", help="store origin squares (replays every game)")
+    show = commands.add_parser("show", help="print one game of an archive")
+    show.add_argument("archive")
+    show.add_argument("game", type=int, help="game number, starting at 1")
+    args = arg_parser.parse_args(argv)
+    
+    try:
+        if args.command == "build":
+            games = build_archive(args.pgn, args.archive, args.resolve)
+            print(f"Wrote {games} games to {args.archive}")
+            return 0
+        
+        with ArchiveReader(args.archive) as reader:
+            game = reader.game(args.game - 1)
+    except (OSError, ValueError, SyntaxError, IndexError) as e:
+        # broken PGN, unreadable or broken archives, game numbers out of range
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    for name, value in game.headers.items():
+        print(f'[{name} "{value}"]')
+    print()
+    print(' '.join(game.moves + ([game.result] if game.result else [])))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
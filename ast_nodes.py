@@ -2,9 +2,12 @@
 
 class ChessASTNode:
     """Parent Node Class for all Chess AST nodes"""
+    # nodes use __slots__ instead of a per-instance __dict__
+    __slots__ = ()
+    
     def __repr__(self):
-        # build list of "attribute=value" strings for all instance variables
-        attribute_list = [f"{name}={value!r}" for name, value in self.__dict__.items()]
+        # build list of "attribute=value" strings for all slots
+        attribute_list = [f"{name}={getattr(self, name)!r}" for name in self.__slots__]
         
         # join with commas
         attributes_str = ', '.join(attribute_list)
@@ -16,11 +19,13 @@ class ChessASTNode:
 
 class MoveNode(ChessASTNode):
     """Parent Node class for all move types"""
-    pass
+    __slots__ = ()
 
 
 class CastleNode(MoveNode):
     """Represents a castling move"""
+    __slots__ = ('side', 'check', 'checkmate')
+    
     def __init__(self, side, check=False, checkmate=False):
         self.side = side  # "king" or "queen"
         self.check = check
@@ -29,21 +34,38 @@ class CastleNode(MoveNode):
 
 class PieceMoveNode(MoveNode):
     """Represents a piece move (Knight, Bishop, Rook, Queen, King)"""
-    def __init__(self, piece, square, disambig=None, capture=False, check=False, checkmate=False):
+    __slots__ = ('piece', 'square', 'disambig', 'capture', 'check', 'checkmate', 'origin')
+    
+    def __init__(self, piece, square, disambig=None, capture=False, check=False, checkmate=False, origin=None):
         self.piece = piece
         self.square = square
         self.disambig = disambig
         self.capture = capture
         self.check = check
         self.checkmate = checkmate
+        self.origin = origin  # square the piece moves from, set by board.Board
 
 
 class PawnMoveNode(MoveNode):
     """Represents a pawn move"""
-    def __init__(self, square, file=None, capture=False, promotion=None, check=False, checkmate=False):
+    __slots__ = ('square', 'file', 'capture', 'promotion', 'check', 'checkmate', 'origin')
+    
+    def __init__(self, square, file=None, capture=False, promotion=None, check=False, checkmate=False, origin=None):
         self.square = square
         self.file = file  # pawn captures (e.g., exd5)
         self.capture = capture
         self.promotion = promotion
         self.check = check
         self.checkmate = checkmate
+        self.origin = origin  # square the pawn moves from, set by board.Board
+
+
+class GameNode(ChessASTNode):
+    """Represents a whole game of a PGN database"""
+    __slots__ = ('headers', 'moves', 'result', 'annotations')
+    
+    def __init__(self, headers=None, moves=None, result=None, annotations=None):
+        self.headers = headers if headers is not None else {}  # tag pairs, e.g. {"White": "..."}
+        self.moves = moves if moves is not None else []        # SAN strings in playing order
+        self.result = result                                   # "1-0", "0-1", "1/2-1/2", "*" or None
+        self.annotations = annotations if annotations is not None else []  # (ply, comment/NAG/glyph)
@@ -0,0 +1,245 @@
+# Batch Compiler - Headless command line entry point (no tkinter required)
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+
+from parallel import ParallelCompiler, DEFAULT_CHUNK_SIZE
+from pipeline import (read_pgn_games, read_pgn_games_mapped, format_pgn_headers, format_pgn_output,
+                      set_cache_size, set_move_table, set_lexer, cache_stats,
+                      DEFAULT_CACHE_SIZE, DEFAULT_LEXER, PGN_BYTE_LEXER_NAMES)
+from move_table import LazyMoveTable, DEFAULT_TABLE_PATH
+from lexer import LEXERS
+from writers import WRITERS, EXTENSIONS, open_writer
+import metrics
+
+PGN_EXTENSIONS = ('.pgn', '.txt')
+
+
+def collect_files(paths):
+    """Expand files and directories into a sorted list of PGN files"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            # walk directories and keep only PGN/text files
+            found = []
+            for dirpath, dirnames, filenames in os.walk(path):
+                for name in filenames:
+                    if name.lower().endswith(PGN_EXTENSIONS):
+                        found.append(os.path.join(dirpath, name))
+            files.extend(sorted(found))
+        elif os.path.isfile(path):
+            files.append(path)
+        else:
+            raise FileNotFoundError(f"No such file or directory: {path}")
+    return files
+
+
+def output_path(output_dir, filename, extension=".out.txt"):
+    """Build the output file name for a compiled input file"""
+    base = os.path.splitext(os.path.basename(filename))[0]
+    return os.path.join(output_dir, f"{base}{extension}")
+
+
+def build_arg_parser():
+    arg_parser = argparse.ArgumentParser(
+        prog="batch.py",
+        description="Compile PGN files into natural language without the GUI."
+    )
+    arg_parser.add_argument("paths", nargs="+", help="PGN files or directories to compile")
+    arg_parser.add_argument("-m", "--mode", choices=["simple", "verbose"], default="simple",
+                            help="output mode (default: simple)")
+    arg_parser.add_argument("-f", "--format", choices=["text"] + sorted(WRITERS), default="text",
+                            help="text tables, or one record per move with its AST fields and both "
+                                 "translations as JSON lines, CSV or NumPy .npy columns (default: text)")
+    arg_parser.add_argument("-o", "--output-dir", default=None,
+                            help="write one <name>.out.txt (.jsonl, .csv, .columns/) per input here "
+                                 "instead of stdout")
+    arg_parser.add_argument("-j", "--workers", type=int, default=1,
+                            help="worker processes, 0 uses every core (default: 1)")
+    arg_parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                            help=f"games sent to a worker per task (default: {DEFAULT_CHUNK_SIZE})")
+    arg_parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE,
+                            help=f"distinct moves kept compiled, 0 disables the cache (default: {DEFAULT_CACHE_SIZE})")
+    arg_parser.add_argument("--lexer", choices=sorted(LEXERS), default=DEFAULT_LEXER,
+                            help=f"lexer implementation (default: {DEFAULT_LEXER})")
+    arg_parser.add_argument("--table", nargs="?", const=DEFAULT_TABLE_PATH, default=None, metavar="PATH",
+                            help="table mode, look moves up in the precompiled move table "
+                                 "(built on first use when PATH does not exist)")
+    arg_parser.add_argument("--mmap", nargs="?", const="regex", default=None, choices=PGN_BYTE_LEXER_NAMES,
+                            help="read input files through a memory map, lexing bytes and decoding only "
+                                 "tags, moves and results, numpy tokenizes whole windows at once (needs NumPy)")
+    arg_parser.add_argument("--resolve", action="store_true",
+                            help="replay every game on a board to name origin squares and flag illegal moves")
+    arg_parser.add_argument("--recover", action="store_true",
+                            help="bulk mode, collect lexer/parser errors as diagnostics instead of raising "
+                                 "them and summarize them at the end")
+    arg_parser.add_argument("--diagnostics", metavar="PATH", default=None,
+                            help="write every diagnostic here, - for stderr (implies --recover)")
+    arg_parser.add_argument("--metrics", metavar="PATH", default=None,
+                            help="record per-stage metrics and write them here when done, - for stderr "
+                                 "(only this process is recorded, use with -j 1)")
+    arg_parser.add_argument("--metrics-format", choices=["json", "prometheus"], default="json",
+                            help="format of the --metrics export (default: json)")
+    return arg_parser
+
+
+def write_metrics(path, metrics_format):
+    """Writes the metrics snapshot to a file or to stderr"""
+    if metrics_format == "prometheus":
+        text = metrics.export_prometheus()
+    else:
+        text = metrics.export_json() + '\n'
+    
+    if path == '-':
+        sys.stderr.write(text)
+    else:
+        with open(path, 'w') as f:
+            f.write(text)
+
+
+def read_games(filename, mapped=None):
+    """The games of an input file, read through a memory map with the PGN_BYTE_LEXER_NAMES lexer mapped names"""
+    if mapped:
+        return read_pgn_games_mapped(filename, keep_annotations=False, lexer=mapped)
+    return read_pgn_games(filename, keep_annotations=False)
+
+
+def write_text(compiler, filename, mode, output_dir=None, mapped=None):
+    """Compiles a file into the White | Black text output, returns (games, moves)"""
+    if output_dir:
+        out = open(output_path(output_dir, filename), 'w')
+    else:
+        out = sys.stdout
+        out.write(f"==> {filename} <==\n")
+    
+    games = 0
+    moves = 0
+    try:
+        # games are compiled and written as soon as the reader yields them
+        pgn_games = read_games(filename, mapped)
+        for game_number, (game, translations) in enumerate(compiler.compile(pgn_games, mode), start=1):
+            output = [f"Game {game_number}"]
+            output.extend(format_pgn_headers(game.headers))
+            output.extend(format_pgn_output(game.moves, mode, translations))
+            if game.result and 'Result' not in game.headers:
+                output.append(f"Result: {game.result}")
+            out.write('\n'.join(output) + '\n\n')
+            
+            games += 1
+            moves += len(game.moves)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return games, moves
+
+
+def write_records(compiler, filename, output_format, output_dir=None, mapped=None):
+    """Streams the move records of a file into a writer of output_format, returns (games, moves)"""
+    path = output_path(output_dir, filename, EXTENSIONS[output_format]) if output_dir else None
+    games = 0
+    moves = 0
+    with open_writer(output_format, path) as writer:
+        for game_number, (game, records) in enumerate(
+                compiler.compile(read_games(filename, mapped), "records"), start=1):
+            writer.writeGame(game_number, records)
+            games += 1
+            moves += len(records)
+    return games, moves
+
+
+def write_diagnostics(path, diagnostics):
+    """Writes one tab separated line per (file, game, Diagnostic) to a file or to stderr"""
+    lines = [f"{filename}\t{game}\t{diagnostic.ply}\t{diagnostic.stage}\t{diagnostic.message}\n"
+             for filename, game, diagnostic in diagnostics]
+    if path == '-':
+        sys.stderr.writelines(lines)
+    else:
+        with open(path, 'w') as f:
+            f.writelines(lines)
+
+
+def print_diagnostic_summary(diagnostics, top=10):
+    """Counts of the diagnostics by error category, on stderr"""
+    games = len({(filename, game) for filename, game, _ in diagnostics})
+    print(f"Diagnostics: {len(diagnostics)} errors in {games} games", file=sys.stderr)
+    categories = Counter((diagnostic.stage, metrics.error_category(diagnostic.message))
+                         for _, _, diagnostic in diagnostics)
+    for (stage, category), count in categories.most_common(top):
+        print(f"{count:>10}  {stage}: {category}", file=sys.stderr)
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    
+    try:
+        files = collect_files(args.paths)
+    except FileNotFoundError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    if args.format == "npy" and not args.output_dir:
+        print("Error: --format npy writes directories, use it with -o", file=sys.stderr)
+        return 2
+    if args.mmap == "numpy":
+        try:
+            from bulk_lexer import require_numpy    # NumPy is only loaded for this lexer
+            require_numpy()
+        except ImportError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 2
+    
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    
+    set_lexer(args.lexer)
+    set_cache_size(args.cache_size)
+    if args.table:
+        set_move_table(LazyMoveTable(args.table))
+    if args.metrics:
+        metrics.enable()
+    
+    total_moves = 0
+    total_games = 0
+    recover = args.recover or args.diagnostics is not None
+    diagnostics = []    # (file, game number, Diagnostic)
+    start = time.perf_counter()
+    
+    with ParallelCompiler(args.workers or None, args.chunk_size, args.cache_size, args.table,
+                          args.lexer, args.resolve, recover) as compiler:
+        for filename in files:
+            if args.format == "text":
+                games, moves = write_text(compiler, filename, args.mode, args.output_dir, args.mmap)
+            else:
+                # game numbers restart with every file, -o keeps the files apart
+                games, moves = write_records(compiler, filename, args.format, args.output_dir, args.mmap)
+            total_games += games
+            total_moves += moves
+            
+            diagnostics.extend((filename, game, diagnostic) for game, diagnostic in compiler.diagnostics)
+            compiler.diagnostics.clear()
+    
+    # throughput report goes to stderr so stdout stays clean for the translations
+    elapsed = time.perf_counter() - start
+    rate = elapsed if elapsed > 0 else float('inf')
+    print(f"Compiled {total_moves} moves in {total_games} games from {len(files)} files "
+          f"in {elapsed:.3f}s ({total_moves / rate:.1f} moves/sec, {total_games / rate:.1f} games/sec)",
+          file=sys.stderr)
+    
+    # worker processes keep their own caches, only in-process lookups show up here
+    stats = cache_stats()
+    if stats['hits'] + stats['misses']:
+        print(f"Cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.1%} hit rate), "
+              f"{stats['size']}/{stats['maxsize']} entries", file=sys.stderr)
+    
+    if recover:
+        print_diagnostic_summary(diagnostics)
+    if args.diagnostics:
+        write_diagnostics(args.diagnostics, diagnostics)
+    if args.metrics:
+        write_metrics(args.metrics, args.metrics_format)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,342 @@
+# Benchmarks - times every compiler stage on PGN files (defaults to the sample games)
+'''
+Stages:
+    lexer       Lexer.tokenize on every sampled move
+    bytelexer   ByteLexer.tokenize on the bytes of every sampled move
+    bulklexer   bulk_lexer's NumPy tokenizer on every file, PGN tokens then the SAN tokens of every move
+    parser      Parser.parse on the tokens of every sampled move
+    simple      CodeGen.generateSimple on every sampled AST node
+    verbose     CodeGen.generateVerbose on every sampled AST node
+    pgn         parse_pgn_file on every file
+    pgn_mmap    the same games read with read_pgn_games_mapped (bytes lexing over an mmap)
+    pgn_bulk    the same again with the NumPy lexer of read_pgn_games_mapped
+    pipeline    end to end: read games, compile both modes (cold cache), format the output
+
+The per-move stages run on a sample of the first --sample moves, the file
+stages (bulklexer too) on the whole files. Without NumPy bulklexer and
+pgn_bulk are left out of the defaults. Each stage reports the best of --repeat runs and,
+in one extra traced run, its peak memory.
+
+Benchmark a synthetic corpus and keep the results for later comparison:
+    python benchmark.py --generate 1M --json before.json
+    python benchmark.py --generate 1M --compare before.json
+'''
+import argparse
+import glob
+import json
+import mmap
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from lexer import Lexer, ByteLexer, LEXERS
+import bulk_lexer
+from parser import Parser
+from code_gen import CodeGen
+import pipeline
+from pipeline import (parse_pgn_file, read_pgn_games, read_pgn_games_mapped, compile_game_all,
+                      format_pgn_output)
+from synthetic import write_corpus, parse_size, DEFAULT_SEED
+
+SAMPLE_FILES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_files', '*.txt')
+
+STAGES = ('lexer', 'bytelexer', 'bulklexer', 'parser', 'simple', 'verbose', 'pgn', 'pgn_mmap', 'pgn_bulk', 'pipeline')
+NUMPY_STAGES = ('bulklexer', 'pgn_bulk')
+DEFAULT_STAGES = tuple(stage for stage in STAGES if bulk_lexer.np is not None or stage not in NUMPY_STAGES)
+DEFAULT_SAMPLE = 200000     # moves used by the per-move stages
+
+
+def time_lexer(lexer_class, moves, repeat):
+    """Best wall time of tokenizing every move, plus the number of tokens produced"""
+    best = float('inf')
+    token_count = 0
+    for _ in range(repeat):
+        token_count = 0
+        start = time.perf_counter()
+        for move in moves:
+            try:
+                token_count += len(lexer_class(move).tokenize())
+            except ValueError:
+                pass
+        best = min(best, time.perf_counter() - start)
+    return best, token_count
+
+
+def bench_lexers(moves, repeat=5):
+    """Compares every lexer implementation on the same moves"""
+    results = {}
+    for name, lexer_class in LEXERS.items():
+        results[name] = time_lexer(lexer_class, moves, repeat)
+    return results
+
+
+def bench_memory(moves):
+    """Bytes held by the tokens and AST nodes of every move, kept alive together"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    
+    token_lists = []
+    nodes = []
+    for move in moves:
+        try:
+            tokens = Lexer(move).tokenize()
+            nodes.append(Parser(tokens).parse())
+            token_lists.append(tokens)
+        except (ValueError, SyntaxError):
+            pass
+    
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return held, sum(len(tokens) for tokens in token_lists), len(nodes)
+
+
+def sample_moves(files, limit):
+    """The first limit moves of the files, without reading the rest"""
+    moves = []
+    for filename in files:
+        for game in read_pgn_games(filename, keep_annotations=False):
+            moves.extend(game.moves[:limit - len(moves)])
+            if len(moves) >= limit:
+                return moves
+    return moves
+
+
+def measure(run, repeat, memory=True):
+    """Best wall time of run() over repeat runs, its result, and its peak traced memory in bytes"""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run()
+        best = min(best, time.perf_counter() - start)
+    
+    peak = None
+    if memory:
+        tracemalloc.start()
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return best, result, peak
+
+
+def run_lexer(moves):
+    return [Lexer(move).tokenize() for move in moves]
+
+
+def run_byte_lexer(move_bytes):
+    return [ByteLexer(move).tokenize() for move in move_bytes]
+
+
+def run_parser(token_lists):
+    return [Parser(tokens).parse() for tokens in token_lists]
+
+
+def run_simple(nodes):
+    return [CodeGen(node).generateSimple() for node in nodes]
+
+
+def run_verbose(nodes):
+    return [CodeGen(node).generateVerbose() for node in nodes]
+
+
+def run_pgn(files):
+    return sum(len(parse_pgn_file(filename)) for filename in files)
+
+
+def run_pgn_mapped(files):
+    return sum(len(game.moves) for filename in files
+               for game in read_pgn_games_mapped(filename, keep_annotations=False))
+
+
+def run_pgn_bulk(files):
+    return sum(len(game.moves) for filename in files
+               for game in read_pgn_games_mapped(filename, keep_annotations=False, lexer='numpy'))
+
+
+def run_bulk_lexer(files):
+    """PGN and SAN tokens of every file, returns the number of moves"""
+    moves = 0
+    for filename in files:
+        with open(filename, 'rb') as f:
+            if not f.seek(0, 2):
+                continue
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                tokens = bulk_lexer.tokenize_buffer(data)
+                moves += len(bulk_lexer.tokenize_moves(data, tokens)[1])
+    return moves
+
+
+def run_pipeline(files):
+    """Read, compile and format every game the way batch.py does, starting from a cold cache"""
+    pipeline.compile_cache.clear()
+    moves = 0
+    for filename in files:
+        for game in read_pgn_games(filename, keep_annotations=False):
+            translations = compile_game_all(game.moves)
+            format_pgn_output(game.moves, "simple", translations["simple"])
+            moves += len(game.moves)
+    return moves
+
+
+def valid_moves(moves):
+    """Splits the sample into moves the compiler accepts and the number it rejects"""
+    valid = []
+    for move in moves:
+        try:
+            Parser(Lexer(move).tokenize()).parse()
+            valid.append(move)
+        except (ValueError, SyntaxError):
+            pass
+    return valid, len(moves) - len(valid)
+
+
+def bench_stages(files, stages=DEFAULT_STAGES, sample=DEFAULT_SAMPLE, repeat=5, memory=True):
+    """Times each stage, returns {stage: {"seconds", "moves", "tokens", "moves_per_sec", ...}}"""
+    moves, rejected = valid_moves(sample_moves(files, sample))
+    token_lists = run_lexer(moves)
+    nodes = run_parser(token_lists)
+    token_count = sum(len(tokens) for tokens in token_lists)
+    
+    move_bytes = [move.encode() for move in moves]
+    
+    per_move = {
+        'lexer':   lambda: run_lexer(moves),
+        'bytelexer': lambda: run_byte_lexer(move_bytes),
+        'parser':  lambda: run_parser(token_lists),
+        'simple':  lambda: run_simple(nodes),
+        'verbose': lambda: run_verbose(nodes),
+    }
+    
+    results = {}
+    for stage in stages:
+        if stage in per_move:
+            seconds, _, peak = measure(per_move[stage], repeat, memory)
+            move_count = len(moves)
+            tokens = token_count
+        else:
+            run = {'pgn': run_pgn, 'pgn_mmap': run_pgn_mapped, 'pgn_bulk': run_pgn_bulk,
+                   'bulklexer': run_bulk_lexer}.get(stage, run_pipeline)
+            seconds, move_count, peak = measure(lambda: run(files), repeat, memory)
+            tokens = None
+        
+        results[stage] = {
+            'seconds': seconds,
+            'moves': move_count,
+            'moves_per_sec': move_count / seconds if seconds else 0.0,
+            'tokens': tokens,
+            'tokens_per_sec': tokens / seconds if tokens and seconds else None,
+            'peak_bytes': peak,
+        }
+    return results, rejected
+
+
+def git_commit():
+    """Commit of the working tree, so saved results can be told apart"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_stages(results, previous=None):
+    header = f"{'Stage':<10} {'Seconds':>10} {'Moves/sec':>12} {'Tokens/sec':>12} {'Peak KiB':>10}"
+    if previous:
+        header += f" {'vs saved':>9}"
+    print(header)
+    for stage, result in results.items():
+        tokens_per_sec = f"{result['tokens_per_sec']:>12.0f}" if result['tokens_per_sec'] else f"{'-':>12}"
+        peak = f"{result['peak_bytes'] / 1024:>10.1f}" if result['peak_bytes'] is not None else f"{'-':>10}"
+        line = f"{stage:<10} {result['seconds']:>10.4f} {result['moves_per_sec']:>12.0f} {tokens_per_sec} {peak}"
+        if previous and stage in previous:
+            # speedup in moves/sec, so runs over different corpus sizes still compare
+            line += f" {result['moves_per_sec'] / previous[stage]['moves_per_sec']:>8.2f}x"
+        print(line)
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(prog="benchmark.py", description="Benchmark the compiler stages.")
+    arg_parser.add_argument("files", nargs="*", help="PGN files to use (default: test_files/*.txt)")
+    arg_parser.add_argument("-r", "--repeat", type=int, default=5, help="runs per measurement, best is kept")
+    arg_parser.add_argument("-g", "--generate", type=parse_size, metavar="MOVES",
+                            help="benchmark a synthetic corpus of this many moves instead, accepts k/M/G suffixes")
+    arg_parser.add_argument("-s", "--seed", type=int, default=DEFAULT_SEED, help="seed of the synthetic corpus")
+    arg_parser.add_argument("--sample", type=parse_size, default=DEFAULT_SAMPLE,
+                            help=f"moves used by the per-move stages (default: {DEFAULT_SAMPLE})")
+    arg_parser.add_argument("--stages", default=",".join(DEFAULT_STAGES),
+                            help=f"comma-separated stages to run (default: {','.join(DEFAULT_STAGES)})")
+    arg_parser.add_argument("--no-memory", action="store_true", help="skip the traced peak memory runs")
+    arg_parser.add_argument("--json", metavar="PATH", help="save the results as JSON")
+    arg_parser.add_argument("--compare", metavar="PATH", help="show speedups against results saved with --json")
+    args = arg_parser.parse_args(argv)
+    
+    stages = [stage for stage in args.stages.split(",") if stage]
+    unknown = [stage for stage in stages if stage not in STAGES]
+    if unknown:
+        arg_parser.error(f"unknown stages: {', '.join(unknown)}")
+    if bulk_lexer.np is None and any(stage in NUMPY_STAGES for stage in stages):
+        arg_parser.error(f"stages {', '.join(NUMPY_STAGES)} need NumPy")
+    
+    corpus = None
+    if args.generate:
+        corpus = tempfile.NamedTemporaryFile('w', suffix='.pgn', delete=False)
+        with corpus:
+            games, generated = write_corpus(corpus, args.generate, args.seed)
+        print(f"Generated {games} games, {generated} moves (seed {args.seed})")
+        files = [corpus.name]
+    else:
+        files = args.files or sorted(glob.glob(SAMPLE_FILES))
+    
+    try:
+        moves = sample_moves(files, args.sample)
+        print(f"{len(moves)} sampled moves from {len(files)} files, best of {args.repeat} runs")
+        print()
+        
+        results = bench_lexers(moves, args.repeat)
+        baseline = results['classic'][0]
+        print(f"{'Lexer':<10} {'Seconds':>10} {'Moves/sec':>12} {'Tokens/sec':>12} {'Speedup':>8}")
+        for name, (seconds, token_count) in results.items():
+            print(f"{name:<10} {seconds:>10.4f} {len(moves) / seconds:>12.0f} {token_count / seconds:>12.0f} "
+                  f"{baseline / seconds:>7.2f}x")
+        
+        held, token_count, node_count = bench_memory(moves)
+        print()
+        print(f"Memory held by {token_count} tokens and {node_count} AST nodes: "
+              f"{held / 1024:.1f} KiB ({held / max(node_count, 1):.1f} bytes per move)")
+        
+        stage_results, rejected = bench_stages(files, stages, args.sample, args.repeat, not args.no_memory)
+    finally:
+        if corpus is not None:
+            os.unlink(corpus.name)
+    
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)['stages']
+    
+    print()
+    if rejected:
+        print(f"{rejected} sampled moves rejected by the compiler, left out of the per-move stages")
+    print_stages(stage_results, previous)
+    
+    if args.json:
+        report = {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'files': [] if args.generate else [os.path.basename(filename) for filename in files],
+            'generated_moves': args.generate,
+            'seed': args.seed if args.generate else None,
+            'repeat': args.repeat,
+            'stages': stage_results,
+        }
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
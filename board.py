@@ -0,0 +1,388 @@
+# Board - bitboard position tracking, the semantic stage between Parser and CodeGen
+'''
+A position is one 64-bit integer per side and piece type (bit 0 = a1,
+bit 63 = h8) plus a square → piece array for captures. Knight, king and
+pawn attacks come from tables built once at import; sliding attacks walk
+precomputed rays and stop at the first blocker found with a single bit
+scan, so no square-by-square loops run while a game is replayed.
+
+Board.play(node) takes a parsed move in the current position and returns
+the same move with its origin square filled in, or raises ValueError when
+no piece can make the move ("Illegal move: ...") or more than one can
+("Ambiguous move: ..."). Check and checkmate suffixes are not verified.
+
+Board.hash is the Zobrist hash of the position (pieces, side to move,
+castling rights and an en passant square a pawn can actually capture on),
+updated incrementally by every move. The keys come from a fixed seed, so
+hashes are stable across runs and can be stored on disk.
+'''
+import random
+
+from ast_nodes import CastleNode, PieceMoveNode, PawnMoveNode
+from code_gen import PIECE_NAMES
+
+WHITE, BLACK = 0, 1
+FILES = 'abcdefgh'
+RANKS = '12345678'
+
+SQUARE_NAMES = [file + rank for rank in RANKS for file in FILES]
+SQUARE_INDEX = {name: index for index, name in enumerate(SQUARE_NAMES)}
+FILE_MASKS = {file: sum(1 << (rank * 8 + index) for rank in range(8)) for index, file in enumerate(FILES)}
+RANK_MASKS = {rank: 0xFF << (index * 8) for index, rank in enumerate(RANKS)}
+
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+
+def step_table(steps):
+    """Bitboard of the squares one step away from every square, for leapers"""
+    table = []
+    for square in range(64):
+        file, rank = square % 8, square // 8
+        targets = 0
+        for file_step, rank_step in steps:
+            if 0 <= file + file_step < 8 and 0 <= rank + rank_step < 8:
+                targets |= 1 << (square + rank_step * 8 + file_step)
+        table.append(targets)
+    return table
+
+
+def ray_table(file_step, rank_step):
+    """Bitboard of every square in one direction from every square, up to the edge"""
+    table = []
+    for square in range(64):
+        file, rank = square % 8 + file_step, square // 8 + rank_step
+        ray = 0
+        while 0 <= file < 8 and 0 <= rank < 8:
+            ray |= 1 << (rank * 8 + file)
+            file += file_step
+            rank += rank_step
+        table.append(ray)
+    return table
+
+
+KNIGHT_ATTACKS = step_table([(1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2)])
+KING_ATTACKS = step_table([(1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)])
+PAWN_ATTACKS = (step_table([(-1, 1), (1, 1)]), step_table([(-1, -1), (1, -1)]))  # by color
+
+# (ray table, True when the ray goes towards higher squares), the nearest blocker is then the lowest bit
+ROOK_RAYS = ((ray_table(0, 1), True), (ray_table(1, 0), True), (ray_table(0, -1), False), (ray_table(-1, 0), False))
+BISHOP_RAYS = ((ray_table(1, 1), True), (ray_table(-1, 1), True), (ray_table(1, -1), False), (ray_table(-1, -1), False))
+
+# castling: (right, king from, king to, rook from, rook to, squares that must be empty, squares not attacked)
+CASTLES = {
+    (WHITE, 'king'):  ('K', 4, 6, 7, 5, (5, 6), (4, 5, 6)),
+    (WHITE, 'queen'): ('Q', 4, 2, 0, 3, (1, 2, 3), (4, 3, 2)),
+    (BLACK, 'king'):  ('k', 60, 62, 63, 61, (61, 62), (60, 61, 62)),
+    (BLACK, 'queen'): ('q', 60, 58, 56, 59, (57, 58, 59), (60, 59, 58)),
+}
+# castling rights lost when a piece leaves or a rook is captured on these squares
+CASTLING_SQUARES = {4: {'K', 'Q'}, 7: {'K'}, 0: {'Q'}, 60: {'k', 'q'}, 63: {'k'}, 56: {'q'}}
+
+# Zobrist keys, a fixed seed keeps stored hashes valid between runs
+ZOBRIST_SEED = 0x5EED_C4E5
+_keys = random.Random(ZOBRIST_SEED)
+PIECE_KEYS = tuple({piece: [_keys.getrandbits(64) for _ in range(64)] for piece in 'PNBRQK'} for _ in range(2))
+CASTLING_KEYS = {right: _keys.getrandbits(64) for right in 'KQkq'}
+EN_PASSANT_KEYS = [_keys.getrandbits(64) for _ in range(8)]   # by file
+BLACK_TO_MOVE_KEY = _keys.getrandbits(64)
+del _keys
+
+
+def slider_attacks(square, occupied, rays):
+    attacks = 0
+    for table, ascending in rays:
+        ray = table[square]
+        blockers = ray & occupied
+        if blockers:
+            if ascending:
+                blocker = (blockers & -blockers).bit_length() - 1
+            else:
+                blocker = blockers.bit_length() - 1
+            # squares behind the blocker are not attacked
+            ray ^= table[blocker]
+        attacks |= ray
+    return attacks
+
+
+def squares_of(bitboard):
+    """Indexes of the set bits, lowest first"""
+    squares = []
+    while bitboard:
+        low = bitboard & -bitboard
+        squares.append(low.bit_length() - 1)
+        bitboard ^= low
+    return squares
+
+
+class Board:
+    def __init__(self, fen=None):
+        self.pieces = ({piece: 0 for piece in 'PNBRQK'}, {piece: 0 for piece in 'PNBRQK'})  # by color
+        self.occupied = [0, 0]
+        self.squares = [None] * 64      # piece letter on every square
+        self.turn = WHITE
+        self.castling = set()
+        self.en_passant = None          # square a pawn can capture onto this move
+        self.hash = 0                   # Zobrist hash of the position
+        self.loadFEN(fen or START_FEN)
+    
+    def raiseError(self, message):
+        raise ValueError(message)
+    
+    def loadFEN(self, fen):
+        fields = fen.split()
+        if len(fields) < 2:
+            self.raiseError(f"Invalid FEN: {fen}")
+        
+        rows = fields[0].split('/')
+        if len(rows) != 8:
+            self.raiseError(f"Invalid FEN: {fen}")
+        for row_index, row in enumerate(rows):
+            file = 0
+            for char in row:
+                if char.isdigit():
+                    file += int(char)
+                    continue
+                if char.upper() not in 'PNBRQK' or file > 7:
+                    self.raiseError(f"Invalid FEN: {fen}")
+                color = WHITE if char.isupper() else BLACK
+                self.put(color, char.upper(), (7 - row_index) * 8 + file)
+                file += 1
+        
+        self.turn = WHITE if fields[1] == 'w' else BLACK
+        self.castling = set(fields[2]) & set(CASTLING_KEYS) if len(fields) > 2 else set()
+        self.en_passant = SQUARE_INDEX.get(fields[3]) if len(fields) > 3 else None
+        self.hash = self.computeHash()
+    
+    def enPassantKey(self):
+        """Key of the en passant square, only when a pawn of the side to move can capture there"""
+        if self.en_passant is None:
+            return 0
+        if PAWN_ATTACKS[1 - self.turn][self.en_passant] & self.pieces[self.turn]['P']:
+            return EN_PASSANT_KEYS[self.en_passant % 8]
+        return 0
+    
+    def computeHash(self):
+        """Zobrist hash of the position from scratch, play() keeps self.hash up to date incrementally"""
+        value = 0
+        for square, piece in enumerate(self.squares):
+            if piece is not None:
+                color = WHITE if self.occupied[WHITE] & (1 << square) else BLACK
+                value ^= PIECE_KEYS[color][piece][square]
+        for right in self.castling:
+            value ^= CASTLING_KEYS[right]
+        if self.turn == BLACK:
+            value ^= BLACK_TO_MOVE_KEY
+        return value ^ self.enPassantKey()
+    
+    def loseCastling(self, rights):
+        lost = self.castling & rights
+        if lost:
+            self.castling -= lost
+            for right in lost:
+                self.hash ^= CASTLING_KEYS[right]
+    
+    def put(self, color, piece, square):
+        bit = 1 << square
+        self.pieces[color][piece] |= bit
+        self.occupied[color] |= bit
+        self.squares[square] = piece
+        self.hash ^= PIECE_KEYS[color][piece][square]
+    
+    def remove(self, color, piece, square):
+        bit = 1 << square
+        self.pieces[color][piece] &= ~bit
+        self.occupied[color] &= ~bit
+        self.squares[square] = None
+        self.hash ^= PIECE_KEYS[color][piece][square]
+    
+    def attackers(self, piece, square, occupied):
+        """Squares a piece of this type would attack square from, attacks are symmetric"""
+        if piece == 'N':
+            return KNIGHT_ATTACKS[square]
+        if piece == 'K':
+            return KING_ATTACKS[square]
+        if piece == 'B':
+            return slider_attacks(square, occupied, BISHOP_RAYS)
+        if piece == 'R':
+            return slider_attacks(square, occupied, ROOK_RAYS)
+        return slider_attacks(square, occupied, BISHOP_RAYS) | slider_attacks(square, occupied, ROOK_RAYS)
+    
+    def isAttacked(self, square, by, occupied, removed=0):
+        """Whether side by attacks square, with removed (a bitboard) taken off the board"""
+        pieces = self.pieces[by]
+        keep = ~removed
+        if PAWN_ATTACKS[1 - by][square] & pieces['P'] & keep:
+            return True
+        if KNIGHT_ATTACKS[square] & pieces['N'] & keep:
+            return True
+        if KING_ATTACKS[square] & pieces['K'] & keep:
+            return True
+        diagonal = (pieces['B'] | pieces['Q']) & keep
+        if diagonal and slider_attacks(square, occupied, BISHOP_RAYS) & diagonal:
+            return True
+        straight = (pieces['R'] | pieces['Q']) & keep
+        return bool(straight and slider_attacks(square, occupied, ROOK_RAYS) & straight)
+    
+    def leavesKingSafe(self, piece, origin, target, captured=None):
+        """Whether moving piece from origin to target (capturing on captured) keeps our king out of check"""
+        us = self.turn
+        occupied = (self.occupied[0] | self.occupied[1]) & ~(1 << origin) | (1 << target)
+        removed = 0
+        if captured is not None:
+            removed = 1 << captured
+            if captured != target:
+                # en passant, the captured pawn leaves its own square
+                occupied &= ~removed
+        
+        if piece == 'K':
+            king = target
+        elif self.pieces[us]['K']:
+            king = (self.pieces[us]['K'] & -self.pieces[us]['K']).bit_length() - 1
+        else:
+            # positions without a king (e.g. from a FEN study) have nothing to keep safe
+            return True
+        return not self.isAttacked(king, 1 - us, occupied, removed)
+    
+    def checkTarget(self, target, capture):
+        """The capture flag has to match what stands on the target square"""
+        square = SQUARE_NAMES[target]
+        bit = 1 << target
+        if self.occupied[self.turn] & bit:
+            self.raiseError(f"Illegal move: own piece on {square}")
+        if capture and not self.occupied[1 - self.turn] & bit:
+            self.raiseError(f"Illegal move: nothing to capture on {square}")
+        if not capture and self.occupied[1 - self.turn] & bit:
+            self.raiseError(f"Illegal move: capture on {square} is not marked")
+    
+    def resolvePieceMove(self, node):
+        """Origin square of a piece move, exactly one piece must be able to make it"""
+        target = SQUARE_INDEX[node.square]
+        self.checkTarget(target, node.capture)
+        
+        occupied = self.occupied[0] | self.occupied[1]
+        candidates = self.attackers(node.piece, target, occupied) & self.pieces[self.turn][node.piece]
+        if node.disambig:
+            if len(node.disambig) == 2:
+                candidates &= 1 << SQUARE_INDEX[node.disambig]
+            elif node.disambig in FILE_MASKS:
+                candidates &= FILE_MASKS[node.disambig]
+            else:
+                candidates &= RANK_MASKS[node.disambig]
+        
+        captured = target if node.capture else None
+        origins = [origin for origin in squares_of(candidates)
+                   if self.leavesKingSafe(node.piece, origin, target, captured)]
+        piece_name = PIECE_NAMES[node.piece]
+        if not origins:
+            self.raiseError(f"Illegal move: no {piece_name} can reach {node.square}")
+        if len(origins) > 1:
+            squares = ' and '.join(SQUARE_NAMES[origin] for origin in origins)
+            self.raiseError(f"Ambiguous move: {piece_name}s on {squares} can reach {node.square}")
+        return origins[0]
+    
+    def resolvePawnMove(self, node):
+        """Origin square and captured square (None for pushes) of a pawn move"""
+        us = self.turn
+        target = SQUARE_INDEX[node.square]
+        forward = 8 if us == WHITE else -8
+        pawns = self.pieces[us]['P']
+        last_rank = '8' if us == WHITE else '1'
+        
+        if (node.square[1] == last_rank) != bool(node.promotion):
+            if node.promotion:
+                self.raiseError(f"Illegal move: pawn cannot promote on {node.square}")
+            self.raiseError(f"Illegal move: pawn reaching {node.square} must promote")
+        if node.promotion == 'K':
+            self.raiseError("Illegal move: pawn cannot promote to King")
+        
+        if node.capture or (node.file and node.file != node.square[0]):
+            # capture, the origin is on the given file one rank behind the target
+            if not node.file or abs(FILES.index(node.file) - FILES.index(node.square[0])) != 1:
+                self.raiseError(f"Illegal move: no pawn can capture on {node.square}")
+            origin = SQUARE_INDEX[node.file + node.square[1]] - forward
+            if not 0 <= origin < 64 or not pawns & (1 << origin):
+                self.raiseError(f"Illegal move: no pawn on {node.file}-file can capture on {node.square}")
+            if target == self.en_passant and not (self.occupied[0] | self.occupied[1]) & (1 << target):
+                captured = target - forward
+            else:
+                self.checkTarget(target, True)
+                captured = target
+        else:
+            self.checkTarget(target, False)
+            occupied = self.occupied[0] | self.occupied[1]
+            origin = target - forward
+            captured = None
+            if not 0 <= origin < 64:
+                self.raiseError(f"Illegal move: no pawn can reach {node.square}")
+            # a double step from the starting rank needs the square in between empty
+            double_rank = '4' if us == WHITE else '5'
+            if (not pawns & (1 << origin) and node.square[1] == double_rank
+                    and not occupied & (1 << origin) and pawns & (1 << (origin - forward))):
+                origin -= forward
+            if not pawns & (1 << origin):
+                self.raiseError(f"Illegal move: no pawn can reach {node.square}")
+        
+        if not self.leavesKingSafe('P', origin, target, captured):
+            self.raiseError(f"Illegal move: pawn to {node.square} leaves the king in check")
+        return origin, captured
+    
+    def castle(self, node):
+        us = self.turn
+        right, king_from, king_to, rook_from, rook_to, empty, safe = CASTLES[us, node.side]
+        if right not in self.castling:
+            self.raiseError(f"Illegal move: cannot castle {node.side}side")
+        occupied = self.occupied[0] | self.occupied[1]
+        if any(occupied & (1 << square) for square in empty):
+            self.raiseError(f"Illegal move: cannot castle {node.side}side through pieces")
+        if any(self.isAttacked(square, 1 - us, occupied) for square in safe):
+            self.raiseError(f"Illegal move: cannot castle {node.side}side through check")
+        
+        self.remove(us, 'K', king_from)
+        self.remove(us, 'R', rook_from)
+        self.put(us, 'K', king_to)
+        self.put(us, 'R', rook_to)
+        self.loseCastling({'K', 'Q'} if us == WHITE else {'k', 'q'})
+    
+    def move(self, piece, origin, target, captured=None, promotion=None):
+        """Applies an already validated move for the side to move"""
+        us, them = self.turn, 1 - self.turn
+        if captured is not None:
+            self.remove(them, self.squares[captured], captured)
+        self.remove(us, piece, origin)
+        self.put(us, promotion or piece, target)
+        
+        if self.castling:
+            for square in (origin, target):
+                if square in CASTLING_SQUARES:
+                    self.loseCastling(CASTLING_SQUARES[square])
+    
+    def play(self, node):
+        """Plays a parsed move, returns the node with its origin square resolved (castles as they are)"""
+        # the en passant key of the previous move goes away with it
+        previous_en_passant_key = self.enPassantKey()
+        en_passant = None
+        
+        if isinstance(node, CastleNode):
+            self.castle(node)
+            resolved = node
+        elif isinstance(node, PieceMoveNode):
+            origin = self.resolvePieceMove(node)
+            target = SQUARE_INDEX[node.square]
+            self.move(node.piece, origin, target, target if node.capture else None)
+            resolved = PieceMoveNode(node.piece, node.square, node.disambig, node.capture,
+                                     node.check, node.checkmate, SQUARE_NAMES[origin])
+        elif isinstance(node, PawnMoveNode):
+            origin, captured = self.resolvePawnMove(node)
+            target = SQUARE_INDEX[node.square]
+            self.move('P', origin, target, captured, node.promotion)
+            if abs(target - origin) == 16:
+                en_passant = (origin + target) // 2
+            resolved = PawnMoveNode(node.square, node.file, node.capture, node.promotion,
+                                    node.check, node.checkmate, SQUARE_NAMES[origin])
+        else:
+            self.raiseError(f"Invalid AST node type: {type(node)}")
+        
+        self.turn = 1 - self.turn
+        self.en_passant = en_passant
+        self.hash ^= previous_en_passant_key ^ BLACK_TO_MOVE_KEY ^ self.enPassantKey()
+        return resolved
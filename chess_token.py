@@ -0,0 +1,50 @@
+# Token Class for Lexical Analysis and Parsing
+from collections import namedtuple
+
+
+class Token:
+    __slots__ = ('type', 'content')
+    
+    def __init__(self, type, content):
+        self.type = type
+        self.content = content
+    
+    def getType(self):
+        return self.type
+    
+    def getContent(self):
+        return self.content
+    
+    def __repr__(self):
+        return f"({self.type}, {self.content})"
+
+
+# The SAN token alphabet is finite, so every lexeme maps to one shared Token.
+# Interned tokens are shared by every token list, never modify them.
+EOF_TOKEN = Token('EOF', '')
+
+SAN_TOKENS = {}
+for _piece in 'KQBNR':
+    SAN_TOKENS[_piece] = Token('PIECE', _piece)
+for _file in 'abcdefgh':
+    SAN_TOKENS[_file] = Token('FILE', _file)
+    for _rank in '12345678':
+        SAN_TOKENS[_file + _rank] = Token('SQUARE', _file + _rank)
+for _rank in '12345678':
+    SAN_TOKENS[_rank] = Token('RANK', _rank)
+SAN_TOKENS['x']     = Token('CAPTURE', 'x')
+SAN_TOKENS['=']     = Token('PROMOTION_SYMBOL', '=')
+SAN_TOKENS['+']     = Token('CHECK', '+')
+SAN_TOKENS['#']     = Token('CHECKMATE', '#')
+SAN_TOKENS['O-O']   = Token('CASTLE_KINGSIDE', 'O-O')
+SAN_TOKENS['O-O-O'] = Token('CASTLE_QUEENSIDE', 'O-O-O')
+del _piece, _file, _rank
+
+# whole-game token streams (Lexer.tokenizeGame) also separate moves and carry the result
+SEPARATOR_TOKEN = Token('SEPARATOR', ' ')
+RESULT_TOKENS = {result: Token('RESULT', result) for result in ('1-0', '0-1', '1/2-1/2', '*')}
+
+# error report of the recovery mode of Lexer and Parser, collected instead of raised
+# stage is "lexer", "parser" or "board", message is the text the exception would carry
+# and ply (the move's place in its game, from 1) is filled in by the pipeline
+Diagnostic = namedtuple('Diagnostic', ['stage', 'position', 'message', 'ply'], defaults=[None])
@@ -1,18 +1,31 @@
 # Code Generator - Translates AST Nodes to Natural Language (English Sentences)
 from ast_nodes import CastleNode, PieceMoveNode, PawnMoveNode
 
+# piece names mapping
+PIECE_NAMES = {
+    'N': 'Knight',
+    'B': 'Bishop',
+    'R': 'Rook',
+    'Q': 'Queen',
+    'K': 'King'
+}
+
+# node type → generator method names, shared by CodeGen and Renderer
+SIMPLE_GENERATORS = {
+    CastleNode: 'generateCastleSimple',
+    PieceMoveNode: 'generatePieceMoveSimple',
+    PawnMoveNode: 'generatePawnMoveSimple',
+}
+VERBOSE_GENERATORS = {
+    CastleNode: 'generateCastleVerbose',
+    PieceMoveNode: 'generatePieceMoveVerbose',
+    PawnMoveNode: 'generatePawnMoveVerbose',
+}
+
 class CodeGen:
     def __init__(self, ast_node):
         self.ast_node = ast_node
-        
-        # piece names mapping
-        self.piece_names = {
-            'N': 'Knight',
-            'B': 'Bishop',
-            'R': 'Rook',
-            'Q': 'Queen',
-            'K': 'King'
-        }
+        self.piece_names = PIECE_NAMES
     
     def showAST(self):
         """Shows  AST in a readable format"""
@@ -29,6 +42,8 @@ class CodeGen:
             lines.append(f"  piece = {piece_name} (translated from {self.ast_node.piece})")
             lines.append(f"  square = {self.ast_node.square}")
             lines.append(f"  disambig = {self.ast_node.disambig}")
+            if self.ast_node.origin:
+                lines.append(f"  origin = {self.ast_node.origin}")
             lines.append(f"  capture = {self.ast_node.capture}")
             lines.append(f"  check = {self.ast_node.check}")
             lines.append(f"  checkmate = {self.ast_node.checkmate}")
@@ -36,6 +51,8 @@ class CodeGen:
         elif isinstance(self.ast_node, PawnMoveNode):
             lines.append(f"  square = {self.ast_node.square}")
             lines.append(f"  file = {self.ast_node.file}")
+            if self.ast_node.origin:
+                lines.append(f"  origin = {self.ast_node.origin}")
             lines.append(f"  capture = {self.ast_node.capture}")
             if self.ast_node.promotion:
                 piece_name = self.piece_names.get(self.ast_node.promotion, self.ast_node.promotion)
@@ -49,84 +66,63 @@ class CodeGen:
     
     def generateVerbose(self):
         """Generate detailed English description"""
-        if isinstance(self.ast_node, CastleNode):
-            return self.generateCastleVerbose(self.ast_node)
-        elif isinstance(self.ast_node, PieceMoveNode):
-            return self.generatePieceMoveVerbose(self.ast_node)
-        elif isinstance(self.ast_node, PawnMoveNode):
-            return self.generatePawnMoveVerbose(self.ast_node)
-        else:
+        generator = VERBOSE_GENERATORS.get(type(self.ast_node))
+        if generator is None:
             raise ValueError(f"Invalid AST node type: {type(self.ast_node)}")
+        return getattr(self, generator)(self.ast_node)
     
     def generateSimple(self):
         """Generate simple English sentence"""
-        if isinstance(self.ast_node, CastleNode):
-            return self.generateCastleSimple(self.ast_node)
-        elif isinstance(self.ast_node, PieceMoveNode):
-            return self.generatePieceMoveSimple(self.ast_node)
-        elif isinstance(self.ast_node, PawnMoveNode):
-            return self.generatePawnMoveSimple(self.ast_node)
-        else:
+        generator = SIMPLE_GENERATORS.get(type(self.ast_node))
+        if generator is None:
             raise ValueError(f"Invalid AST node type: {type(self.ast_node)}")
+        return getattr(self, generator)(self.ast_node)
     
     def generateCastleVerbose(self, node):
         """Generates detailed description for castling"""
-        parts = []
-        
         if node.side == "king":
-            parts.append("King castles on kingside")
+            sentence = "King castles on kingside"
         elif node.side == "queen":
-            parts.append("King castles on queenside")
-        
-        if node.checkmate:
-            parts.append("resulting in checkmate")
-        elif node.check:
-            parts.append("resulting in check")
+            sentence = "King castles on queenside"
+        else:
+            sentence = ""
         
-        return ', '.join(parts)
+        return self.addVerboseCheckSuffix(sentence, node.check, node.checkmate)
     
     def generatePieceMoveVerbose(self, node):
         """Generate detailed description for piece moves"""
-        parts = []
-        
         piece_name = self.piece_names.get(node.piece, node.piece)
-        parts.append(f"{piece_name} moves to {node.square}")
+        if node.origin:
+            sentence = f"{piece_name} moves from {node.origin} to {node.square}"
+        else:
+            sentence = f"{piece_name} moves to {node.square}"
         
-        if node.disambig:
-            parts.append(f"from {self.formatSquare(node.disambig)}")
+        if node.disambig and not node.origin:
+            sentence += f", from {self.formatSquare(node.disambig)}"
         
         if node.capture:
-            parts.append("captures")
-        
-        if node.checkmate:
-            parts.append("resulting in checkmate")
-        elif node.check:
-            parts.append("resulting in check")
+            sentence += ", captures"
         
-        return ', '.join(parts)
+        return self.addVerboseCheckSuffix(sentence, node.check, node.checkmate)
     
     def generatePawnMoveVerbose(self, node):
         """Generate detailed description for pawn moves"""
-        parts = []
-        
-        parts.append(f"Pawn moves to {node.square}")
+        if node.origin:
+            sentence = f"Pawn moves from {node.origin} to {node.square}"
+        else:
+            sentence = f"Pawn moves to {node.square}"
         
-        if node.file:
-            parts.append(f"from {node.file}-file")
+        if node.file and not node.origin:
+            sentence += f", from {node.file}-file"
         
         if node.capture:
-            parts.append("captures")
+            sentence += ", captures"
         
         if node.promotion:
             piece_name = self.piece_names.get(node.promotion, node.promotion)
-            parts.append(f"promotes to {piece_name}")
+            sentence += f", promotes to {piece_name}"
         
-        if node.checkmate:
-            parts.append("resulting in checkmate")
-        elif node.check:
-            parts.append("resulting in check")
-        
-        return ', '.join(parts)
+        return self.addVerboseCheckSuffix(sentence, node.check, node.checkmate)
     
     def generateCastleSimple(self, node):
         """Generate simple English for castling moves"""
@@ -147,8 +143,10 @@ class CodeGen:
         piece_name = self.piece_names.get(node.piece, node.piece)
         sentence = piece_name
         
-        # add disambig if available
-        if node.disambig:
+        # add origin (resolved on a board) or disambig if available
+        if node.origin:
+            sentence += f" from {node.origin}"
+        elif node.disambig:
             sentence += f" from {self.formatSquare(node.disambig)}"
         
         # add "capture" or "moves to"
@@ -165,8 +163,10 @@ class CodeGen:
         """Generate simple English for pawn moves"""
         sentence = "Pawn"
         
-        # add file for captures
-        if node.file:
+        # add origin (resolved on a board) or file for captures
+        if node.origin:
+            sentence += f" from {node.origin}"
+        elif node.file:
             sentence += f" on {node.file}-file"
         
         # add "captures" or "moves to"
@@ -199,6 +199,16 @@ class CodeGen:
         # full square notation
         return square
     
+    def addVerboseCheckSuffix(self, sentence, check, checkmate):
+        """Add verbose check or checkmate clause to sentence"""
+        separator = ", " if sentence else ""
+        if checkmate:
+            return sentence + separator + "resulting in checkmate"
+        elif check:
+            return sentence + separator + "resulting in check"
+        else:
+            return sentence
+    
     def addCheckSuffix(self, sentence, check, checkmate):
         """Add check or checkmate suffix to sentence"""
         if checkmate:
@@ -207,3 +217,49 @@ class CodeGen:
             return sentence + ", check"
         else:
             return sentence
+
+
+
+class Renderer:
+    """Stateless renderer, dispatches on node type through a table and renders whole lists of nodes"""
+    def __init__(self):
+        # generator methods never read ast_node, one shared CodeGen serves every node
+        codegen = CodeGen(None)
+        self.simple = {node_type: getattr(codegen, name) for node_type, name in SIMPLE_GENERATORS.items()}
+        self.verbose = {node_type: getattr(codegen, name) for node_type, name in VERBOSE_GENERATORS.items()}
+    
+    def generator(self, table, node):
+        generate = table.get(type(node))
+        if generate is None:
+            raise ValueError(f"Invalid AST node type: {type(node)}")
+        return generate
+    
+    def renderSimple(self, node):
+        return self.generator(self.simple, node)(node)
+    
+    def renderVerbose(self, node):
+        return self.generator(self.verbose, node)(node)
+    
+    def render(self, node):
+        """Renders both modes at once, returns (simple, verbose)"""
+        return self.generator(self.simple, node)(node), self.generator(self.verbose, node)(node)
+    
+    def renderAll(self, nodes, mode=None):
+        """Renders a list of nodes in one call, in one mode or (simple, verbose) pairs when mode is None"""
+        if mode == "simple":
+            return [self.renderSimple(node) for node in nodes]
+        if mode == "verbose":
+            return [self.renderVerbose(node) for node in nodes]
+        return [self.render(node) for node in nodes]
+
+    def renderColumns(self, columns, mode=None, start=0, stop=None):
+        """renderAll for rows start..stop-1 of a columnar.MoveColumns, None for moves that did not compile
+        
+        Rows are rendered through reused nodes (MoveColumns.rows), no node is built per move.
+        """
+        render = {"simple": self.renderSimple, "verbose": self.renderVerbose}.get(mode, self.render)
+        return [None if node is None else render(node) for node in columns.rows(start, stop)]
+
+
+# shared stateless renderer
+renderer = Renderer()
@@ -0,0 +1,378 @@
+# Columnar Moves - compiled moves stored as a struct of arrays, one fixed-width column per AST field
+'''
+A MoveColumns holds one row per move and one column per field of the move
+nodes, with the codes of the game archive (see archive.py):
+    kind            uint8   0 castle, 1 piece move, 2 pawn move, 3 not compiled
+    piece           uint8   moving piece, 1-5 = NBRQK, 0 for pawns and castles
+    square          int8    target square, a1 = 0 ... h8 = 63, -1 for castles
+    disambig_kind   uint8   0 none, 1 file, 2 rank, 3 square (pawn moves: the capturing file)
+    disambig        int8    file, rank or square index, -1 for none
+    capture         bool
+    promotion       uint8   promotion piece, 1-5 = NBRQK, 0 for none
+    check           bool
+    checkmate       bool
+    queenside       bool    queenside castle
+    origin          int8    square the piece moves from once resolved on a board, -1 for none
+Rows are grouped into games by game_starts, the first row of every game, so
+the same container holds a single game or a whole database.
+
+Columns are filled by appending: compile_columns parses every move with
+Parser(tokens, columns=...), which appends rows without building nodes.
+They come out as NumPy arrays, so aggregate questions are single
+vectorized expressions:
+    columns = compile_columns(read_pgn_games("games.pgn"))
+    captures = columns.array('capture').sum()
+    knight_squares = np.bincount(columns.array('square')[columns.array('piece') == 1], minlength=64)
+NumPy is only needed for array()/arrays(), filling, converting and rendering
+work without it.
+
+    python columnar.py games.pgn        # move counts and breakdowns of a database
+'''
+import argparse
+import sys
+from array import array
+
+try:
+    import numpy as np
+except ImportError:     # optional, only array() and arrays() need it
+    np = None
+
+from ast_nodes import CastleNode, PieceMoveNode, PawnMoveNode
+from archive import (KIND_CASTLE, KIND_PIECE, KIND_PAWN, KIND_EXTRA, PIECE_CODES, PIECE_LETTERS, FILES, RANKS,
+                     SQUARE_NAMES, SQUARE_INDEX)
+from parser import Parser
+import pipeline
+
+# column name, array typecode, NumPy dtype
+COLUMNS = (
+    ('kind', 'B', 'u1'),
+    ('piece', 'B', 'u1'),
+    ('square', 'b', 'i1'),
+    ('disambig_kind', 'B', 'u1'),
+    ('disambig', 'b', 'i1'),
+    ('capture', 'B', 'bool'),
+    ('promotion', 'B', 'u1'),
+    ('check', 'B', 'bool'),
+    ('checkmate', 'B', 'bool'),
+    ('queenside', 'B', 'bool'),
+    ('origin', 'b', 'i1'),
+)
+COLUMN_NAMES = tuple(name for name, _, _ in COLUMNS)
+COLUMN_DTYPES = {name: dtype for name, _, dtype in COLUMNS}
+
+DISAMBIG_NONE, DISAMBIG_FILE, DISAMBIG_RANK, DISAMBIG_SQUARE = range(4)
+DISAMBIG_NAMES = (None, FILES, RANKS, SQUARE_NAMES)   # disambig index → text, by disambig_kind
+KIND_NAMES = ('castle', 'piece', 'pawn', 'failed')
+
+FLUSH_ROWS = 4096       # appended rows buffered before they are moved into the columns
+MAX_ENCODED = 1 << 16   # distinct moves whose encoded row is remembered
+FAILED_ROW = (KIND_EXTRA, 0, -1, DISAMBIG_NONE, -1, False, 0, False, False, False, -1)
+
+
+def encode_disambig(disambig):
+    """(disambig_kind, disambig) of a disambiguation, or of a pawn's capturing file"""
+    if not disambig:
+        return DISAMBIG_NONE, -1
+    if len(disambig) == 2:
+        return DISAMBIG_SQUARE, SQUARE_INDEX[disambig]
+    if disambig in FILES:
+        return DISAMBIG_FILE, FILES.index(disambig)
+    return DISAMBIG_RANK, RANKS.index(disambig)
+
+
+# move fields → row values, games reuse a small vocabulary of moves
+encoded_rows = {}
+# SAN string → row values of the moves parse_moves has parsed
+parsed_rows = {}
+
+
+def encode_row(kind, piece, square, disambig, capture, promotion, check, checkmate, queenside, origin):
+    """Row values of a move, in COLUMNS order"""
+    key = (kind, piece, square, disambig, capture, promotion, check, checkmate, queenside, origin)
+    row = encoded_rows.get(key)
+    if row is None:
+        row = (kind, PIECE_CODES[piece] if piece else 0, SQUARE_INDEX[square] if square else -1,
+               *encode_disambig(disambig), bool(capture), PIECE_CODES[promotion] if promotion else 0, bool(check),
+               bool(checkmate), queenside, SQUARE_INDEX[origin] if origin else -1)
+        if len(encoded_rows) < MAX_ENCODED:
+            encoded_rows[key] = row
+    return row
+
+
+class MoveColumns:
+    def __init__(self):
+        self.data = {name: array(typecode) for name, typecode, _ in COLUMNS}
+        self.pending = []               # rows appended since the last flush, as tuples
+        self.game_starts = array('Q')   # first row of every game
+        self.cached = {}                # NumPy copies handed out since the last change
+    
+    def __len__(self):
+        return len(self.data['kind']) + len(self.pending)
+    
+    def flush(self):
+        """Moves the buffered rows into the columns"""
+        if self.pending:
+            for column, values in zip(self.data.values(), zip(*self.pending)):
+                column.extend(values)
+            self.pending = []
+    
+    def startGame(self):
+        """Rows appended from now on belong to a new game"""
+        self.game_starts.append(len(self))
+        self.cached.clear()
+    
+    def gameCount(self):
+        return len(self.game_starts)
+    
+    def gameRange(self, game):
+        """First row of a game and the row after its last"""
+        if not 0 <= game < len(self.game_starts):
+            raise IndexError(f"game {game} out of range, the columns hold {len(self.game_starts)} games")
+        stop = self.game_starts[game + 1] if game + 1 < len(self.game_starts) else len(self)
+        return self.game_starts[game], stop
+    
+    def appendRow(self, row):
+        """Appends a tuple of values in COLUMNS order, returns its row index"""
+        if not self.game_starts:
+            # rows before any startGame form the first game
+            self.game_starts.append(0)
+        pending = self.pending
+        pending.append(row)
+        if self.cached:
+            self.cached.clear()
+        index = len(self.data['kind']) + len(pending) - 1
+        if len(pending) >= FLUSH_ROWS:
+            self.flush()
+        return index
+    
+    def appendCastle(self, side, check=False, checkmate=False):
+        return self.appendRow(encode_row(KIND_CASTLE, None, None, None, False, None, check, checkmate,
+                                         side == "queen", None))
+    
+    def appendPieceMove(self, piece, square, disambig=None, capture=False, check=False, checkmate=False,
+                        origin=None):
+        return self.appendRow(encode_row(KIND_PIECE, piece, square, disambig, capture, None, check, checkmate,
+                                         False, origin))
+    
+    def appendPawnMove(self, square, file=None, capture=False, promotion=None, check=False, checkmate=False,
+                       origin=None):
+        return self.appendRow(encode_row(KIND_PAWN, None, square, file, capture, promotion, check, checkmate,
+                                         False, origin))
+    
+    def appendFailed(self):
+        """A row for a move that did not compile, so rows keep lining up with plies"""
+        return self.appendRow(FAILED_ROW)
+    
+    def appendNode(self, node):
+        """Appends a move node (None for a failed move), returns its row"""
+        if node is None:
+            return self.appendFailed()
+        if isinstance(node, CastleNode):
+            return self.appendCastle(node.side, node.check, node.checkmate)
+        if isinstance(node, PieceMoveNode):
+            return self.appendPieceMove(node.piece, node.square, node.disambig, node.capture, node.check,
+                                        node.checkmate, node.origin)
+        if isinstance(node, PawnMoveNode):
+            return self.appendPawnMove(node.square, node.file, node.capture, node.promotion, node.check,
+                                       node.checkmate, node.origin)
+        raise ValueError(f"Invalid AST node type: {type(node)}")
+    
+    def extend(self, nodes):
+        for node in nodes:
+            self.appendNode(node)
+    
+    def pop(self):
+        """Removes the last row"""
+        if self.pending:
+            self.pending.pop()
+        else:
+            for values in self.data.values():
+                values.pop()
+        self.cached.clear()
+    
+    def lastRow(self):
+        """Values of the last row appended, in COLUMNS order"""
+        if self.pending:
+            return self.pending[-1]
+        return self.row(len(self) - 1)
+    
+    def row(self, index):
+        """Values of a row, in COLUMNS order"""
+        self.flush()
+        return tuple(self.data[name][index] for name in COLUMN_NAMES)
+    
+    def fill(self, row, castle, piece_move, pawn_move):
+        """Sets the fields of the matching node of the three to a row, returns it (None for a failed move)"""
+        if self.pending:
+            self.flush()
+        data = self.data
+        kind = data['kind'][row]
+        if kind == KIND_EXTRA:
+            return None
+        check = bool(data['check'][row])
+        checkmate = bool(data['checkmate'][row])
+        if kind == KIND_CASTLE:
+            castle.side = "queen" if data['queenside'][row] else "king"
+            castle.check = check
+            castle.checkmate = checkmate
+            return castle
+        
+        node = piece_move if kind == KIND_PIECE else pawn_move
+        node.square = SQUARE_NAMES[data['square'][row]]
+        node.capture = bool(data['capture'][row])
+        node.check = check
+        node.checkmate = checkmate
+        origin = data['origin'][row]
+        node.origin = SQUARE_NAMES[origin] if origin >= 0 else None
+        disambig_kind = data['disambig_kind'][row]
+        disambig = DISAMBIG_NAMES[disambig_kind][data['disambig'][row]] if disambig_kind else None
+        if kind == KIND_PIECE:
+            node.piece = PIECE_LETTERS[data['piece'][row]]
+            node.disambig = disambig
+        else:
+            node.file = disambig
+            promotion = data['promotion'][row]
+            node.promotion = PIECE_LETTERS[promotion] if promotion else None
+        return node
+    
+    def node(self, row):
+        """A new move node of a row, None for a failed move"""
+        return self.fill(row, CastleNode(None), PieceMoveNode(None, None), PawnMoveNode(None))
+    
+    def nodes(self, start=0, stop=None):
+        """New move nodes of rows start..stop-1"""
+        return [self.node(row) for row in range(start, len(self) if stop is None else stop)]
+    
+    def gameNodes(self, game):
+        return self.nodes(*self.gameRange(game))
+    
+    def rows(self, start=0, stop=None):
+        """Rows start..stop-1 as move nodes, for rendering
+        
+        Three nodes are reused for every row, a node is only valid until
+        the next one is taken, never keep them.
+        """
+        castle, piece_move, pawn_move = CastleNode(None), PieceMoveNode(None, None), PawnMoveNode(None)
+        for row in range(start, len(self) if stop is None else stop):
+            yield self.fill(row, castle, piece_move, pawn_move)
+    
+    def array(self, name):
+        """A column as a NumPy array, shared by callers until the next change, treat it as read-only"""
+        if np is None:
+            raise ImportError("MoveColumns arrays need NumPy (pip install numpy)")
+        values = self.cached.get(name)
+        if values is None:
+            self.flush()
+            if name == 'game_starts':
+                values = np.array(self.game_starts, dtype=np.uint64)
+            else:
+                values = np.frombuffer(self.data[name].tobytes(), dtype=COLUMN_DTYPES[name])
+            self.cached[name] = values
+        return values
+    
+    def arrays(self):
+        """Every column and game_starts as NumPy arrays, e.g. for np.savez"""
+        arrays = {name: self.array(name) for name in COLUMN_NAMES}
+        arrays['game_starts'] = self.array('game_starts')
+        return arrays
+    
+    @classmethod
+    def fromArrays(cls, arrays):
+        """MoveColumns of the arrays of arrays() (or of an np.load of them)"""
+        columns = cls()
+        for name, typecode, dtype in COLUMNS:
+            columns.data[name].frombytes(np.ascontiguousarray(arrays[name], dtype=dtype).tobytes())
+        columns.game_starts.extend(int(start) for start in arrays['game_starts'])
+        lengths = {len(values) for values in columns.data.values()}
+        if len(lengths) > 1:
+            raise ValueError("columns of different lengths")
+        return columns
+    
+    def append(self, other):
+        """Appends every game of another MoveColumns"""
+        self.flush()
+        other.flush()
+        offset = len(self)
+        for name in COLUMN_NAMES:
+            self.data[name].extend(other.data[name])
+        self.game_starts.extend(start + offset for start in other.game_starts)
+        self.cached.clear()
+
+
+def parse_moves(moves, columns, diagnostics=None):
+    """Lexes and parses SAN moves straight into columns, a failed row for every move that does not parse
+    
+    No node is built. Every distinct move is parsed once, a repeated one
+    appends the row it gave the first time.
+    """
+    lexer_class = pipeline.lexer_class
+    append_row = columns.appendRow
+    for move_notation in moves:
+        row = parsed_rows.get(move_notation)
+        if row is not None:
+            append_row(row)
+            continue
+        try:
+            tokens = lexer_class(move_notation, diagnostics).tokenize()
+            index = Parser(tokens, diagnostics, columns).parse()
+        except (ValueError, SyntaxError):
+            index = None
+        if index is None:
+            columns.appendFailed()
+        elif len(parsed_rows) < MAX_ENCODED:
+            parsed_rows[move_notation] = columns.lastRow()
+    return columns
+
+
+def compile_columns(games, columns=None):
+    """Appends every game (GameNodes, e.g. of read_pgn_games) to columns, parsed straight into them"""
+    if columns is None:
+        columns = MoveColumns()
+    for game in games:
+        columns.startGame()
+        parse_moves(game.moves, columns)
+    return columns
+
+
+def summary(columns):
+    """Counts over a whole MoveColumns, every one a vectorized expression"""
+    kind = columns.array('kind')
+    piece = columns.array('piece')
+    square = columns.array('square')
+    square_counts = np.bincount(square[square >= 0], minlength=64)
+    return {
+        'games': columns.gameCount(),
+        'moves': len(kind),
+        'kinds': {name: int((kind == code).sum()) for code, name in enumerate(KIND_NAMES)},
+        'pieces': {letter: int(((kind == KIND_PIECE) & (piece == code)).sum()) for letter, code in PIECE_CODES.items()},
+        'captures': int(columns.array('capture').sum()),
+        'checks': int(columns.array('check').sum()),
+        'checkmates': int(columns.array('checkmate').sum()),
+        'promotions': int((columns.array('promotion') > 0).sum()),
+        'queenside_castles': int(columns.array('queenside').sum()),
+        'busiest_squares': [SQUARE_NAMES[index] for index in np.argsort(-square_counts, kind='stable')[:5]],
+    }
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(prog="columnar.py", description="Compile PGN files into move columns.")
+    arg_parser.add_argument("files", nargs="+", help="PGN files")
+    args = arg_parser.parse_args(argv)
+    
+    if np is None:
+        print("Error: columnar.py needs NumPy (pip install numpy)", file=sys.stderr)
+        return 1
+    columns = MoveColumns()
+    try:
+        for filename in args.files:
+            compile_columns(pipeline.read_pgn_games(filename, keep_annotations=False), columns)
+    except (OSError, ValueError, SyntaxError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    for name, value in summary(columns).items():
+        print(f"{name}: {value}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
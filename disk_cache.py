@@ -0,0 +1,366 @@
+# Disk Cache - compiled PGN files kept on disk between runs, keyed by content hash and compiler version
+'''
+Every cached file is stored as two entries named after its key:
+    <key>.chsa  the games compiled into a game archive (see archive.py)
+    <key>.pgi   the PGNIndex arrays, so the file never has to be scanned again
+The key hashes the file's content together with COMPILER_VERSION, a hash of
+the sources that decide what gets stored (lexers, parsers, AST, archive
+format). Editing the compiler therefore misses the old entries, which age
+out of the cache like any other.
+
+Hashing a multi-gigabyte file takes seconds, so the content hash of every
+file seen is remembered in files.json next to its size and mtime. Opening
+an unchanged file is then one stat, one small index read and one mmap.
+
+Entries are evicted least recently used first (the archive's mtime is
+touched on every hit) once the cache grows past its size limit.
+
+    python disk_cache.py build games.pgn
+    python disk_cache.py stats
+    python disk_cache.py clear
+'''
+import argparse
+import hashlib
+import json
+import os
+import signal
+import struct
+import sys
+import time
+from array import array
+
+from archive import ArchiveWriter, ArchiveReader
+from code_gen import renderer
+from pgn_index import PGNIndex
+from pipeline import compile_move, compile_game_all
+
+CACHE_VERSION = 1
+# modules whose source decides the stored bytes, any edit invalidates the cache
+SOURCE_MODULES = ('archive', 'ast_nodes', 'chess_token', 'lexer', 'parser', 'pgn_index', 'pgn_lexer',
+                  'pgn_parser', 'disk_cache')
+
+INDEX_MAGIC = b'CHESSPGI'
+INDEX_HEADER = struct.Struct('<8sIIQQ')   # magic, version, reserved, games, file size
+ARCHIVE_SUFFIX = '.chsa'
+INDEX_SUFFIX = '.pgi'
+FILES_NAME = 'files.json'
+
+HASH_CHUNK = 1 << 20
+DEFAULT_MAX_BYTES = 4 << 30
+DEFAULT_CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+                                 'chess_compiler')
+
+
+def compiler_version():
+    """Hash of the compiler sources and the cache layout version"""
+    digest = hashlib.blake2b(str(CACHE_VERSION).encode(), digest_size=8)
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for name in SOURCE_MODULES:
+        with open(os.path.join(directory, name + '.py'), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+COMPILER_VERSION = compiler_version()
+
+
+def content_hash(filename):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(filename, 'rb') as f:
+        while True:
+            chunk = f.read(HASH_CHUNK)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_stamp(filename):
+    """What has to stay the same for a remembered content hash to be trusted"""
+    stat = os.stat(filename)
+    return [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+
+
+def write_index(index, path):
+    """Writes the arrays of a complete PGNIndex"""
+    with open(path, 'wb') as f:
+        f.write(INDEX_HEADER.pack(INDEX_MAGIC, CACHE_VERSION, 0, index.gameCount(), index.size))
+        for values in (index.game_starts, index.game_ends, index.move_starts, index.tag_counts):
+            if sys.byteorder == 'big':
+                values = array(values.typecode, values)
+                values.byteswap()
+            values.tofile(f)
+
+
+def read_index(path, index):
+    """Fills a fresh PGNIndex with the arrays of write_index, returns it marked complete"""
+    with open(path, 'rb') as f:
+        header = f.read(INDEX_HEADER.size)
+        if len(header) < INDEX_HEADER.size:
+            raise ValueError(f"{path}: not a cached PGN index")
+        magic, version, _, games, size = INDEX_HEADER.unpack(header)
+        if magic != INDEX_MAGIC or version != CACHE_VERSION:
+            raise ValueError(f"{path}: not a cached PGN index")
+        if size != index.size:
+            raise ValueError(f"{path}: indexes a file of {size} bytes, not {index.size}")
+        
+        for values, count in ((index.game_starts, games), (index.game_ends, games),
+                              (index.move_starts, games + 1), (index.tag_counts, games)):
+            del values[:]
+            try:
+                values.fromfile(f, count)
+            except EOFError:
+                raise ValueError(f"{path}: truncated PGN index")
+            if sys.byteorder == 'big':
+                values.byteswap()
+    index.scan_pos = index.size
+    index.complete = True
+    return index
+
+
+def compile_nodes(nodes):
+    """Both translations of archived moves, only moves stored as text are compiled again"""
+    simple = []
+    verbose = []
+    for node in nodes:
+        if isinstance(node, str):
+            try:
+                compiled = compile_move(node)
+                simple.append(compiled.simple)
+                verbose.append(compiled.verbose)
+            except Exception as e:
+                error = f"Error: {str(e)}"
+                simple.append(error)
+                verbose.append(error)
+        else:
+            simple_text, verbose_text = renderer.render(node)
+            simple.append(simple_text)
+            verbose.append(verbose_text)
+    return {"simple": simple, "verbose": verbose}
+
+
+class CachedPGNIndex(PGNIndex):
+    """A PGNIndex loaded from the cache, games are rendered from the archive without lexing their moves"""
+    def __init__(self, filename, index_path, archive_path):
+        super().__init__(filename)
+        try:
+            read_index(index_path, self)
+            self.archive = ArchiveReader(archive_path)
+        except Exception:
+            super().close()
+            raise
+    
+    def close(self):
+        self.archive.close()
+        super().close()
+    
+    def compileGame(self, game):
+        pgn_game = self.readGame(game)
+        start, stop = self.archive.gameMoveRange(game)
+        if stop - start != len(pgn_game.moves):
+            # the file no longer matches its entry
+            return pgn_game, compile_game_all(pgn_game.moves)
+        return pgn_game, compile_nodes(self.archive.nodes(start, stop))
+
+
+class DiskCache:
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.files_path = os.path.join(directory, FILES_NAME)
+    
+    def entryPaths(self, key):
+        base = os.path.join(self.directory, key)
+        return base + INDEX_SUFFIX, base + ARCHIVE_SUFFIX
+    
+    def readFiles(self):
+        try:
+            with open(self.files_path) as f:
+                files = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        # anything else than the object writeFiles stores is as good as no file
+        return files if isinstance(files, dict) else {}
+    
+    def writeFiles(self, files):
+        temp_path = f"{self.files_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(files, f)
+        os.replace(temp_path, self.files_path)
+    
+    def key(self, filename, rehash=True):
+        """Cache key of a file, None when its content hash is not remembered and rehash is False"""
+        path = os.path.abspath(filename)
+        stamp = file_stamp(path)
+        files = self.readFiles()
+        remembered = files.get(path)
+        if remembered and remembered[:3] == stamp:
+            digest = remembered[3]
+        elif rehash:
+            digest = content_hash(path)
+            # the file may have changed while it was read, then it is hashed again next time
+            if file_stamp(path) == stamp:
+                os.makedirs(self.directory, exist_ok=True)
+                files = self.readFiles()
+                files[path] = stamp + [digest]
+                self.writeFiles(files)
+        else:
+            return None
+        return hashlib.blake2b(f"{digest}:{COMPILER_VERSION}".encode(), digest_size=16).hexdigest()
+    
+    def open(self, filename):
+        """CachedPGNIndex of an unchanged file, or None. Never hashes, so it is always fast"""
+        try:
+            key = self.key(filename, rehash=False)
+        except OSError:
+            return None
+        if key is None:
+            return None
+        index_path, archive_path = self.entryPaths(key)
+        try:
+            index = CachedPGNIndex(filename, index_path, archive_path)
+        except (OSError, ValueError):
+            return None
+        os.utime(archive_path)
+        return index
+    
+    def build(self, filename, progress=None):
+        """Compiles a file into the cache unless it is there already, returns its key"""
+        key = self.key(filename)
+        index_path, archive_path = self.entryPaths(key)
+        if os.path.exists(index_path) and os.path.exists(archive_path):
+            os.utime(archive_path)
+            self.evict(keep=key)
+            return key
+        
+        os.makedirs(self.directory, exist_ok=True)
+        temp_index = f"{index_path}.{os.getpid()}.tmp"
+        temp_archive = f"{archive_path}.{os.getpid()}.tmp"
+        try:
+            with PGNIndex(filename) as index:
+                index.build()
+                with ArchiveWriter(temp_archive) as writer:
+                    for game in range(index.gameCount()):
+                        writer.addGame(index.readGame(game))
+                        if progress and game % 1000 == 0:
+                            progress(game, index.gameCount())
+                write_index(index, temp_index)
+            # the index goes in last, an entry only counts once both are there
+            os.replace(temp_archive, archive_path)
+            os.replace(temp_index, index_path)
+        finally:
+            for path in (temp_index, temp_archive):
+                if os.path.exists(path):
+                    os.remove(path)
+        
+        self.evict(keep=key)
+        return key
+    
+    def entries(self):
+        """(last use, bytes, key) of every complete entry, least recently used first"""
+        entries = []
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return entries
+        for name in names:
+            if not name.endswith(ARCHIVE_SUFFIX):
+                continue
+            key = name[:-len(ARCHIVE_SUFFIX)]
+            index_path, archive_path = self.entryPaths(key)
+            try:
+                archive_stat = os.stat(archive_path)
+                index_size = os.path.getsize(index_path)
+            except OSError:
+                continue
+            entries.append((archive_stat.st_mtime, archive_stat.st_size + index_size, key))
+        entries.sort()
+        return entries
+    
+    def remove(self, key):
+        for path in self.entryPaths(key):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+    
+    def evict(self, keep=None):
+        """Removes least recently used entries until the cache fits, returns how many went"""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, key in entries:
+            if total <= self.max_bytes:
+                break
+            if key == keep and size <= self.max_bytes:
+                continue
+            self.remove(key)
+            total -= size
+            removed += 1
+        return removed
+    
+    def clear(self):
+        for _, _, key in self.entries():
+            self.remove(key)
+        try:
+            os.remove(self.files_path)
+        except FileNotFoundError:
+            pass
+    
+    def stats(self):
+        entries = self.entries()
+        return {
+            'directory': self.directory,
+            'entries': len(entries),
+            'bytes': sum(size for _, size, _ in entries),
+            'max_bytes': self.max_bytes,
+            'compiler_version': COMPILER_VERSION,
+        }
+
+
+# shared by the GUI and the command line
+disk_cache = DiskCache(os.environ.get('CHESS_COMPILER_CACHE', DEFAULT_CACHE_DIR))
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(prog="disk_cache.py", description="Manage the compiled PGN file cache.")
+    arg_parser.add_argument("--cache-dir", default=disk_cache.directory,
+                            help=f"cache directory (default: {disk_cache.directory})")
+    arg_parser.add_argument("--max-bytes", type=int, default=DEFAULT_MAX_BYTES,
+                            help=f"size limit, least recently used entries go first (default: {DEFAULT_MAX_BYTES})")
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="compile PGN files into the cache")
+    build.add_argument("pgn", nargs="+")
+    build.add_argument("-q", "--quiet", action="store_true", help="no progress output")
+    commands.add_parser("stats", help="show the size of the cache")
+    commands.add_parser("clear", help="remove every entry")
+    args = arg_parser.parse_args(argv)
+    
+    cache = DiskCache(args.cache_dir, args.max_bytes)
+    if args.command == "stats":
+        for name, value in cache.stats().items():
+            print(f"{name}: {value}")
+        return 0
+    if args.command == "clear":
+        cache.clear()
+        return 0
+    
+    # a terminated build still removes its temporary files
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(1))
+    for filename in args.pgn:
+        start = time.perf_counter()
+        progress = None
+        if not args.quiet:
+            progress = lambda game, games: print(f"\r{filename}: {game}/{games} games", end='', file=sys.stderr)
+        try:
+            key = cache.build(filename, progress)
+        except (OSError, ValueError, SyntaxError) as e:
+            print(f"\nError: {filename}: {e}", file=sys.stderr)
+            return 1
+        if not args.quiet:
+            print(f"\r{filename}: cached as {key} in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
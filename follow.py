@@ -0,0 +1,241 @@
+# Follow - tail-follows a growing PGN file and compiles only the moves appended since the last poll
+'''
+A PGNFollower remembers how far the file has been read (a byte offset)
+and where the PGN grammar stands at that point: the PGNLexer's carried
+over text, the current game and ply, the variation depth and, with
+resolve, the game's Board. Every poll() reads the bytes appended since the
+last one, feeds them to the lexer and turns the complete tokens into
+events, so the cost of an update depends on the new data only:
+    game    a new game starts                       content None
+    tag     a tag pair of the current game          content (name, value)
+    move    a move of the current game, compiled    content (san, simple, verbose)
+    result  the game result, the game is over       content '1-0', '0-1', '1/2-1/2' or '*'
+    reset   the file was truncated or rewritten, it is read again from the start
+
+Games split as PGNParser splits them: a game starts at its first tag, move
+or result and ends at its result or when a new tag section starts. Moves
+inside variations are skipped. A move touching the end of the file is held
+back until the next byte shows it is complete (e.g. "Nf3" may still
+become "Nf3+"), broadcasters that end every write with whitespace see
+each move on the poll that follows it.
+
+    python follow.py live.pgn                       # print new moves as they are appended
+    python follow.py live.pgn --format jsonl --resolve
+    python follow.py live.pgn --once                # compile what is there and exit
+'''
+import argparse
+import codecs
+import json
+import sys
+import time
+from collections import namedtuple
+
+from board import Board
+from code_gen import renderer
+from pgn_lexer import PGNLexer, CHUNK_SIZE
+from pipeline import compile_move, format_pgn_headers
+
+DEFAULT_INTERVAL = 0.5  # seconds between polls
+TAIL_CHECK = 64         # bytes before the offset compared on every poll, a rewritten file is read again
+
+FollowEvent = namedtuple('FollowEvent', ['kind', 'game', 'ply', 'content'])
+
+
+class PGNFollower:
+    def __init__(self, filename, resolve=False):
+        self.filename = filename
+        self.resolve = resolve      # replay every game on a board to name origin squares
+        self.reset()
+    
+    def reset(self):
+        """Forgets everything read, the next poll starts at the beginning of the file"""
+        self.offset = 0             # bytes read so far
+        self.tail = b''             # last bytes read, must still be there on the next poll
+        self.decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self.lexer = PGNLexer('')   # fed by hand, carries a cut token over to the next poll
+        self.games = 0              # games seen so far
+        self.moves = 0              # moves compiled so far
+        self.in_game = False        # between a game's first token and its end
+        self.in_movetext = False    # past the tag section, the next tag starts a new game
+        self.depth = 0              # variation nesting
+        self.ply = 0
+        self.fen = None             # FEN tag of the current game
+        self.board = None           # resolve mode, created at the game's first move
+        self.replaying = True       # resolve mode, False after a move the board cannot play
+    
+    def unchanged(self, f):
+        """Whether the bytes read last are still where they were"""
+        if not self.tail:
+            return True
+        f.seek(self.offset - len(self.tail))
+        return f.read(len(self.tail)) == self.tail
+    
+    def poll(self, final=False):
+        """Reads what was appended since the last poll, returns the new events
+        
+        With final, a token at the end of the file is taken as complete.
+        """
+        events = []
+        with open(self.filename, 'rb') as f:
+            size = f.seek(0, 2)
+            if size < self.offset or not self.unchanged(f):
+                self.reset()
+                events.append(FollowEvent('reset', 0, 0, None))
+            
+            f.seek(self.offset)
+            while True:
+                data = f.read(CHUNK_SIZE)
+                if not data:
+                    break
+                self.offset += len(data)
+                self.tail = (self.tail + data)[-TAIL_CHECK:]
+                for token in self.lexer.feed(self.decoder.decode(data)):
+                    self.consume(token, events)
+        
+        if final:
+            for token in self.lexer.feed(self.decoder.decode(b'', final=True), final=True):
+                self.consume(token, events)
+        return events
+    
+    def startGame(self, events):
+        self.games += 1
+        self.in_game = True
+        self.in_movetext = False
+        self.ply = 0
+        self.fen = None
+        self.board = None
+        self.replaying = True
+        events.append(FollowEvent('game', self.games, 0, None))
+    
+    def endGame(self):
+        self.in_game = False
+        self.in_movetext = False
+    
+    def consume(self, token, events):
+        """Advances the game state by one PGN token, appending the events it causes"""
+        kind = token.type
+        if self.depth:
+            # variations are skipped whole
+            if kind == 'VARIATION_START':
+                self.depth += 1
+            elif kind == 'VARIATION_END':
+                self.depth -= 1
+            return
+        
+        if kind == 'TAG':
+            if self.in_movetext:
+                # a new tag section, the current game had no result
+                self.endGame()
+            if not self.in_game:
+                self.startGame(events)
+            name, value = token.content
+            if name == 'FEN':
+                self.fen = value
+            events.append(FollowEvent('tag', self.games, 0, token.content))
+        elif kind == 'SAN':
+            if not self.in_game:
+                self.startGame(events)
+            self.in_movetext = True
+            self.ply += 1
+            self.moves += 1
+            events.append(FollowEvent('move', self.games, self.ply, (token.content,) + self.compile(token.content)))
+        elif kind == 'RESULT':
+            if not self.in_game:
+                self.startGame(events)
+            events.append(FollowEvent('result', self.games, self.ply, token.content))
+            self.endGame()
+        elif kind == 'VARIATION_START':
+            self.in_movetext = self.in_game
+            self.depth = 1
+        elif kind in ('MOVE_NUMBER', 'COMMENT', 'NAG', 'ANNOTATION'):
+            self.in_movetext = self.in_game
+        # a stray VARIATION_END closes nothing
+    
+    def compile(self, move_notation):
+        """(simple, verbose) of the next move of the current game, "Error: ..." for both when it fails"""
+        try:
+            compiled = compile_move(move_notation)
+        except Exception as e:
+            # the position is unknown after a move that does not compile
+            self.replaying = False
+            error = f"Error: {str(e)}"
+            return error, error
+        if not (self.resolve and self.replaying):
+            return compiled.simple, compiled.verbose
+        
+        try:
+            if self.board is None:
+                self.board = Board(self.fen)
+            return renderer.render(self.board.play(compiled.ast))
+        except ValueError as e:
+            self.replaying = False
+            error = f"Error: {str(e)}"
+            return error, error
+
+
+def format_event(event, mode="simple"):
+    """Output lines of an event, in the style of the batch text output"""
+    if event.kind == 'game':
+        return [f"Game {event.game}"]
+    if event.kind == 'tag':
+        return format_pgn_headers(dict([event.content]))
+    if event.kind == 'move':
+        san, simple, verbose = event.content
+        move_number = f"{(event.ply + 1) // 2}{'.' if event.ply % 2 else '...'}"
+        return [f"{move_number:<6} {san} - {simple if mode == 'simple' else verbose}"]
+    if event.kind == 'result':
+        return [f"Result: {event.content}", ""]
+    return ["(file rewritten, following it from the start)"]
+
+
+def event_record(event):
+    """The event as a JSON-ready dict"""
+    record = {'event': event.kind, 'game': event.game}
+    if event.kind == 'tag':
+        record['name'], record['value'] = event.content
+    elif event.kind == 'move':
+        record['ply'] = event.ply
+        record['san'], record['simple'], record['verbose'] = event.content
+    elif event.kind == 'result':
+        record['result'] = event.content
+    return record
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(prog="follow.py",
+                                         description="Follow a growing PGN file, compiling only appended moves.")
+    arg_parser.add_argument("pgn", help="PGN file to follow")
+    arg_parser.add_argument("-m", "--mode", choices=["simple", "verbose"], default="simple",
+                            help="output mode of the text format (default: simple)")
+    arg_parser.add_argument("-f", "--format", choices=["text", "jsonl"], default="text",
+                            help="text lines, or one JSON object per event with both translations (default: text)")
+    arg_parser.add_argument("--resolve", action="store_true",
+                            help="replay every game on a board to name origin squares and flag illegal moves")
+    arg_parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL,
+                            help=f"seconds between polls (default: {DEFAULT_INTERVAL})")
+    arg_parser.add_argument("--once", action="store_true", help="compile what the file holds now and exit")
+    args = arg_parser.parse_args(argv)
+    
+    follower = PGNFollower(args.pgn, args.resolve)
+    try:
+        while True:
+            events = follower.poll(final=args.once)
+            for event in events:
+                if args.format == "jsonl":
+                    sys.stdout.write(json.dumps(event_record(event), ensure_ascii=False) + '\n')
+                else:
+                    sys.stdout.write(''.join(line + '\n' for line in format_event(event, args.mode)))
+            if events:
+                sys.stdout.flush()
+            if args.once:
+                return 0
+            time.sleep(args.interval)
+    except (OSError, ValueError, SyntaxError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -22,15 +22,34 @@ Lexeme → TOKEN Pairing:
 9. End of File
     "" → EOF
 
+Whole games (tokenizeGame) also produce:
+10. Whitespace between moves → SEPARATOR
+11. Move number : 1. or 12... → MOVE_NUMBER
+12. Result : 1-0, 0-1, 1/2-1/2, * → RESULT
+
 Returns a list of Token objects from input string.
+
+Recovery mode (a diagnostics list is given): errors are appended to the
+list as Diagnostic records instead of raised. The broken move's tokens are
+replaced by one ERROR token holding its text, and lexing resumes at the
+next whitespace (panic mode).
 '''
-from token import Token
+import re
+
+from chess_token import Token, SAN_TOKENS, EOF_TOKEN, SEPARATOR_TOKEN, RESULT_TOKENS, Diagnostic
+
+# move numbers and results, only recognized at the start of a word of a game
+GAME_WORD = re.compile(r'(?P<MOVE_NUMBER>\d+\.+)|(?P<RESULT>1-0|0-1|1/2-1/2|\*)(?!\S)')
+GAME_WORD_STARTS = frozenset('0123456789*')
+WORD = re.compile(r'\S+')
+WHITESPACE = re.compile(r'\s')
 
 class Lexer:
-    def __init__(self, inputString):
+    def __init__(self, inputString, diagnostics=None):
         self.input_string       = inputString
         self.cursor_pos         = 0
         self.tokens             = []
+        self.diagnostics        = diagnostics   # list of Diagnostic in recovery mode, None raises errors
         self.VALID_PIECES       = {'K', 'Q', 'B', 'N', 'R'}                 # set of valid piece characters
         self.VALID_FILES        = {'a', 'b', 'c', 'd', 'e', 'f', 'g', 'h'}  # set of valid file characters
         self.VALID_RANKS        = {'1', '2', '3', '4', '5', '6', '7', '8'}  # set of valid rank characters
@@ -42,96 +61,387 @@ class Lexer:
     def raiseError(self, message):
         raise ValueError(f'{self.cursor_pos}: {message}')
     
+    def reportError(self, message, move_start=0, token_start=0):
+        """Raises, or in recovery mode records the error and skips the rest of the move
+
+        The tokens of the move (from token_start) become one ERROR token with
+        the text from move_start to the next whitespace, where cursor_pos is set.
+        """
+        if self.diagnostics is None:
+            self.raiseError(message)
+        self.diagnostics.append(Diagnostic('lexer', self.cursor_pos, f'{self.cursor_pos}: {message}'))
+
+        whitespace = WHITESPACE.search(self.input_string, self.cursor_pos)
+        end = whitespace.start() if whitespace else len(self.input_string)
+        del self.tokens[token_start:]
+        self.tokens.append(Token('ERROR', self.input_string[move_start:end]))
+        self.cursor_pos = end
+
+    def tokenizeGame(self):
+        """Tokenizes a whole game, moves are separated by SEPARATOR tokens"""
+        tokens = self.tokens
+        
+        for word in WORD.finditer(self.input_string):
+            if tokens:
+                tokens.append(SEPARATOR_TOKEN)
+            
+            game_word = GAME_WORD.match(word.group())
+            if game_word and game_word.lastgroup == 'RESULT':
+                tokens.append(RESULT_TOKENS[game_word.group()])
+                continue
+            if game_word:
+                tokens.append(Token('MOVE_NUMBER', game_word.group()))
+            
+            # lex the rest of the word as a move, error positions relative to the whole game
+            start = game_word.end() if game_word else 0
+            if self.diagnostics is not None:
+                move_diagnostics = []
+                tokens.extend(type(self)(word.group()[start:], move_diagnostics).tokenize()[:-1])
+                for diagnostic in move_diagnostics:
+                    position = word.start() + start + diagnostic.position
+                    message = diagnostic.message.split(': ', 1)[1]
+                    self.diagnostics.append(Diagnostic('lexer', position, f'{position}: {message}'))
+                continue
+            move_lexer = type(self)(word.group()[start:])
+            try:
+                tokens.extend(move_lexer.tokenize()[:-1])
+            except ValueError as e:
+                self.cursor_pos = word.start() + start + move_lexer.cursor_pos
+                self.raiseError(str(e).split(': ', 1)[1])
+        
+        self.cursor_pos = len(self.input_string)
+        tokens.append(EOF_TOKEN)
+        
+        return tokens
+    
     # Helper function for reading input string
     def tokenize(self):
         s = self.input_string
         n = len(s)
-
+        
         while self.cursor_pos < n:
             char = s[self.cursor_pos]
-
+            
             # Castling
             if char == 'O':
                 if s[self.cursor_pos:self.cursor_pos+3] == 'O-O':
                     # checks for Queen/Kingside castling
                     if s[self.cursor_pos:self.cursor_pos+5] == 'O-O-O':
-                        self.tokens.append(Token('CASTLE_QUEENSIDE','O-O-O' ))
+                        self.tokens.append(SAN_TOKENS['O-O-O'])
                         self.cursor_pos += 5
                         continue
                     else:
-                        self.tokens.append(Token('CASTLE_KINGSIDE','O-O' ))
+                        self.tokens.append(SAN_TOKENS['O-O'])
                         self.cursor_pos += 3
                         continue
                 # If char is just 'O' alone, raise error
                 else:
-                    self.raiseError("Found 'O' without following '-O' or '-O-O'.")
-
+                    self.reportError("Found 'O' without following '-O' or '-O-O'.")
+                    continue
+            
             # Pieces
             if char in self.VALID_PIECES:
-                self.tokens.append(Token('PIECE', char))
+                self.tokens.append(SAN_TOKENS[char])
                 self.cursor_pos += 1
                 continue
-
+            
             # Files
             if char in self.VALID_FILES:
                 # look ahead for to check for rank
                 if self.cursor_pos + 1 < n:
                     nxt = s[self.cursor_pos + 1]
-
+                    
                     # Square
                     if nxt in self.VALID_RANKS:
                         square = char + nxt
-                        self.tokens.append(Token('SQUARE', square))
+                        self.tokens.append(SAN_TOKENS[square])
                         self.cursor_pos += 2
                         continue
                     
                     # File used for disambiguation or pawn movement
                     else:
-                        self.tokens.append(Token('FILE', char))
+                        self.tokens.append(SAN_TOKENS[char])
                         self.cursor_pos += 1
                         continue
                 else:
                     # FILE at end of string
-                    self.tokens.append(Token('FILE', char))
+                    self.tokens.append(SAN_TOKENS[char])
                     self.cursor_pos += 1
                     continue
-
+            
             # Ranks
             if char in self.VALID_RANKS:
-                self.tokens.append(Token('RANK', char))
+                self.tokens.append(SAN_TOKENS[char])
                 self.cursor_pos += 1
                 continue
-
+            
             # Captures
             if char in self.CAPTURE:
-                self.tokens.append(Token('CAPTURE', char))
+                self.tokens.append(SAN_TOKENS[char])
                 self.cursor_pos += 1
                 continue
-
+            
             # Promotion
             if char in self.PROMOTION_SYMBOL:
-                self.tokens.append(Token('PROMOTION_SYMBOL', char))
+                self.tokens.append(SAN_TOKENS[char])
                 self.cursor_pos += 1
                 continue
-
+            
             # Checks
             if char in self.CHECK:
-                if char == '+':
-                    self.tokens.append(Token('CHECK', char))
-                elif char == '#':
-                    self.tokens.append(Token('CHECKMATE', char))
+                # CHECK for '+', CHECKMATE for '#'
+                self.tokens.append(SAN_TOKENS[char])
                 self.cursor_pos += 1
                 continue
-
+            
             # Unhandled characters
             if char.isspace():
                 self.cursor_pos += 1 
                 continue
             else:
                 # Invalid character
-                self.raiseError(f"Unrecognized character '{char}'")
+                self.reportError(f"Unrecognized character '{char}'")
+                continue
+        
+        # End of File
+        self.tokens.append(EOF_TOKEN)
+        
+        return self.tokens
+
+
+
+# token table for TableLexer, one dict lookup per character instead of six set tests
+CHAR_TOKENS = {char: token for char, token in SAN_TOKENS.items() if len(char) == 1}
+
+# squares looked up by file then rank, no substring is built
+SQUARE_TOKENS = {file: {rank: SAN_TOKENS[file + rank] for rank in '12345678'} for file in 'abcdefgh'}
+
+
+class TableLexer(Lexer):
+    """Table-driven lexer, emits the same tokens and errors as Lexer"""
+    def __init__(self, inputString, diagnostics=None):
+        # no per-instance character sets, the class table is shared
+        self.input_string   = inputString
+        self.cursor_pos     = 0
+        self.tokens         = []
+        self.diagnostics    = diagnostics
+    
+    def tokenize(self):
+        return self.scan(game=False)
+    
+    def tokenizeGame(self):
+        """Tokenizes a whole game in a single pass, moves are separated by SEPARATOR tokens"""
+        return self.scan(game=True)
+    
+    def scan(self, game):
+        s = self.input_string
+        n = len(s)
+        pos = 0
+        tokens = self.tokens
+        char_tokens = CHAR_TOKENS
+        
+        if game:
+            pos = self.scanGameWord(0)
+        # where the current move starts, in the input and in tokens, for error recovery
+        move_pos = pos
+        move_token = len(tokens)
+        
+        while pos < n:
+            char = s[pos]
+            token = char_tokens.get(char)
+            
+            if token is None:
+                if char == 'O':
+                    # Castling
+                    if s.startswith('O-O-O', pos):
+                        tokens.append(SAN_TOKENS['O-O-O'])
+                        pos += 5
+                    elif s.startswith('O-O', pos):
+                        tokens.append(SAN_TOKENS['O-O'])
+                        pos += 3
+                    else:
+                        self.cursor_pos = pos
+                        self.reportError("Found 'O' without following '-O' or '-O-O'.", move_pos, move_token)
+                        pos = self.cursor_pos
+                    continue
+                if char.isspace():
+                    pos += 1
+                    if game:
+                        # whitespace run ends a word, next word may be a move number or result
+                        while pos < n and s[pos].isspace():
+                            pos += 1
+                        if pos < n:
+                            if tokens:
+                                tokens.append(SEPARATOR_TOKEN)
+                            pos = self.scanGameWord(pos)
+                            move_pos = pos
+                            move_token = len(tokens)
+                    continue
+                # Invalid character
+                self.cursor_pos = pos
+                self.reportError(f"Unrecognized character '{char}'", move_pos, move_token)
+                pos = self.cursor_pos
+                continue
+            
+            if token.type == 'FILE' and pos + 1 < n:
+                # look ahead for rank, square instead of file
+                square = SQUARE_TOKENS[char].get(s[pos + 1])
+                if square is not None:
+                    tokens.append(square)
+                    pos += 2
+                    continue
+            
+            tokens.append(token)
+            pos += 1
+        
+        self.cursor_pos = pos
+        
+        # End of File
+        tokens.append(EOF_TOKEN)
+        
+        return tokens
+    
+    def scanGameWord(self, pos):
+        """Matches a move number or result at the start of a word, returns the position after it"""
+        if pos >= len(self.input_string) or self.input_string[pos] not in GAME_WORD_STARTS:
+            return pos
+        
+        game_word = GAME_WORD.match(self.input_string, pos)
+        if game_word is None:
+            return pos
+        
+        if game_word.lastgroup == 'RESULT':
+            self.tokens.append(RESULT_TOKENS[game_word.group()])
+        else:
+            self.tokens.append(Token('MOVE_NUMBER', game_word.group()))
+        return game_word.end()
+
+
+# byte tables for ByteLexer, indexed by byte value instead of by character
+BYTE_TOKENS = [CHAR_TOKENS.get(chr(byte)) for byte in range(256)]
+BYTE_SQUARES = [None] * 256
+for _file in 'abcdefgh':
+    BYTE_SQUARES[ord(_file)] = [SQUARE_TOKENS[_file].get(chr(byte)) for byte in range(256)]
+del _file
+# ASCII whitespace as str.isspace() sees it, other bytes are decoded first
+SPACE_BYTES = frozenset(byte for byte in range(128) if chr(byte).isspace())
+O, DASH = ord('O'), ord('-')
+
 
+class ByteLexer:
+    """Table-driven lexer over the bytes of one move, emits the same tokens and errors as Lexer
+    
+    data is bytes, an mmap or a memoryview, the move is data[start:end]. Nothing
+    is sliced or decoded: every byte is looked up in BYTE_TOKENS, squares in
+    BYTE_SQUARES, castles are compared byte by byte, and the tokens are the
+    interned SAN_TOKENS. Only errors materialize text.
+    """
+    def __init__(self, data, start=0, end=None, diagnostics=None):
+        self.data           = data
+        self.start          = start
+        self.end            = len(data) if end is None else end
+        self.cursor_pos     = 0
+        self.tokens         = []
+        self.diagnostics    = diagnostics
+    
+    def text(self, start, end):
+        """Decoded text of bytes start..end-1 of the move"""
+        return bytes(self.data[self.start + start:self.start + end]).decode('utf-8', errors='replace')
+    
+    def charAt(self, pos):
+        """The (possibly multi-byte) character at a byte offset, and its length in bytes"""
+        length = 1
+        byte = self.data[self.start + pos]
+        if byte >= 0xF0:
+            length = 4
+        elif byte >= 0xE0:
+            length = 3
+        elif byte >= 0xC0:
+            length = 2
+        length = min(length, self.end - self.start - pos)
+        return self.text(pos, pos + length)[0], length
+    
+    def reportError(self, message):
+        """Raises, or in recovery mode records the error and turns the move into one ERROR token
+        
+        cursor_pos is the byte offset of the error, messages give it in characters like Lexer.
+        """
+        position = len(self.text(0, self.cursor_pos))
+        if self.diagnostics is None:
+            raise ValueError(f'{position}: {message}')
+        self.diagnostics.append(Diagnostic('lexer', position, f'{position}: {message}'))
+        
+        end = self.cursor_pos
+        while end < self.end - self.start:
+            char, length = self.charAt(end)
+            if char.isspace():
+                break
+            end += length
+        self.tokens.clear()
+        self.tokens.append(Token('ERROR', self.text(0, end)))
+        self.cursor_pos = end
+    
+    def tokenize(self):
+        data = self.data
+        base = self.start
+        n = self.end - base
+        pos = 0
+        tokens = self.tokens
+        byte_tokens = BYTE_TOKENS
+        
+        while pos < n:
+            byte = data[base + pos]
+            token = byte_tokens[byte]
+            
+            if token is None:
+                if byte == O:
+                    # Castling
+                    if pos + 2 < n and data[base + pos + 1] == DASH and data[base + pos + 2] == O:
+                        if pos + 4 < n and data[base + pos + 3] == DASH and data[base + pos + 4] == O:
+                            tokens.append(SAN_TOKENS['O-O-O'])
+                            pos += 5
+                        else:
+                            tokens.append(SAN_TOKENS['O-O'])
+                            pos += 3
+                    else:
+                        self.cursor_pos = pos
+                        self.reportError("Found 'O' without following '-O' or '-O-O'.")
+                        pos = self.cursor_pos
+                    continue
+                if byte in SPACE_BYTES:
+                    pos += 1
+                    continue
+                char, length = self.charAt(pos)
+                if char.isspace():
+                    pos += length
+                    continue
+                # Invalid character
+                self.cursor_pos = pos
+                self.reportError(f"Unrecognized character '{char}'")
+                pos = self.cursor_pos
+                continue
+            
+            if token.type == 'FILE' and pos + 1 < n:
+                # look ahead for rank, square instead of file
+                square = BYTE_SQUARES[byte][data[base + pos + 1]]
+                if square is not None:
+                    tokens.append(square)
+                    pos += 2
+                    continue
+            
+            tokens.append(token)
+            pos += 1
+        
+        self.cursor_pos = pos
+        
         # End of File
-        self.tokens.append(Token('EOF', ''))
+        tokens.append(EOF_TOKEN)
+        
+        return tokens
+
 
-        return self.tokens
\ No newline at end of file
+# selectable lexer implementations
+LEXERS = {
+    'classic': Lexer,
+    'table': TableLexer,
+}
@@ -0,0 +1,155 @@
+# Load Test - drives a running server.py with concurrent keep-alive clients and reports latency
+'''
+Every client holds one connection and sends requests back to back until
+the total is reached. Moves (or whole games with --game) come from the
+seeded synthetic corpus, so runs are repeatable and the server's cache
+sees a realistic share of repeated SAN strings.
+
+    python server.py &
+    python loadtest.py -c 64 -n 50000
+    python loadtest.py --game --plies 80 -c 16 -n 2000 --json run.json
+'''
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections import Counter
+
+from synthetic import CorpusGenerator, DEFAULT_SEED, DEFAULT_VOCABULARY
+from server import DEFAULT_HOST, DEFAULT_PORT
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def build_requests(count, game, plies, seed, vocabulary):
+    """Encoded (path, body) pairs, cycled through by the clients"""
+    corpus = CorpusGenerator(seed, vocabulary)
+    if game:
+        return [('/game', json.dumps({'moves': corpus.moves(plies)}).encode()) for _ in range(count)]
+    return [('/move', json.dumps({'san': san}).encode()) for san in corpus.moves(count)]
+
+
+class LoadTest:
+    def __init__(self, host, port, unix=None, requests=None, total=10000):
+        self.host = host
+        self.port = port
+        self.unix = unix
+        self.requests = requests
+        self.total = total
+        self.sent = 0
+        self.latencies = []
+        self.statuses = Counter()
+        self.failures = Counter()   # connection errors by type
+    
+    async def connect(self):
+        if self.unix:
+            return await asyncio.open_unix_connection(self.unix)
+        return await asyncio.open_connection(self.host, self.port)
+    
+    async def client(self):
+        reader, writer = await self.connect()
+        try:
+            while self.sent < self.total:
+                path, body = self.requests[self.sent % len(self.requests)]
+                self.sent += 1
+                head = (f"POST {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Type: application/json\r\n"
+                        f"Content-Length: {len(body)}\r\n\r\n").encode('latin1')
+                
+                start = time.perf_counter()
+                writer.write(head + body)
+                await writer.drain()
+                status, keep_alive = await self.readResponse(reader)
+                self.latencies.append(time.perf_counter() - start)
+                self.statuses[status] += 1
+                
+                if not keep_alive:
+                    writer.close()
+                    reader, writer = await self.connect()
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            self.failures[type(e).__name__] += 1
+        finally:
+            writer.close()
+    
+    async def readResponse(self, reader):
+        """Reads one response, returns (status, keep_alive)"""
+        head = (await reader.readuntil(b'\r\n\r\n')).decode('latin1').split('\r\n')
+        status = int(head[0].split(' ')[1])
+        headers = {}
+        for line in head[1:]:
+            if line:
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+        await reader.readexactly(int(headers.get('content-length', 0)))
+        return status, headers.get('connection', '').lower() != 'close'
+    
+    async def run(self, concurrency):
+        start = time.perf_counter()
+        await asyncio.gather(*(self.client() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        
+        latencies = sorted(self.latencies)
+        return {
+            'requests': len(latencies),
+            'concurrency': concurrency,
+            'seconds': elapsed,
+            'rps': len(latencies) / elapsed if elapsed > 0 else 0.0,
+            'latency_ms': {f"p{p:g}": percentile(latencies, p) * 1000 for p in PERCENTILES},
+            'max_ms': latencies[-1] * 1000 if latencies else 0.0,
+            'statuses': {str(status): count for status, count in sorted(self.statuses.items())},
+            'connection_errors': dict(self.failures),
+        }
+
+
+def print_results(results):
+    print(f"{results['requests']} requests from {results['concurrency']} clients in {results['seconds']:.2f}s "
+          f"({results['rps']:.0f} requests/sec)")
+    print("Latency: " + ", ".join(f"{name} {value:.2f} ms" for name, value in results['latency_ms'].items())
+          + f", max {results['max_ms']:.2f} ms")
+    print("Statuses: " + ", ".join(f"{status}: {count}" for status, count in results['statuses'].items()))
+    if results['connection_errors']:
+        print("Connection errors: " + ", ".join(f"{name}: {count}"
+                                                for name, count in results['connection_errors'].items()))
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(prog="loadtest.py", description="Load test a running server.py.")
+    arg_parser.add_argument("--host", default=DEFAULT_HOST, help=f"server address (default: {DEFAULT_HOST})")
+    arg_parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"server port (default: {DEFAULT_PORT})")
+    arg_parser.add_argument("--unix", metavar="PATH", default=None, help="connect to a Unix socket instead")
+    arg_parser.add_argument("-c", "--concurrency", type=int, default=32, help="concurrent clients (default: 32)")
+    arg_parser.add_argument("-n", "--requests", type=int, default=10000, help="total requests (default: 10000)")
+    arg_parser.add_argument("--game", action="store_true", help="send whole games to /game instead of single moves")
+    arg_parser.add_argument("--plies", type=int, default=80, help="moves per game with --game (default: 80)")
+    arg_parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="corpus seed")
+    arg_parser.add_argument("--vocabulary", type=int, default=DEFAULT_VOCABULARY,
+                            help=f"distinct moves of the corpus (default: {DEFAULT_VOCABULARY})")
+    arg_parser.add_argument("--json", metavar="PATH", default=None, help="also write the results as JSON")
+    args = arg_parser.parse_args(argv)
+    
+    # a pool of distinct requests, repeated when the total is larger
+    requests = build_requests(min(args.requests, 10000), args.game, args.plies, args.seed, args.vocabulary)
+    load_test = LoadTest(args.host, args.port, args.unix, requests, args.requests)
+    try:
+        results = asyncio.run(load_test.run(max(1, args.concurrency)))
+    except OSError as e:
+        print(f"Error: cannot reach the server: {e}", file=sys.stderr)
+        return 1
+    
+    print_results(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
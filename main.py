@@ -1,9 +1,21 @@
+import os
+import queue
+import subprocess
+import sys
+import threading
 import tkinter as tk
 from tkinter import ttk, filedialog, scrolledtext
 from lexer import Lexer
 from parser import Parser
 from code_gen import CodeGen
-import re
+from pgn_index import PGNIndex
+from disk_cache import disk_cache
+from follow import PGNFollower, format_event
+from pgn_view import VirtualPGNView
+
+POLL_INTERVAL_MS = 50      # how often the UI picks up newly indexed games
+FOLLOW_INTERVAL_MS = 500   # how often a followed file is checked for appended moves
+GAMES_PER_SCAN   = 2000    # games indexed between progress updates
 
 class ChessCompilerGUI:
     def __init__(self, root):
@@ -119,6 +131,10 @@ class ChessCompilerGUI:
         
         ttk.Button(file_frame, text="Browse", command=self.browse_pgn).pack(side='left', padx=5)
         ttk.Button(file_frame, text="Process", command=self.compile_pgn).pack(side='left', padx=5)
+        self.cancel_button = ttk.Button(file_frame, text="Cancel", command=self.cancel_compile, state='disabled')
+        self.cancel_button.pack(side='left', padx=5)
+        self.follow_button = ttk.Button(file_frame, text="Follow", command=self.toggle_follow)
+        self.follow_button.pack(side='left', padx=5)
         
         # output mode
         self.output_mode = tk.StringVar(value="simple")
@@ -129,15 +145,34 @@ class ChessCompilerGUI:
         ttk.Radiobutton(mode_frame, text="Verbose", variable=self.output_mode, 
                        value="verbose", command=self.refresh_pgn_output).pack(side='left', padx=5)
         
+        # progress
+        progress_frame = ttk.Frame(self.pgn_mode_frame)
+        progress_frame.pack(fill='x', padx=10)
+        
+        self.progress_bar = ttk.Progressbar(progress_frame, mode='determinate', maximum=100)
+        self.progress_bar.pack(side='left', fill='x', expand=True, padx=5)
+        self.progress_label = ttk.Label(progress_frame, text="", width=40)
+        self.progress_label.pack(side='left', padx=5)
+        
         # output section
         output_frame = ttk.LabelFrame(self.pgn_mode_frame, text="Output", padding=10)
         output_frame.pack(fill='both', expand=True, padx=10, pady=10)
         
-        self.pgn_output = scrolledtext.ScrolledText(output_frame, font=('Courier', 10), wrap='none')
-        self.pgn_output.pack(fill='both', expand=True)
+        # only the visible rows are compiled and rendered
+        self.pgn_view = VirtualPGNView(output_frame, mode=self.output_mode.get())
+        self.pgn_view.pack(fill='both', expand=True)
         
         self.pgn_file = None
-        self.pgn_moves = []
+        self.pgn_index = None
+        
+        # background indexing state
+        self.compile_queue = queue.Queue()
+        self.compile_cancel = None  # threading.Event of the running scan
+        self.cache_process = None   # disk_cache.py building the cache entry of the last scanned file
+        
+        # follow mode state
+        self.follower = None        # PGNFollower of the followed file
+        self.follow_events = []     # every event so far, rendered again when the mode changes
     
     def compile_single(self):
         """compile a single chess move"""
@@ -204,7 +239,7 @@ class ChessCompilerGUI:
             
             self.details_output.insert('1.0', '\n'.join(details))
             self.details_output.config(state='disabled')
-            
+        
         except Exception as e:
             self.single_output_text.insert('1.0', f"Error: {str(e)}")
             self.single_output_text.config(state='disabled')
@@ -223,107 +258,194 @@ class ChessCompilerGUI:
             import os
             self.file_label.config(text=f"{os.path.basename(filename)}")
     
-    def parse_pgn_file(self, filename):
-        """Parse PGN file and extract moves"""
-        with open(filename, 'r') as f:
-            content = f.read()
+    def compile_pgn(self):
+        """Index the PGN file on a background thread, games are compiled as they are shown"""
+        if not self.pgn_file:
+            self.pgn_view.clear()
+            self.pgn_view.show_message("Select a file first")
+            return
         
-        # remove move numbers and game result
-        content = re.sub(r'\d+\.+', '', content)
-        content = re.sub(r'\s+(1-0|0-1|1/2-1/2)\s*$', '', content)
+        # only one scan at a time
+        self.cancel_compile()
+        self.stop_cache_build()
+        self.stop_follow()
+        self.follow_events = []
+        
+        # an unchanged file comes back from the disk cache, nothing to scan
+        index = disk_cache.open(self.pgn_file)
+        if index is not None:
+            self.pgn_index = index
+            self.pgn_view.set_index(index)
+            self.progress_bar['value'] = 100
+            self.update_progress_label("Cached: ")
+            return
         
-        # split into moves
-        moves = content.split()
-        moves = [move.strip() for move in moves if move.strip()]
+        try:
+            index = PGNIndex(self.pgn_file)
+        except OSError as e:
+            self.pgn_view.clear()
+            self.show_pgn_error(str(e))
+            return
+        # the previous index is left to the garbage collector, its worker may still be reading it
+        self.pgn_index = index
+        self.pgn_view.set_index(index)
+        self.progress_bar['value'] = 0
+        self.progress_label.config(text="Indexing...")
+        self.cancel_button.config(state='normal')
+        
+        # a fresh queue, results of a cancelled run are never picked up
+        self.compile_queue = queue.Queue()
+        self.compile_cancel = threading.Event()
+        worker = threading.Thread(target=self.compile_worker,
+                                  args=(index, self.compile_queue, self.compile_cancel), daemon=True)
+        worker.start()
+        self.root.after(POLL_INTERVAL_MS, self.poll_compile, self.compile_queue)
+    
+    def compile_worker(self, index, results, cancel):
+        """Runs on the worker thread, never touches widgets, only extends the index and posts to the queue"""
+        file_size = max(index.size, 1)
+        try:
+            while index.scan(GAMES_PER_SCAN):
+                if cancel.is_set():
+                    results.put(('cancelled', None))
+                    return
+                results.put(('progress', min(100, 100 * index.scan_pos / file_size)))
+        except Exception as e:
+            results.put(('error', str(e)))
+            return
+        results.put(('done', None))
+    
+    def poll_compile(self, results):
+        """Shows the games indexed so far, the view compiles the visible ones"""
+        if results is not self.compile_queue:
+            # stale poll from a cancelled run
+            return
         
-        return moves
+        finished = False
+        try:
+            while True:
+                kind, payload = results.get_nowait()
+                if kind == 'progress':
+                    self.progress_bar['value'] = payload
+                elif kind == 'done':
+                    self.progress_bar['value'] = 100
+                    self.start_cache_build(self.pgn_index.filename)
+                    finished = True
+                    break
+                elif kind == 'cancelled':
+                    finished = True
+                    break
+                elif kind == 'error':
+                    self.show_pgn_error(payload)
+                    finished = True
+                    break
+        except queue.Empty:
+            pass
+        
+        self.pgn_view.refresh()
+        if finished:
+            self.compile_cancel = None
+            self.cancel_button.config(state='disabled')
+            self.update_progress_label()
+        else:
+            self.update_progress_label("Indexing... ")
+            self.root.after(POLL_INTERVAL_MS, self.poll_compile, results)
     
-    def compile_pgn(self):
-        """Compile entire PGN file"""
+    def cancel_compile(self):
+        """Stops the running scan, games indexed so far stay browsable"""
+        if self.compile_cancel is None:
+            return
+        self.compile_cancel.set()
+        self.compile_cancel = None
+        self.compile_queue = queue.Queue()
+        self.cancel_button.config(state='disabled')
+        self.pgn_view.refresh()
+        self.update_progress_label("Cancelled: ")
+    
+    def start_cache_build(self, filename):
+        """Compiles the file into the disk cache in another process, the next open loads from there"""
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'disk_cache.py')
+        try:
+            self.cache_process = subprocess.Popen(
+                [sys.executable, script, '--cache-dir', disk_cache.directory, 'build', '--quiet', filename],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        except OSError:
+            # the cache is only a speed-up
+            self.cache_process = None
+    
+    def stop_cache_build(self):
+        if self.cache_process is not None and self.cache_process.poll() is None:
+            self.cache_process.terminate()
+        self.cache_process = None
+    
+    def update_progress_label(self, prefix=""):
+        index = self.pgn_index
+        games = self.pgn_view.game_count()
+        moves = index.move_starts[games] if index else 0
+        self.progress_label.config(text=f"{prefix}{games} games, {moves} moves")
+    
+    def show_pgn_error(self, message):
+        self.pgn_view.show_message(f"Error: {message}")
+    
+    def toggle_follow(self):
+        """Follows the selected file, only moves appended since the last check are compiled"""
+        if self.follower is not None:
+            self.stop_follow()
+            return
         if not self.pgn_file:
-            self.pgn_output.config(state='normal')
-            self.pgn_output.delete('1.0', tk.END)
-            self.pgn_output.insert('1.0', "Select a file first")
-            self.pgn_output.config(state='disabled')
+            self.pgn_view.clear()
+            self.pgn_view.show_message("Select a file first")
+            return
+        
+        self.cancel_compile()
+        self.stop_cache_build()
+        self.pgn_index = None
+        self.pgn_view.clear()
+        self.progress_bar['value'] = 0
+        self.follower = PGNFollower(self.pgn_file)
+        self.follow_events = []
+        self.follow_button.config(text="Stop")
+        self.poll_follow(self.follower)
+    
+    def poll_follow(self, follower):
+        """Shows the translations of the moves appended since the last poll"""
+        if follower is not self.follower:
+            # stale poll of a stopped follow
             return
         
         try:
-            self.pgn_moves = self.parse_pgn_file(self.pgn_file)
-            self.refresh_pgn_output()
-        except Exception as e:
-            self.pgn_output.config(state='normal')
-            self.pgn_output.delete('1.0', tk.END)
-            self.pgn_output.insert('1.0', f"Error: {str(e)}")
-            self.pgn_output.config(state='disabled')
+            events = follower.poll()
+        except (OSError, ValueError, SyntaxError) as e:
+            self.show_pgn_error(str(e))
+            self.stop_follow()
+            return
+        
+        if any(event.kind == 'reset' for event in events):
+            # the file was rewritten, everything shown is stale
+            self.follow_events = []
+            self.pgn_view.clear()
+        if events:
+            self.follow_events.extend(events)
+            mode = self.output_mode.get()
+            self.pgn_view.show_messages([line for event in events for line in format_event(event, mode)])
+        self.progress_label.config(text=f"Following: {follower.games} games, {follower.moves} moves")
+        self.root.after(FOLLOW_INTERVAL_MS, self.poll_follow, follower)
+    
+    def stop_follow(self):
+        if self.follower is None:
+            return
+        self.follower = None
+        self.follow_button.config(text="Follow")
+        self.progress_label.config(text=self.progress_label.cget('text').replace("Following: ", "Stopped: "))
     
     def refresh_pgn_output(self):
         """Refresh PGN output based on selected mode"""
-        if not self.pgn_moves:
-            return
-        
-        self.pgn_output.config(state='normal')
-        self.pgn_output.delete('1.0', tk.END)
-        mode = self.output_mode.get()
-        
-        # adjust column width based on mode
-        white_col_width = 70 if mode == "verbose" else 50
-        separator_pos = 80 if mode == "verbose" else 60
-        
-        output = []
-        output.append(f"Total moves: {len(self.pgn_moves)}")
-        output.append(f"Output mode: {mode}")
-        output.append("")
-        
-        # column headers
-        output.append(f"{'Move':<6} {'White':<{white_col_width}} | {'Black'}")
-        output.append("-" * (separator_pos + 50))
-        
-        move_number = 1
-        white_move = ""
-        
-        for i, move_notation in enumerate(self.pgn_moves):
-            try:
-                # compile move
-                lexer = Lexer(move_notation)
-                tokens = lexer.tokenize()
-                parser = Parser(tokens)
-                ast_node = parser.parse()
-                codegen = CodeGen(ast_node)
-                
-                # get output based on mode
-                if mode == "simple":
-                    translation = codegen.generateSimple()
-                else:
-                    translation = codegen.generateVerbose()
-                
-                # format notation with translation
-                move_text = f"{move_notation} - {translation}"
-                
-                if i % 2 == 0:
-                    # white's move, store it
-                    white_move = move_text
-                else:
-                    # black's move, print both
-                    output.append(f"{move_number:<6} {white_move:<{white_col_width}} | {move_text}")
-                    move_number += 1
-                    white_move = ""
-                    
-            except Exception as e:
-                move_text = f"{move_notation} - Error: {str(e)}"
-                
-                if i % 2 == 0:
-                    white_move = move_text
-                else:
-                    output.append(f"{move_number:<6} {white_move:<{white_col_width}} | {move_text}")
-                    move_number += 1
-                    white_move = ""
-        
-        # if game ends on white's move
-        if white_move:
-            output.append(f"{move_number:<6} {white_move}")
-        
-        self.pgn_output.insert('1.0', '\n'.join(output))
-        self.pgn_output.config(state='disabled')
+        if self.follow_events:
+            # followed moves are kept as events, their lines are rebuilt for the new mode
+            mode = self.output_mode.get()
+            self.pgn_view.clear()
+            self.pgn_view.show_messages([line for event in self.follow_events for line in format_event(event, mode)])
+        self.pgn_view.set_mode(self.output_mode.get())
 
 def main():
     root = tk.Tk()
@@ -0,0 +1,222 @@
+# Metrics - optional per-stage instrumentation of the Lexer, Parser and CodeGen
+'''
+When enabled, the stage entry points are wrapped with timed versions:
+    pgn_lexer   PGNLexer .feed, PGNByteLexer/BulkLexer .fill (splitting files into tokens)
+    lexer       Lexer/TableLexer .tokenize, .tokenizeGame, ByteLexer .tokenize
+    parser      Parser .parse, .parseGame
+    codegen     CodeGen .generateSimple, .generateVerbose, Renderer .render*, .renderAll
+and every call records its time, the types of the tokens it produced and,
+when it fails, the category of the error. In recovery mode the Lexer and
+Parser report errors as diagnostics instead of raising, those are counted
+the same way. Disabling puts the original methods back, so a disabled
+recorder costs nothing at all.
+
+    import metrics
+    metrics.enable()
+    ...compile...
+    print(metrics.export_prometheus())
+
+Only the calling process is recorded, worker processes keep their own.
+'''
+import json
+import re
+import threading
+from collections import Counter, defaultdict
+from functools import wraps
+from time import perf_counter
+
+from lexer import Lexer, TableLexer, ByteLexer
+from pgn_lexer import PGNLexer, PGNByteLexer
+from parser import Parser
+from code_gen import CodeGen, Renderer
+import pipeline
+
+STAGES = ('pgn_lexer', 'lexer', 'parser', 'codegen')
+
+# (class, method, stage) pairs wrapped while metrics are enabled
+INSTRUMENTED = (
+    (PGNLexer, 'feed', 'pgn_lexer'),
+    (PGNByteLexer, 'fill', 'pgn_lexer'),
+    (Lexer, 'tokenize', 'lexer'),
+    (Lexer, 'tokenizeGame', 'lexer'),
+    (TableLexer, 'tokenize', 'lexer'),
+    (TableLexer, 'tokenizeGame', 'lexer'),
+    (ByteLexer, 'tokenize', 'lexer'),
+    (Parser, 'parse', 'parser'),
+    (Parser, 'parseGame', 'parser'),
+    (CodeGen, 'generateSimple', 'codegen'),
+    (CodeGen, 'generateVerbose', 'codegen'),
+    (Renderer, 'renderSimple', 'codegen'),
+    (Renderer, 'renderVerbose', 'codegen'),
+    (Renderer, 'render', 'codegen'),
+    (Renderer, 'renderAll', 'codegen'),
+)
+
+# positions and offending characters or token types, stripped so errors group by kind
+ERROR_POSITION = re.compile(r"^\d+: | at position \d+.*$")
+ERROR_DETAILS = re.compile(r"'[^']*'|(?<=got )\w+|(?<=: )\w+$")
+
+PROMETHEUS_PREFIX = 'chess_compiler'
+
+
+def error_category(error):
+    """The message of a compile error without positions or offending input, e.g. "Unrecognized character '_'" """
+    message = ERROR_POSITION.sub('', str(error))
+    return ERROR_DETAILS.sub(lambda m: "'_'" if m.group().startswith("'") else '_', message)
+
+
+def instrumented():
+    """INSTRUMENTED and BulkLexer .fill, bulk_lexer is only imported here as it loads NumPy"""
+    from bulk_lexer import BulkLexer
+    return INSTRUMENTED + ((BulkLexer, 'fill', 'pgn_lexer'),)
+
+
+class Metrics:
+    """Counters of one process, filled in by the wrapped stage methods"""
+    def __init__(self):
+        self.originals = {}     # (class, method) -> original function, while enabled
+        self.nesting = threading.local()
+        self.reset()
+    
+    def reset(self):
+        self.calls = Counter()
+        self.failures = Counter()
+        self.seconds = defaultdict(float)
+        self.token_counts = Counter()
+        self.errors = defaultdict(Counter)   # stage -> category -> count
+    
+    def isEnabled(self):
+        return bool(self.originals)
+    
+    def enable(self):
+        if self.originals:
+            return
+        for cls, name, stage in instrumented():
+            original = cls.__dict__[name]
+            self.originals[cls, name] = original
+            setattr(cls, name, self.timed(original, stage))
+    
+    def disable(self):
+        for (cls, name), original in self.originals.items():
+            setattr(cls, name, original)
+        self.originals = {}
+    
+    def timed(self, method, stage):
+        """Wraps a stage method, calls nested in the same stage (e.g. tokenizeGame → tokenize) count once"""
+        recorder = self
+        
+        @wraps(method)
+        def timed_method(*args, **kwargs):
+            nesting = recorder.nesting
+            if getattr(nesting, stage, False):
+                return method(*args, **kwargs)
+            
+            setattr(nesting, stage, True)
+            diagnostics = getattr(args[0], 'diagnostics', None)
+            reported = len(diagnostics) if diagnostics is not None else 0
+            start = perf_counter()
+            try:
+                result = method(*args, **kwargs)
+            except Exception as e:
+                recorder.failures[stage] += 1
+                recorder.errors[stage][error_category(e)] += 1
+                raise
+            finally:
+                recorder.seconds[stage] += perf_counter() - start
+                recorder.calls[stage] += 1
+                setattr(nesting, stage, False)
+            
+            if diagnostics is not None and len(diagnostics) > reported:
+                recorder.failures[stage] += 1
+                for diagnostic in diagnostics[reported:]:
+                    recorder.errors[stage][error_category(diagnostic.message)] += 1
+            if stage == 'lexer':
+                recorder.token_counts.update(token.type for token in result)
+            return result
+        return timed_method
+    
+    def snapshot(self):
+        """Plain dict of every counter, ready for json.dumps"""
+        return {
+            'enabled': self.isEnabled(),
+            'stages': {
+                stage: {
+                    'calls': self.calls[stage],
+                    'errors': self.failures[stage],
+                    'seconds': self.seconds[stage],
+                }
+                for stage in STAGES
+            },
+            'tokens': dict(sorted(self.token_counts.items())),
+            'errors': {stage: dict(self.errors[stage].most_common()) for stage in STAGES if self.errors[stage]},
+            'cache': pipeline.cache_stats(),
+        }
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def prometheus_lines(name, kind, help_text, samples):
+    """One metric family in the Prometheus text format, samples are (labels dict, value) pairs"""
+    name = f"{PROMETHEUS_PREFIX}_{name}"
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        if labels:
+            label_text = ','.join(f'{key}="{escape_label(label)}"' for key, label in labels.items())
+            lines.append(f"{name}{{{label_text}}} {value}")
+        else:
+            lines.append(f"{name} {value}")
+    return lines
+
+
+# shared by every instrumented call in this process
+metrics = Metrics()
+
+
+def enable():
+    """Start recording, wraps the stage methods"""
+    metrics.enable()
+
+
+def disable():
+    """Stop recording and restore the original methods, counters are kept"""
+    metrics.disable()
+
+
+def reset():
+    metrics.reset()
+
+
+def snapshot():
+    return metrics.snapshot()
+
+
+def export_json(indent=2):
+    return json.dumps(snapshot(), indent=indent)
+
+
+def export_prometheus():
+    """Snapshot in the Prometheus text exposition format"""
+    data = snapshot()
+    stages = data['stages']
+    cache = data['cache']
+    lines = []
+    lines += prometheus_lines('stage_calls_total', 'counter', "Calls of each compiler stage",
+                              [({'stage': stage}, values['calls']) for stage, values in stages.items()])
+    lines += prometheus_lines('stage_seconds_total', 'counter', "Time spent in each compiler stage",
+                              [({'stage': stage}, values['seconds']) for stage, values in stages.items()])
+    lines += prometheus_lines('stage_errors_total', 'counter', "Failed calls by stage and error category",
+                              [({'stage': stage, 'category': category}, count)
+                               for stage, categories in data['errors'].items()
+                               for category, count in categories.items()])
+    lines += prometheus_lines('tokens_total', 'counter', "Tokens produced by the lexer, by type",
+                              [({'type': token_type}, count) for token_type, count in data['tokens'].items()])
+    lines += prometheus_lines('cache_hits_total', 'counter', "Compilation cache hits, text and byte caches",
+                              [({}, cache['hits'])])
+    lines += prometheus_lines('cache_misses_total', 'counter', "Compilation cache misses, text and byte caches",
+                              [({}, cache['misses'])])
+    lines += prometheus_lines('cache_entries', 'gauge', "Moves held by the compilation caches", [({}, cache['size'])])
+    lines += prometheus_lines('cache_hit_ratio', 'gauge', "Share of cache lookups that hit",
+                              [({}, cache['hit_rate'])])
+    return '\n'.join(lines) + '\n'
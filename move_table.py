@@ -0,0 +1,123 @@
+# Move Table - every grammatical SAN move compiled once, compilation becomes one dict lookup
+'''
+The grammar describes a finite language:
+    castles         2 sides                                  x 3 check suffixes
+    piece moves     5 pieces x 81 disambigs x 2 captures x 64 squares x 3 check suffixes
+    pawn pushes     64 squares x 6 promotions                x 3 check suffixes
+    pawn captures   8 files x 2 captures x 64 squares x 6 promotions x 3 check suffixes
+so the whole language (175,110 strings) can be enumerated, compiled and
+stored in a frozen dictionary from SAN string to CompiledMove.
+
+Build the table ahead of time with:
+    python move_table.py [path]
+'''
+import os
+import pickle
+import sys
+from types import MappingProxyType
+
+from pipeline import compile_uncached
+
+FILES       = 'abcdefgh'
+RANKS       = '12345678'
+PIECES      = 'NBRQK'
+CHECKS      = ('', '+', '#')
+CAPTURES    = ('', 'x')
+
+TABLE_VERSION = 3   # bump when AST nodes or renderings change, stale tables are rebuilt
+
+DEFAULT_TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'move_table.pickle')
+
+
+def enumerate_moves():
+    """Yields every SAN string accepted by the grammar"""
+    squares = [file + rank for file in FILES for rank in RANKS]
+    disambigs = [''] + list(FILES) + list(RANKS) + squares
+    promotions = [''] + ['=' + piece for piece in PIECES]
+    
+    # <castle>
+    for castle in ('O-O', 'O-O-O'):
+        for check in CHECKS:
+            yield castle + check
+    
+    # <piece_move>
+    for piece in PIECES:
+        for disambig in disambigs:
+            for capture in CAPTURES:
+                for square in squares:
+                    for check in CHECKS:
+                        yield piece + disambig + capture + square + check
+    
+    # <pawn_move> without file
+    for square in squares:
+        for promotion in promotions:
+            for check in CHECKS:
+                yield square + promotion + check
+    
+    # <pawn_move> with file
+    for file in FILES:
+        for capture in CAPTURES:
+            for square in squares:
+                for promotion in promotions:
+                    for check in CHECKS:
+                        yield file + capture + square + promotion + check
+
+
+def build_table():
+    """Compiles every SAN string of the grammar into a frozen dictionary"""
+    return MappingProxyType({notation: compile_uncached(notation) for notation in enumerate_moves()})
+
+
+def save_table(table, path=DEFAULT_TABLE_PATH):
+    with open(path, 'wb') as f:
+        pickle.dump((TABLE_VERSION, dict(table)), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_table(path=DEFAULT_TABLE_PATH):
+    """Loads a saved table, raises ValueError when it was built by another version"""
+    with open(path, 'rb') as f:
+        try:
+            version, table = pickle.load(f)
+        except Exception:
+            raise ValueError(f"{path}: not a move table")
+    
+    if version != TABLE_VERSION:
+        raise ValueError(f"{path}: move table version {version}, expected {TABLE_VERSION}")
+    return MappingProxyType(table)
+
+
+def get_table(path=DEFAULT_TABLE_PATH):
+    """Loads the table from disk, building (and trying to save) it when missing or stale"""
+    if path and os.path.exists(path):
+        try:
+            return load_table(path)
+        except ValueError:
+            pass
+    
+    table = build_table()
+    if path:
+        try:
+            save_table(table, path)
+        except OSError:
+            # read-only install, keep the table in memory only
+            pass
+    return table
+
+
+class LazyMoveTable:
+    """Move table that is only loaded or built on its first lookup"""
+    def __init__(self, path=DEFAULT_TABLE_PATH):
+        self.path = path
+        self.table = None
+    
+    def get(self, notation):
+        if self.table is None:
+            self.table = get_table(self.path)
+        return self.table.get(notation)
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_TABLE_PATH
+    table = build_table()
+    save_table(table, path)
+    print(f"Wrote {len(table)} moves to {path}")
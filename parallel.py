@@ -0,0 +1,113 @@
+# Parallel Compiler - shards PGN games across a process pool
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from pipeline import compile_game, move_records, set_cache_size, set_move_table, set_lexer
+from move_table import LazyMoveTable
+
+DEFAULT_CHUNK_SIZE = 64     # games sent to a worker per task
+
+
+def init_worker(cache_size, table_path, lexer):
+    """Worker initializer, applies the parent's cache size, table mode and lexer"""
+    if lexer is not None:
+        set_lexer(lexer)
+    if cache_size is not None:
+        set_cache_size(cache_size)
+    if table_path is not None:
+        set_move_table(LazyMoveTable(table_path))
+
+
+def compile_moves(moves, mode, resolve=False, fen=None, recover=False):
+    """Translations of a game's moves, or with mode "records" its per-move records (see pipeline.move_records)
+    
+    Returns (result, diagnostics), diagnostics is None unless recover is set.
+    """
+    diagnostics = [] if recover else None
+    if mode == "records":
+        return move_records(moves, resolve, fen, diagnostics), diagnostics
+    return compile_game(moves, mode, resolve, fen, diagnostics), diagnostics
+
+
+def compile_chunk(chunk, mode, resolve=False, recover=False):
+    """Worker entry point, compiles a chunk of games given as (SAN strings, FEN or None) pairs"""
+    # only plain strings, records and diagnostics travel back to the parent, never AST nodes
+    return [compile_moves(moves, mode, resolve, fen, recover) for moves, fen in chunk]
+
+
+class ParallelCompiler:
+    def __init__(self, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, cache_size=None, table_path=None,
+                 lexer=None, resolve=False, recover=False):
+        self.workers     = workers or os.cpu_count() or 1
+        self.chunk_size  = max(1, chunk_size)
+        self.resolve     = resolve  # replay games on a board to name origin squares
+        self.recover     = recover  # collect errors as diagnostics instead of raising them
+        self.diagnostics = []       # (game number, Diagnostic) pairs in recovery mode
+        self.executor    = None
+        
+        # a single worker compiles in process, no pool overhead
+        if self.workers > 1:
+            # every worker has its own compilation cache, move table and lexer
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker,
+                                                initargs=(cache_size, table_path, lexer))
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+    
+    def compile(self, games, mode="simple"):
+        """Yields (game, translations) for every GameNode, in the original order
+        
+        With mode "records", each game comes with its move records instead.
+        In recovery mode, errors are added to self.diagnostics along with the
+        game number, games are numbered from 1 in every call.
+        """
+        for game_number, (game, (result, diagnostics)) in enumerate(self.results(games, mode), start=1):
+            if diagnostics:
+                self.diagnostics.extend((game_number, diagnostic) for diagnostic in diagnostics)
+            yield game, result
+    
+    def results(self, games, mode):
+        """Yields (game, (result, diagnostics)) for every GameNode, in the original order"""
+        if self.executor is None:
+            for game in games:
+                yield game, compile_moves(game.moves, mode, self.resolve, game.headers.get('FEN'), self.recover)
+            return
+        
+        # keep a bounded number of chunks in flight so streamed input stays streamed
+        max_pending = self.workers * 2
+        pending = deque()
+        
+        for chunk in self.chunks(games):
+            moves = [(game.moves, game.headers.get('FEN')) for game in chunk]
+            pending.append((chunk, self.executor.submit(compile_chunk, moves, mode, self.resolve, self.recover)))
+            
+            if len(pending) >= max_pending:
+                yield from self.collect(pending.popleft())
+        
+        while pending:
+            yield from self.collect(pending.popleft())
+    
+    def chunks(self, games):
+        """Groups games into lists of chunk_size"""
+        chunk = []
+        for game in games:
+            chunk.append(game)
+            if len(chunk) == self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    
+    def collect(self, entry):
+        """Waits for a chunk and pairs its games with their results"""
+        chunk, future = entry
+        return zip(chunk, future.result())
@@ -13,6 +13,11 @@
 # <file> 		::= "a" | "b" | "c" | "d" | "e" | "f" | "g" | "h"
 # <rank> 		::= "1" | "2" | "3" | "4" | "5" | "6" | "7" | "8"
 # <piece> 		::= "N" | "B" | "R" | "Q" | "K"
+#
+# Whole games (parseGame, tokens from Lexer.tokenizeGame):
+# <game>		::= ( <move_number> | <move> ) { <separator> ( <move_number> | <move> ) } [ <separator> <result> ]
+# <move_number>	::= <digits> "."+
+# <result>		::= "1-0" | "0-1" | "1/2-1/2" | "*"
 
 '''
 Lexeme → TOKEN Pairing:
@@ -42,41 +47,116 @@ Lexeme → TOKEN Pairing:
     "" → EOF
 
 Returns a list of Token objects from input string.
+
+Recovery mode (a diagnostics list is given): syntax errors are appended to
+the list as Diagnostic records instead of raised and the move parses to
+None. parseGame then skips to the next SEPARATOR (panic mode) and goes on,
+so its list keeps one entry per move. ERROR tokens, moves the lexer could
+not read, become None without a second diagnostic.
+
+Columnar mode (a columnar.MoveColumns is given): no nodes are built, every
+move is appended to the columns as a row and parse returns the row index.
+parseGame appends a failed row for every move that does not parse, so the
+rows of a game line up with its plies.
 '''
 
-from token import Token
+from chess_token import EOF_TOKEN, Diagnostic
 from ast_nodes import CastleNode, PieceMoveNode, PawnMoveNode
 
 class Parser:
-    def __init__(self, tokens):
+    def __init__(self, tokens, diagnostics=None, columns=None):
         self.tokens = tokens
         self.cursor_pos = 0 # pointer
+        self.result = None  # game result, set by parseGame
+        self.diagnostics = diagnostics  # list of Diagnostic in recovery mode, None raises errors
+        self.columns = columns  # MoveColumns filled in columnar mode, None builds nodes
 
 
-    def raiseError(self, message):
+    def errorMessage(self, message):
         current_token = self.lookAhead()
         token_info = f" at position {self.cursor_pos}"
         if current_token.type != "EOF":
             token_info += f" (token: {current_token.type} = '{current_token.content}')"
-        raise SyntaxError(message + token_info)
+        return message + token_info
+
+    def raiseError(self, message):
+        raise SyntaxError(self.errorMessage(message))
+
+    def reportError(self, message):
+        """Raises, or in recovery mode records the error and returns None for the failed move"""
+        if self.diagnostics is None:
+            self.raiseError(message)
+        self.diagnostics.append(Diagnostic('parser', self.cursor_pos, self.errorMessage(message)))
+        return None
 
     def getTokens(self):
         return self.tokens
     
     def parse(self):
         move = self.parseMove()
+        if move is None:
+            return None
 
         current_token = self.lookAhead()
         if current_token.type != "EOF":
-            self.raiseError(f"Unexpected token after move, expected EOF")
+            self.dropRow()
+            return self.reportError(f"Unexpected token after move, expected EOF")
 
         return move
     
+    def dropRow(self):
+        """Columnar mode, takes back the row of a move that turned out not to be complete"""
+        if self.columns is not None:
+            self.columns.pop()
+    
+    def parseGame(self):
+        """Parses a whole game token stream in one pass, returns the list of move nodes (None for failed moves)"""
+        moves = []
+        
+        while True:
+            current_token = self.lookAhead()
+            
+            if current_token.type in ["SEPARATOR", "MOVE_NUMBER"]:
+                self.cursor_pos += 1
+            elif current_token.type == "RESULT":
+                self.result = self.match("RESULT").content
+                if self.lookAhead().type != "EOF":
+                    self.reportError(f"Unexpected token after result, expected EOF")
+                break
+            elif current_token.type == "EOF":
+                break
+            else:
+                move = self.parseMove()
+                
+                # a move ends at whitespace or at the end of the game
+                next_token = self.lookAhead()
+                if move is not None and next_token.type not in ["SEPARATOR", "EOF"]:
+                    self.dropRow()
+                    move = self.reportError(f"Unexpected token after move, expected end of move")
+
+                if move is None:
+                    # recovery mode, resume at the next move
+                    self.skipMove()
+                    if self.columns is not None:
+                        move = self.columns.appendFailed()
+                elif next_token.type == "SEPARATOR":
+                    self.cursor_pos += 1
+                moves.append(move)
+        
+        return moves
+    
+    def skipMove(self):
+        """Panic mode, skips the rest of a failed move up to the SEPARATOR (or EOF) that ends it"""
+        while self.lookAhead().type not in ("SEPARATOR", "EOF"):
+            self.cursor_pos += 1
+        if self.lookAhead().type == "SEPARATOR":
+            self.cursor_pos += 1
+    
     def lookAhead(self):
         if self.cursor_pos < len(self.tokens): # looks ahead only if available
             return self.tokens[self.cursor_pos]
         else:
-            return Token("EOF", "")
+            return EOF_TOKEN
         
     # if current token matches the expected type, move cursor up and return token
     def match(self, token_type):
@@ -85,7 +165,7 @@ class Parser:
         if current_token.type == token_type:
             self.cursor_pos += 1
             return current_token
-        self.raiseError(f"Expected {token_type}, got {current_token.type}")
+        return self.reportError(f"Expected {token_type}, got {current_token.type}")
 
     def parseMove(self):
         current_token = self.lookAhead()
@@ -96,8 +176,11 @@ class Parser:
             return self.parsePieceMove()
         elif current_token.type in ["SQUARE", "FILE"]:
             return self.parsePawnMove()
+        elif current_token.type == "ERROR":
+            # recovery mode, the lexer has reported it already
+            return None
         else:
-            self.raiseError(f"Unexpected token at start of move: {current_token.type}")
+            return self.reportError(f"Unexpected token at start of move: {current_token.type}")
 
     def parseCastle(self):
         current_token = self.lookAhead()
@@ -110,7 +193,7 @@ class Parser:
             self.match("CASTLE_QUEENSIDE")
             side = "queen"
         else:
-            self.raiseError(f"Expected CASTLE_KINGSIDE or CASTLE_QUEENSIDE, got {current_token.type}")
+            return self.reportError(f"Expected CASTLE_KINGSIDE or CASTLE_QUEENSIDE, got {current_token.type}")
         
         # Check for check/checkmate after castling
         next_token = self.lookAhead()
@@ -124,6 +207,8 @@ class Parser:
             self.match("CHECKMATE")
             checkmate = True
         
+        if self.columns is not None:
+            return self.columns.appendCastle(side, check, checkmate)
         return CastleNode(side=side, check=check, checkmate=checkmate)
     
     def parsePieceMove(self):
@@ -154,7 +239,7 @@ class Parser:
                     square = self.match("SQUARE")
                     next_token = self.lookAhead()
                 else:
-                    self.raiseError(f"Expected destination SQUARE after capture")
+                    return self.reportError(f"Expected destination SQUARE after capture")
             elif next_token.type == "SQUARE":
                 # handles case where there is a square disambig wihout a capture after it.. i.e. Qh4e1
                 disambig = first_square
@@ -186,7 +271,7 @@ class Parser:
                 square = self.match("SQUARE")
                 next_token = self.lookAhead()
             else:
-                self.raiseError(f"Expected SQUARE after piece move")
+                return self.reportError(f"Expected SQUARE after piece move")
         
         # checking for check/checkmate
         check = False
@@ -198,6 +283,9 @@ class Parser:
             self.match("CHECKMATE")
             checkmate = True
         
+        if self.columns is not None:
+            return self.columns.appendPieceMove(piece.content, square.content, disambig.content if disambig else None,
+                                                capture, check, checkmate)
         return PieceMoveNode(
             piece=piece.content,
             square=square.content,
@@ -235,11 +323,13 @@ class Parser:
             square = self.match("SQUARE")
             next_token = self.lookAhead()
         else:
-            self.raiseError(f"Expected SQUARE in pawn move, got {next_token.type}")
+            return self.reportError(f"Expected SQUARE in pawn move, got {next_token.type}")
 
         if next_token.type == "PROMOTION_SYMBOL":
             self.match("PROMOTION_SYMBOL")
             promotion = self.match("PIECE") # promotion piece
+            if promotion is None:
+                return None
             next_token = self.lookAhead()
 
         # checks for checkmate or check
@@ -252,6 +342,9 @@ class Parser:
             self.match("CHECKMATE")
             checkmate = True
 
+        if self.columns is not None:
+            return self.columns.appendPawnMove(square.content, file.content if file else None, capture,
+                                               promotion.content if promotion else None, check, checkmate)
         return PawnMoveNode(
             square=square.content,
             file=file.content if file else None,
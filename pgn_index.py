@@ -0,0 +1,162 @@
+# PGN Index - lightweight game/move offset index for random access into huge PGN files
+'''
+The file is memory-mapped and scanned once with the PGN token pattern
+(the same one PGNLexer uses, run over bytes), recording for every game:
+    game_starts[g]  byte offset where the game starts
+    game_ends[g]    byte offset just past the game
+    tag_counts[g]   number of distinct tag names of the game
+    move_starts[g]  number of moves in all games before g
+so any game, or the game holding any move, is found without reading the
+rest of the file. Games are only lexed and parsed again when they are read.
+'''
+import mmap
+from array import array
+from bisect import bisect_right
+
+from pgn_lexer import PGN_BYTE_TOKEN, PGNByteLexer
+from pipeline import compile_spans_all
+from ast_nodes import GameNode
+
+SCAN_BATCH = 1000   # games indexed per scan() call by default
+
+
+class PGNIndex:
+    def __init__(self, filename):
+        self.filename = filename
+        self.file = open(filename, 'rb')
+        self.size = self.file.seek(0, 2)
+        # an empty file cannot be mapped
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b''
+        
+        self.game_starts = array('Q')
+        self.game_ends   = array('Q')
+        self.tag_counts  = array('I')
+        self.move_starts = array('Q', [0])  # one more entry than games, last is the total
+        self.scan_pos    = 0                # byte offset where scanning resumes
+        self.complete    = False
+    
+    def close(self):
+        if self.data:
+            self.data.close()
+        self.file.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def raiseError(self, pos, message):
+        raise ValueError(f'{pos}: {message}')
+    
+    def gameCount(self):
+        return len(self.move_starts) - 1
+    
+    def moveCount(self):
+        return self.move_starts[-1]
+    
+    def gameMoveCount(self, game):
+        return self.move_starts[game + 1] - self.move_starts[game]
+    
+    def gameOfMove(self, move):
+        """Index of the game holding the move with this global index"""
+        return bisect_right(self.move_starts, move) - 1
+    
+    def addGame(self, start, end, tags, moves):
+        self.game_starts.append(start)
+        self.game_ends.append(end)
+        self.tag_counts.append(len(tags))
+        # appended last, gameCount() only sees complete entries
+        self.move_starts.append(self.move_starts[-1] + moves)
+    
+    def scan(self, max_games=SCAN_BATCH):
+        """Indexes up to max_games more games, returns how many were added"""
+        if self.complete:
+            return 0
+        
+        added = 0
+        game_start = None
+        tags = set()            # tag names, a repeated name overwrites the earlier pair
+        moves = 0
+        depth = 0               # variation nesting
+        in_movetext = False
+        
+        for m in PGN_BYTE_TOKEN.finditer(self.data, self.scan_pos):
+            kind = m.lastgroup
+            if kind == 'WHITESPACE':
+                continue
+            if game_start is None and depth == 0 and kind in ('TAG', 'SAN', 'RESULT'):
+                # a game starts at its first tag, move or result, as in PGNParser
+                game_start = m.start()
+            
+            if kind == 'TAG' and depth == 0:
+                if in_movetext:
+                    # a new tag section starts the next game, the current one had no result
+                    self.addGame(game_start, m.start(), tags, moves)
+                    added += 1
+                    if added == max_games:
+                        self.scan_pos = m.start()
+                        return added
+                    game_start = m.start()
+                    tags = set()
+                    moves = 0
+                    in_movetext = False
+                tags.add(m.group('tag_name'))
+                continue
+            
+            in_movetext = game_start is not None
+            if kind == 'SAN':
+                if depth == 0:
+                    moves += 1
+            elif kind == 'VARIATION_START':
+                depth += 1
+            elif kind == 'VARIATION_END':
+                if depth:
+                    depth -= 1
+            elif kind == 'RESULT' and depth == 0:
+                self.addGame(game_start, m.end(), tags, moves)
+                added += 1
+                game_start = None
+                tags = set()
+                moves = 0
+                in_movetext = False
+                if added == max_games:
+                    self.scan_pos = m.end()
+                    return added
+            elif kind == 'OPEN_TAG':
+                self.raiseError(m.start(), "Unterminated tag pair")
+            elif kind == 'OPEN_COMMENT':
+                self.raiseError(m.start(), "Unterminated comment")
+            elif kind == 'ERROR':
+                self.raiseError(m.start(), f"Unrecognized character '{m.group().decode('latin-1')}'")
+        
+        # end of file closes the last game
+        if game_start is not None:
+            self.addGame(game_start, self.size, tags, moves)
+            added += 1
+        self.scan_pos = self.size
+        self.complete = True
+        return added
+    
+    def build(self):
+        """Indexes the whole file"""
+        while self.scan():
+            pass
+        return self
+    
+    def lexGame(self, game):
+        """Lexes and parses a single game straight from the mapped file, returns (GameNode, move spans)"""
+        lexer = PGNByteLexer(self.data, self.game_starts[game], self.game_ends[game])
+        return next(lexer.parseGames(keep_annotations=False), (GameNode(), []))
+    
+    def readGame(self, game):
+        """Lexes and parses a single game straight from the mapped file"""
+        return self.lexGame(game)[0]
+    
+    def compileGame(self, game):
+        """Reads a game and compiles its moves, returns (GameNode, {"simple": [...], "verbose": [...]})
+        
+        Moves are compiled from their bytes in the mapped file, the SAN strings are only read for display.
+        """
+        pgn_game, spans = self.lexGame(game)
+        return pgn_game, compile_spans_all(self.data, spans)
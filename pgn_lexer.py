@@ -0,0 +1,318 @@
+# PGN Lexer Class for Tokenizing whole PGN databases (above the SAN Lexer)
+'''
+Lexeme → TOKEN Pairing:
+1. Tag pair :
+    [Name "Value"] → TAG, content is (name, value)
+2. Comments :
+    1.   {text}      → COMMENT
+    2.   ; text      → COMMENT (runs to end of line)
+3. Variations :
+    1.   `(` → VARIATION_START
+    2.   `)` → VARIATION_END
+4. Numeric Annotation Glyph :
+    $n → NAG
+5. Move suffix annotation :
+    !, ?, !!, ??, !?, ?! → ANNOTATION
+6. Move number :
+    1. or 12... → MOVE_NUMBER
+7. Game result :
+    1-0, 0-1, 1/2-1/2, * → RESULT
+8. Move :
+    anything else up to whitespace or one of the symbols above → SAN
+    (validated later by the SAN Lexer/Parser)
+9. End of File
+    "" → EOF
+
+Input is fed in chunks of any size, a token cut at the end of a chunk
+is carried over to the next one so the whole file is read in one pass.
+
+PGNByteLexer runs the same pattern over UTF-8 bytes (e.g. an mmap of the
+file) without decoding it. Tokens are three integer arrays (kind, offset,
+length), their text is only decoded when asked for. The whitespace of the
+str pattern is spelled out as UTF-8 in the bytes one, so both split at the
+same separators (e.g. a no-break space between two moves).
+'''
+import re
+from array import array
+
+from chess_token import Token, EOF_TOKEN
+from ast_nodes import GameNode
+
+PGN_TOKEN = re.compile(r'''
+      (?P<WHITESPACE>\s+)
+    | (?P<TAG>\[\s*(?P<tag_name>[A-Za-z0-9_]+)\s+"(?P<tag_value>(?:[^"\\\n]|\\.)*)"\s*\])
+    | (?P<OPEN_TAG>\[[^\]\n]*\Z)
+    | (?P<COMMENT>\{(?P<comment>[^}]*)\})
+    | (?P<OPEN_COMMENT>\{[^}]*\Z)
+    | (?P<LINE_COMMENT>;(?P<line_comment>[^\n]*)(?:\n|\Z))
+    | (?P<VARIATION_START>\()
+    | (?P<VARIATION_END>\))
+    | (?P<NAG>\$[0-9]+)
+    | (?P<ANNOTATION>[!?]+)
+    | (?P<RESULT>1-0|0-1|1/2-1/2|\*)
+    | (?P<MOVE_NUMBER>[0-9]+\.+)
+    | (?P<SAN>[^\s{}()\[\];$!?]+)
+    | (?P<ERROR>.)
+''', re.VERBOSE | re.DOTALL)
+
+TAG_ESCAPE = re.compile(r'\\(.)')
+
+# what \s matches in a str pattern as UTF-8 bytes: ASCII whitespace, and the multi-byte kinds
+ASCII_WHITESPACE = rb'[\t-\r\x1c-\x20]'
+WIDE_WHITESPACE = rb'(?:\xc2[\x85\xa0]|\xe1\x9a\x80|\xe2\x80[\x80-\x8a\xa8\xa9\xaf]|\xe2\x81\x9f|\xe3\x80\x80)'
+# SAN bytes: a lead byte of wide whitespace only where it starts something else
+SAN_BYTE = rb'[^\t-\r\x1c-\x20{}()\[\];$!?\xc2\xe1-\xe3]'
+SAN_LEAD = rb'(?!' + WIDE_WHITESPACE + rb')[\xc2\xe1-\xe3]' + SAN_BYTE + rb'*'
+
+# PGN_TOKEN over UTF-8 bytes, splitting where the decoded text would (loops unrolled, ASCII runs go first)
+PGN_BYTE_TOKEN = re.compile(PGN_TOKEN.pattern.encode()
+                            .replace(rb'(?P<WHITESPACE>\s+)', rb'(?P<WHITESPACE>' + ASCII_WHITESPACE + rb'+|'
+                                     + WIDE_WHITESPACE + rb'+)')
+                            .replace(rb'[^\s{}()\[\];$!?]+', SAN_BYTE + rb'+(?:' + SAN_LEAD + rb')*|(?:'
+                                     + SAN_LEAD + rb')+')
+                            .replace(rb'\s', rb'(?:' + ASCII_WHITESPACE + rb'|' + WIDE_WHITESPACE + rb')'),
+                            re.VERBOSE | re.DOTALL)
+
+# token kinds of PGNByteLexer, by code
+BYTE_KINDS = ('TAG', 'COMMENT', 'LINE_COMMENT', 'VARIATION_START', 'VARIATION_END', 'NAG', 'ANNOTATION',
+              'RESULT', 'MOVE_NUMBER', 'SAN')
+KIND_CODES = {kind: code for code, kind in enumerate(BYTE_KINDS)}
+(TAG, COMMENT, LINE_COMMENT, VARIATION_START, VARIATION_END, NAG, ANNOTATION,
+ RESULT, MOVE_NUMBER, SAN) = range(len(BYTE_KINDS))
+CHUNK_SIZE = 1 << 16    # characters read from a file at a time
+FILL_TOKENS = 1 << 16   # tokens PGNByteLexer lexes at a time
+
+
+class PGNLexer:
+    def __init__(self, source):
+        # source is either a whole string or an iterable of text chunks (e.g. an open file)
+        self.source     = [source] if isinstance(source, str) else source
+        self.cursor_pos = 0     # offset of the pending text in the whole input
+        self.pending    = ''    # text carried over from the previous chunk
+    
+    @classmethod
+    def fromFile(cls, f, chunk_size=CHUNK_SIZE):
+        """Builds a lexer reading an open text file in fixed-size chunks"""
+        return cls(iter(lambda: f.read(chunk_size), ''))
+    
+    # Helper function to raise error
+    def raiseError(self, message):
+        raise ValueError(f'{self.cursor_pos}: {message}')
+    
+    def tokenize(self):
+        """Yields tokens for the whole input, then EOF"""
+        for chunk in self.source:
+            yield from self.feed(chunk)
+        yield from self.feed('', final=True)
+        yield EOF_TOKEN
+    
+    def feed(self, text, final=False):
+        """Tokenizes the next chunk of input, returns the tokens that are complete"""
+        buffer = self.pending + text
+        n = len(buffer)
+        tokens = []
+        
+        for m in PGN_TOKEN.finditer(buffer):
+            kind = m.lastgroup
+            
+            # a token touching the end of the buffer may continue in the next chunk
+            if m.end() == n and not final and kind != 'WHITESPACE':
+                self.pending = buffer[m.start():]
+                self.cursor_pos += m.start()
+                return tokens
+            
+            if kind == 'WHITESPACE':
+                continue
+            elif kind == 'SAN':
+                tokens.append(Token('SAN', m.group()))
+            elif kind == 'MOVE_NUMBER':
+                tokens.append(Token('MOVE_NUMBER', m.group()))
+            elif kind == 'TAG':
+                value = TAG_ESCAPE.sub(r'\1', m.group('tag_value'))
+                tokens.append(Token('TAG', (m.group('tag_name'), value)))
+            elif kind == 'COMMENT':
+                tokens.append(Token('COMMENT', m.group('comment').strip()))
+            elif kind == 'LINE_COMMENT':
+                tokens.append(Token('COMMENT', m.group('line_comment').strip()))
+            elif kind in ('OPEN_TAG', 'OPEN_COMMENT'):
+                # only reached on the final chunk
+                self.cursor_pos += m.start()
+                self.raiseError("Unterminated tag pair" if kind == 'OPEN_TAG' else "Unterminated comment")
+            elif kind == 'ERROR':
+                self.cursor_pos += m.start()
+                self.raiseError(f"Unrecognized character '{m.group()}'")
+            else:
+                tokens.append(Token(kind, m.group()))
+        
+        self.pending = ''
+        self.cursor_pos += n
+        return tokens
+
+
+class PGNByteLexer:
+    """PGN lexer over bytes, an mmap or a memoryview, tokens are kept as integer arrays
+    
+    Token i is BYTE_KINDS[kinds[i]] at data[offsets[i]:offsets[i] + lengths[i]].
+    Tokens are lexed FILL_TOKENS at a time as parseGames needs them, and
+    dropped again once their games are done, so memory stays flat however
+    large the mapped file is. Error positions are byte offsets from start.
+    """
+    def __init__(self, data, start=0, end=None):
+        self.data       = data
+        self.start      = start
+        self.end        = len(data) if end is None else end
+        self.cursor_pos = 0
+        self.scan_pos   = start     # byte offset where lexing resumes
+        self.kinds      = array('B')
+        self.offsets    = array('Q')
+        self.lengths    = array('I')
+    
+    def raiseError(self, message):
+        raise ValueError(f'{self.cursor_pos}: {message}')
+    
+    def fill(self, max_tokens=FILL_TOKENS):
+        """Lexes up to max_tokens more tokens, returns how many were added"""
+        kinds = self.kinds
+        offsets = self.offsets
+        lengths = self.lengths
+        kind_codes = KIND_CODES
+        added = 0
+        
+        for m in PGN_BYTE_TOKEN.finditer(self.data, self.scan_pos, self.end):
+            kind = m.lastgroup
+            if kind == 'WHITESPACE':
+                continue
+            code = kind_codes.get(kind)
+            if code is None:
+                self.cursor_pos = m.start() - self.start
+                if kind == 'ERROR':
+                    char = bytes(self.data[m.start():m.start() + 4]).decode('utf-8', errors='replace')[0]
+                    self.raiseError(f"Unrecognized character '{char}'")
+                self.raiseError("Unterminated tag pair" if kind == 'OPEN_TAG' else "Unterminated comment")
+            start = m.start()
+            kinds.append(code)
+            offsets.append(start)
+            lengths.append(m.end() - start)
+            added += 1
+            if added == max_tokens:
+                self.scan_pos = m.end()
+                return added
+        
+        self.scan_pos = self.end
+        self.cursor_pos = self.end - self.start
+        return added
+    
+    def tokenize(self):
+        """Lexes the rest of data[start:end], returns self"""
+        while self.fill():
+            pass
+        return self
+    
+    def available(self, index):
+        """Whether token index exists, lexing more when needed"""
+        return index < len(self.kinds) or (self.fill() > 0 and index < len(self.kinds))
+    
+    def discard(self, count):
+        """Drops the first count tokens, later indices shift down by count"""
+        del self.kinds[:count]
+        del self.offsets[:count]
+        del self.lengths[:count]
+    
+    def tokenCount(self):
+        return len(self.kinds)
+    
+    def raw(self, index):
+        offset = self.offsets[index]
+        return bytes(self.data[offset:offset + self.lengths[index]])
+    
+    def text(self, index):
+        return self.raw(index).decode('utf-8', errors='replace')
+    
+    def content(self, index):
+        """What PGNLexer's token would carry: (name, value) for tags, stripped text for comments"""
+        kind = self.kinds[index]
+        if kind == TAG:
+            m = PGN_BYTE_TOKEN.match(self.raw(index))
+            return (m.group('tag_name').decode('utf-8', errors='replace'),
+                    TAG_ESCAPE.sub(r'\1', m.group('tag_value').decode('utf-8', errors='replace')))
+        if kind == COMMENT:
+            return self.text(index)[1:-1].strip()
+        if kind == LINE_COMMENT:
+            return self.text(index)[1:].strip()
+        return self.text(index)
+    
+    def token(self, index):
+        """Token i as PGNLexer would have made it"""
+        kind = BYTE_KINDS[self.kinds[index]]
+        return Token('COMMENT' if kind == 'LINE_COMMENT' else kind, self.content(index))
+    
+    def parseGames(self, keep_annotations=True):
+        """Splits the tokens into games as PGNParser does, yields (GameNode, (offset, length) of every move)
+        
+        Only tags, moves, results and (with keep_annotations) annotations are decoded.
+        """
+        kinds = self.kinds
+        available = self.available
+        i = 0
+        
+        while True:
+            if i >= FILL_TOKENS:
+                # the games before token i are done
+                self.discard(i)
+                i = 0
+            
+            # a game starts at its first tag, move or result, as in PGNParser
+            while available(i) and kinds[i] not in (TAG, SAN, RESULT):
+                if kinds[i] == VARIATION_START:
+                    i = self.skipVariation(i)
+                else:
+                    i += 1
+            if not available(i):
+                return
+            
+            headers = {}
+            while available(i) and kinds[i] == TAG:
+                name, value = self.content(i)
+                headers[name] = value
+                i += 1
+            
+            move_tokens = []
+            annotations = []
+            result = None
+            while available(i):
+                kind = kinds[i]
+                if kind == SAN:
+                    move_tokens.append(i)
+                elif kind in (COMMENT, LINE_COMMENT, NAG, ANNOTATION):
+                    # attached to the last move played, -1 when before the first move
+                    if keep_annotations:
+                        annotations.append((len(move_tokens) - 1, self.content(i)))
+                elif kind == VARIATION_START:
+                    i = self.skipVariation(i)
+                    continue
+                elif kind == RESULT:
+                    result = self.text(i)
+                    i += 1
+                    break
+                elif kind == TAG:
+                    # next game starts without a result
+                    break
+                i += 1
+            
+            moves = [self.text(index) for index in move_tokens]
+            spans = [(self.offsets[index], self.lengths[index]) for index in move_tokens]
+            yield GameNode(headers=headers, moves=moves, result=result, annotations=annotations), spans
+    
+    def skipVariation(self, i):
+        """Index of the token after the (possibly nested) variation starting at token i"""
+        depth = 0
+        while self.available(i):
+            kind = self.kinds[i]
+            if kind == VARIATION_START:
+                depth += 1
+            elif kind == VARIATION_END:
+                depth -= 1
+            i += 1
+            if not depth:
+                return i
+        raise SyntaxError("Unterminated variation")
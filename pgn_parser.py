@@ -0,0 +1,118 @@
+# PGN Parser Class for splitting PGN databases into games (above the SAN Parser)
+# <database>    ::= <game>*
+# <game>        ::= <tag>* <movetext> <result>
+# <movetext>    ::= ( <move_number> | <san> <annotation>* | <comment> | <nag> | <variation> )*
+# <variation>   ::= "(" <movetext> ")"
+# <result>      ::= "1-0" | "0-1" | "1/2-1/2" | "*" | ε
+#
+# A game also ends when a new tag section starts or at EOF, so files
+# without results still split correctly. Variations are skipped, comments,
+# NAGs and suffix annotations are attached to the move they follow.
+# A game starts at its first tag, move or result, whatever stands between
+# games (comments, stray move numbers, variations) is skipped.
+
+from chess_token import EOF_TOKEN
+from ast_nodes import GameNode
+
+
+class PGNParser:
+    def __init__(self, tokens, keep_annotations=True):
+        self.tokens = iter(tokens)  # any token iterable, e.g. PGNLexer.tokenize()
+        self.current = next(self.tokens, EOF_TOKEN)
+        self.keep_annotations = keep_annotations
+    
+    def raiseError(self, message):
+        current_token = self.lookAhead()
+        token_info = ""
+        if current_token.type != "EOF":
+            token_info = f" (token: {current_token.type} = '{current_token.content}')"
+        raise SyntaxError(message + token_info)
+    
+    def lookAhead(self):
+        return self.current
+    
+    def advance(self):
+        token = self.current
+        self.current = next(self.tokens, EOF_TOKEN)
+        return token
+    
+    def parseGames(self):
+        """Yields every game until EOF"""
+        while True:
+            game = self.parseGame()
+            if game is None:
+                return
+            yield game
+    
+    def skipToGame(self):
+        """Skips the tokens before the next game's first tag, move or result, returns False at EOF"""
+        while True:
+            token_type = self.lookAhead().type
+            if token_type in ("TAG", "SAN", "RESULT"):
+                return True
+            if token_type == "EOF":
+                return False
+            if token_type == "VARIATION_START":
+                self.skipVariation()
+            else:
+                self.advance()
+    
+    def parseGame(self):
+        """Parses one game, returns None when there are no more games"""
+        if not self.skipToGame():
+            return None
+        headers = self.parseTags()
+        moves = []
+        annotations = []
+        result = None
+        
+        while True:
+            current_token = self.lookAhead()
+            token_type = current_token.type
+            
+            if token_type == "SAN":
+                moves.append(self.advance().content)
+            elif token_type == "MOVE_NUMBER":
+                self.advance()
+            elif token_type in ("COMMENT", "NAG", "ANNOTATION"):
+                # attached to the last move played, -1 when before the first move
+                self.advance()
+                if self.keep_annotations:
+                    annotations.append((len(moves) - 1, current_token.content))
+            elif token_type == "VARIATION_START":
+                self.skipVariation()
+            elif token_type == "VARIATION_END":
+                # stray closing parenthesis, nothing to close
+                self.advance()
+            elif token_type == "RESULT":
+                result = self.advance().content
+                break
+            elif token_type in ("TAG", "EOF"):
+                # next game starts without a result, or the file ended
+                break
+            else:
+                self.raiseError(f"Unexpected token in movetext: {token_type}")
+        
+        return GameNode(headers=headers, moves=moves, result=result, annotations=annotations)
+    
+    def parseTags(self):
+        headers = {}
+        while self.lookAhead().type == "TAG":
+            name, value = self.advance().content
+            headers[name] = value
+        return headers
+    
+    def skipVariation(self):
+        """Skips a (possibly nested) variation"""
+        self.advance()
+        depth = 1
+        
+        while depth:
+            token_type = self.lookAhead().type
+            if token_type == "VARIATION_START":
+                depth += 1
+            elif token_type == "VARIATION_END":
+                depth -= 1
+            elif token_type == "EOF":
+                self.raiseError("Unterminated variation")
+            self.advance()
@@ -0,0 +1,207 @@
+# Virtual PGN View - scrollable output that only compiles and renders the visible rows
+'''
+Every game of a PGNIndex takes a fixed number of output rows:
+    Game N
+    <one row per tag pair>
+    Total moves / Output mode / blank
+    <column header, two rows>
+    <one row per full move>
+    blank
+so the row layout of the whole file is known from the index alone. The
+Text widget only ever holds the rows on screen, the games behind them are
+read from the index and compiled on demand and kept in a small LRU cache.
+'''
+import operator
+import tkinter as tk
+from tkinter import ttk, font
+from array import array
+from bisect import bisect_right
+from itertools import accumulate
+from collections import OrderedDict
+
+from pipeline import format_pgn_headers, format_pgn_output
+
+GAME_CACHE_SIZE = 64    # compiled games kept around the visible rows
+BUFFER_ROWS     = 50    # rows above and below the screen whose games are compiled ahead
+FIXED_GAME_ROWS = 7     # Game N, Total moves, Output mode, blank, column header x2, trailing blank
+
+
+def game_row_count(tags, moves):
+    """Number of output rows of a game"""
+    return FIXED_GAME_ROWS + tags + (moves + 1) // 2
+
+
+class VirtualPGNView(ttk.Frame):
+    def __init__(self, parent, mode="simple", **kwargs):
+        super().__init__(parent, **kwargs)
+        self.mode = mode
+        self.index = None
+        self.row_starts = array('Q', [0])   # first row of every game, last entry is the total
+        self.messages = []                  # extra rows shown after the games
+        self.games = OrderedDict()          # game index -> (game, translations)
+        self.top = 0                        # first visible row
+        
+        self.text = tk.Text(self, font=('Courier', 10), wrap='none', state='disabled')
+        self.yscroll = ttk.Scrollbar(self, orient='vertical', command=self.yview)
+        self.xscroll = ttk.Scrollbar(self, orient='horizontal', command=self.text.xview)
+        self.text.config(xscrollcommand=self.xscroll.set)
+        
+        self.text.grid(row=0, column=0, sticky='nsew')
+        self.yscroll.grid(row=0, column=1, sticky='ns')
+        self.xscroll.grid(row=1, column=0, sticky='ew')
+        self.rowconfigure(0, weight=1)
+        self.columnconfigure(0, weight=1)
+        
+        self.line_height = max(font.Font(font=self.text['font']).metrics('linespace'), 1)
+        
+        self.text.bind('<Configure>', lambda event: self.render())
+        self.text.bind('<MouseWheel>', self.on_wheel)
+        self.text.bind('<Button-4>', lambda event: self.scroll(-3))
+        self.text.bind('<Button-5>', lambda event: self.scroll(3))
+        self.text.bind('<Up>', lambda event: self.scroll(-1))
+        self.text.bind('<Down>', lambda event: self.scroll(1))
+        self.text.bind('<Prior>', lambda event: self.scroll(-self.visible_rows()))
+        self.text.bind('<Next>', lambda event: self.scroll(self.visible_rows()))
+        self.text.bind('<Home>', lambda event: self.scroll_to(0))
+        self.text.bind('<End>', lambda event: self.scroll_to(self.total_rows()))
+    
+    def set_index(self, index):
+        """Shows the games of a (possibly still growing) PGNIndex"""
+        self.index = index
+        self.row_starts = array('Q', [0])
+        self.messages = []
+        self.games.clear()
+        self.top = 0
+        self.refresh()
+    
+    def set_mode(self, mode):
+        # both modes are compiled together, only the rows change
+        self.mode = mode
+        self.render()
+    
+    def show_message(self, message):
+        """Adds a row after the games, e.g. an error"""
+        self.messages.append(message)
+        self.render()
+    
+    def show_messages(self, messages):
+        """Adds rows after the games, the view follows them when it was showing the last row"""
+        at_end = self.top + self.visible_rows() >= self.total_rows()
+        self.messages.extend(messages)
+        if at_end:
+            self.top = self.total_rows()
+        self.render()
+    
+    def clear(self):
+        self.set_index(None)
+    
+    def refresh(self):
+        """Picks up games indexed since the last call and redraws"""
+        if self.index is not None:
+            # one pass over the new games, a cached file adds millions at once
+            first = len(self.row_starts) - 1
+            last = self.index.gameCount()
+            tag_counts = self.index.tag_counts[first:last]
+            move_counts = map(operator.sub, self.index.move_starts[first + 1:last + 1],
+                              self.index.move_starts[first:last])
+            row_starts = accumulate(map(game_row_count, tag_counts, move_counts), initial=self.row_starts[-1])
+            next(row_starts)
+            self.row_starts.extend(row_starts)
+        self.render()
+    
+    def game_count(self):
+        return len(self.row_starts) - 1
+    
+    def total_rows(self):
+        return self.row_starts[-1] + len(self.messages)
+    
+    def visible_rows(self):
+        return max(self.text.winfo_height() // self.line_height, 1)
+    
+    def compiled_game(self, game):
+        """Reads and compiles one game, least recently shown games are dropped"""
+        if game in self.games:
+            self.games.move_to_end(game)
+            return self.games[game]
+        
+        try:
+            compiled = self.index.compileGame(game)
+        except Exception as e:
+            compiled = (str(e), None)
+        self.games[game] = compiled
+        if len(self.games) > GAME_CACHE_SIZE:
+            self.games.popitem(last=False)
+        return compiled
+    
+    def game_lines(self, game):
+        pgn_game, translations = self.compiled_game(game)
+        rows = self.row_starts[game + 1] - self.row_starts[game]
+        if translations is None:
+            # keep the row layout even when the game cannot be read
+            output = [f"Game {game + 1}", f"Error: {pgn_game}"]
+        else:
+            output = [f"Game {game + 1}"]
+            output.extend(format_pgn_headers(pgn_game.headers))
+            output.extend(format_pgn_output(pgn_game.moves, self.mode, translations[self.mode]))
+            output.append("")
+        return (output + [""] * rows)[:rows]
+    
+    def row_lines(self, first, last):
+        """Output rows first..last-1 of the whole file"""
+        output = []
+        games_end = self.row_starts[-1]
+        row = first
+        while row < min(last, games_end):
+            game = bisect_right(self.row_starts, row) - 1
+            start = self.row_starts[game]
+            lines = self.game_lines(game)
+            output.extend(lines[row - start:last - start])
+            row = start + len(lines)
+        if last > games_end:
+            output.extend(self.messages[max(first - games_end, 0):last - games_end])
+        return output
+    
+    def prefetch(self, first, last):
+        """Compiles the games just off screen so scrolling does not stall"""
+        for row in (first - BUFFER_ROWS, last + BUFFER_ROWS):
+            if 0 <= row < self.row_starts[-1]:
+                self.compiled_game(bisect_right(self.row_starts, row) - 1)
+    
+    def render(self):
+        visible = self.visible_rows()
+        total = self.total_rows()
+        self.top = max(min(self.top, total - visible), 0)
+        last = min(self.top + visible, total)
+        
+        lines = self.row_lines(self.top, last)
+        self.text.config(state='normal')
+        self.text.delete('1.0', tk.END)
+        self.text.insert('1.0', '\n'.join(lines))
+        self.text.config(state='disabled')
+        
+        if total:
+            self.yscroll.set(self.top / total, last / total)
+        else:
+            self.yscroll.set(0, 1)
+        self.prefetch(self.top, last)
+    
+    def scroll_to(self, row):
+        self.top = max(int(row), 0)
+        self.render()
+        return 'break'
+    
+    def scroll(self, rows):
+        return self.scroll_to(self.top + rows)
+    
+    def on_wheel(self, event):
+        return self.scroll(-3 if event.delta > 0 else 3)
+    
+    def yview(self, *args):
+        """Scrollbar command, same arguments as Text.yview"""
+        if args[0] == 'moveto':
+            self.scroll_to(float(args[1]) * self.total_rows())
+        elif args[0] == 'scroll':
+            amount = int(args[1])
+            if args[2] == 'pages':
+                amount *= self.visible_rows()
+            self.scroll(amount)
@@ -0,0 +1,507 @@
+# Compilation Pipeline - Lexer → Parser → CodeGen without any GUI dependencies
+import mmap
+import traceback
+from collections import OrderedDict, namedtuple
+
+from lexer import LEXERS, ByteLexer
+from parser import Parser
+from code_gen import renderer
+from pgn_lexer import PGNLexer, PGNByteLexer, CHUNK_SIZE
+from pgn_parser import PGNParser
+from board import Board
+from ast_nodes import MoveNode, CastleNode, PieceMoveNode, PawnMoveNode
+from chess_token import Diagnostic
+
+DEFAULT_CACHE_SIZE = 8192   # distinct SAN strings kept compiled
+DEFAULT_LEXER = 'table'     # see lexer.LEXERS
+# keys of bulk_lexer.PGN_BYTE_LEXERS, the module (and NumPy) is imported only for 'numpy'
+PGN_BYTE_LEXER_NAMES = ('numpy', 'regex')
+
+# a compiled move: AST node plus both renderings
+# the AST node is shared by every cache hit, treat it as read-only
+CompiledMove = namedtuple('CompiledMove', ['ast', 'simple', 'verbose'])
+
+# fields of the per-move records built by move_records, see writers.py
+RECORD_FIELDS = ('ply', 'san', 'type', 'piece', 'square', 'origin', 'disambig', 'file', 'capture',
+                 'promotion', 'side', 'check', 'checkmate', 'simple', 'verbose', 'error')
+NODE_TYPES = {CastleNode: 'castle', PieceMoveNode: 'piece', PawnMoveNode: 'pawn'}
+
+
+# exceptions raised again for cached failures, by stage
+ERROR_TYPES = {'lexer': ValueError, 'parser': SyntaxError}
+
+
+class CompilationCache:
+    """Bounded LRU cache of compiled moves keyed by the SAN string
+    
+    Moves that fail are kept apart as their Diagnostic, so a noisy database
+    lexes each bad string once: later lookups raise the same error again,
+    or in recovery mode append the diagnostic without raising.
+    """
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.failures = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, notation, diagnostics=None):
+        """Returns the compiled move, compiling it on a miss"""
+        entry = self.entries.get(notation)
+        if entry is not None:
+            self.hits += 1
+            self.entries.move_to_end(notation)
+            return entry
+        
+        failure = self.failures.get(notation)
+        if failure is not None:
+            self.hits += 1
+            self.failures.move_to_end(notation)
+            return self.fail(failure, diagnostics)
+        
+        self.misses += 1
+        failures = []
+        entry = self.compileEntry(notation, failures)
+        if entry is None:
+            self.store(self.failures, notation, failures[0])
+            return self.fail(failures[0], diagnostics)
+        self.store(self.entries, notation, entry)
+        return entry
+    
+    def compileEntry(self, notation, failures):
+        return compile_uncached(notation, failures)
+    
+    def store(self, entries, notation, entry):
+        if self.maxsize > 0:
+            entries[notation] = entry
+            if len(entries) > self.maxsize:
+                # evict least recently used
+                entries.popitem(last=False)
+    
+    def fail(self, failure, diagnostics):
+        """Raises a failed move's error, or appends it to diagnostics and returns None"""
+        if diagnostics is None:
+            raise ERROR_TYPES[failure.stage](failure.message)
+        diagnostics.append(failure)
+        return None
+    
+    def resize(self, maxsize):
+        self.maxsize = maxsize
+        for entries in (self.entries, self.failures):
+            while len(entries) > max(maxsize, 0):
+                entries.popitem(last=False)
+    
+    def clear(self):
+        self.entries.clear()
+        self.failures.clear()
+        self.hits = 0
+        self.misses = 0
+    
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self.entries),
+            'maxsize': self.maxsize,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+class ByteCompilationCache(CompilationCache):
+    """CompilationCache keyed by the raw bytes of a move, misses are lexed straight from the bytes"""
+    def compileEntry(self, notation, failures):
+        return compile_bytes(notation, failures)
+
+
+# lexer implementation used by the pipeline
+lexer_class = LEXERS[DEFAULT_LEXER]
+
+
+def set_lexer(name):
+    """Select the lexer implementation by name, e.g. "classic" or "table" """
+    global lexer_class
+    lexer_class = LEXERS[name]
+
+
+def compile_uncached(notation, diagnostics=None):
+    """Run a SAN move through Lexer → Parser → CodeGen
+    
+    With a diagnostics list (recovery mode), errors are appended to it
+    instead of raised and None is returned for a move that fails.
+    """
+    lexer = lexer_class(notation, diagnostics)
+    tokens = lexer.tokenize()
+    parser = Parser(tokens, diagnostics)
+    ast_node = parser.parse()
+    if ast_node is None:
+        return None
+    simple, verbose = renderer.render(ast_node)
+    return CompiledMove(ast_node, simple, verbose)
+
+
+def compile_bytes(data, diagnostics=None, start=0, end=None):
+    """compile_uncached for the bytes of a move, data[start:end] of bytes, an mmap or a memoryview"""
+    tokens = ByteLexer(data, start, end, diagnostics).tokenize()
+    ast_node = Parser(tokens, diagnostics).parse()
+    if ast_node is None:
+        return None
+    simple, verbose = renderer.render(ast_node)
+    return CompiledMove(ast_node, simple, verbose)
+
+
+# shared by every caller of the pipeline (GUI, batch compiler, worker processes)
+compile_cache = CompilationCache()
+# moves read from mapped files, looked up without decoding them
+byte_cache = ByteCompilationCache()
+
+# optional precompiled table of the whole SAN language, see move_table.py
+move_table = None
+
+
+def compile_move(notation, diagnostics=None):
+    """Compile a single SAN move through the move table (if enabled) and the shared cache
+    
+    With a diagnostics list, a move that fails is reported there and None is returned.
+    """
+    if move_table is not None:
+        compiled = move_table.get(notation)
+        if compiled is not None:
+            return compiled
+    return compile_cache.get(notation, diagnostics)
+
+
+def compile_span(data, offset, length, diagnostics=None):
+    """compile_move for the move at data[offset:offset + length], e.g. a token of PGNByteLexer"""
+    return byte_cache.get(bytes(data[offset:offset + length]), diagnostics)
+
+
+def set_move_table(table):
+    """Enable table mode with any mapping of SAN string to CompiledMove, None disables it"""
+    global move_table
+    move_table = table
+
+
+def parse_game(text, diagnostics=None):
+    """Parse a whole game's movetext with one Lexer and one Parser, returns (move nodes, result)
+    
+    With a diagnostics list, errors are collected there instead of raised and
+    failed moves are None.
+    """
+    lexer = lexer_class(text, diagnostics)
+    tokens = lexer.tokenizeGame()
+    parser = Parser(tokens, diagnostics)
+    moves = parser.parseGame()
+    return moves, parser.result
+
+
+def set_cache_size(maxsize):
+    """Set how many distinct moves the shared cache keeps, 0 disables it"""
+    compile_cache.resize(maxsize)
+    byte_cache.resize(maxsize)
+
+
+def cache_stats():
+    """Counters of the text and byte caches together, each file is read through one of them
+    
+    Both caches have the size set by set_cache_size, maxsize is that size and not their sum.
+    """
+    stats = compile_cache.stats()
+    byte_stats = byte_cache.stats()
+    for name in ('hits', 'misses', 'size'):
+        stats[name] += byte_stats[name]
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+    return stats
+
+
+def read_pgn_games(filename, keep_annotations=True, progress=None):
+    """Yield each game of a PGN file as a GameNode, reading it in a single forward pass"""
+    with open(filename, 'r') as f:
+        if progress is None:
+            lexer = PGNLexer.fromFile(f)
+        else:
+            # report the number of characters read so far after every chunk
+            lexer = PGNLexer(read_chunks(f, progress))
+        parser = PGNParser(lexer.tokenize(), keep_annotations=keep_annotations)
+        yield from parser.parseGames()
+
+
+def pgn_byte_lexer(name):
+    """The PGNByteLexer class of bulk_lexer.PGN_BYTE_LEXERS called name"""
+    if name == 'regex':
+        return PGNByteLexer
+    from bulk_lexer import PGN_BYTE_LEXERS
+    return PGN_BYTE_LEXERS[name]
+
+
+def read_pgn_games_mapped(filename, keep_annotations=True, lexer='regex'):
+    """read_pgn_games over an mmap of the file, only tags, moves and results are ever decoded
+    
+    lexer picks the PGNByteLexer of bulk_lexer.PGN_BYTE_LEXERS, 'numpy' lexes with NumPy.
+    """
+    with open(filename, 'rb') as f:
+        if not f.seek(0, 2):
+            # an empty file cannot be mapped
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            try:
+                for game, _ in pgn_byte_lexer(lexer)(data).parseGames(keep_annotations):
+                    yield game
+            except Exception as e:
+                # the lexer frames of the traceback hold views of the map, which could not be closed
+                traceback.clear_frames(e.__traceback__)
+                raise
+
+
+def compile_spans_all(data, spans):
+    """compile_game_all for moves given as (offset, length) spans of data"""
+    simple = []
+    verbose = []
+    for offset, length in spans:
+        try:
+            compiled = compile_span(data, offset, length)
+            simple.append(compiled.simple)
+            verbose.append(compiled.verbose)
+        except Exception as e:
+            error = f"Error: {str(e)}"
+            simple.append(error)
+            verbose.append(error)
+    return {"simple": simple, "verbose": verbose}
+
+
+def read_chunks(f, progress):
+    """Yields fixed-size chunks of an open file, calling progress(characters read) after each"""
+    characters_read = 0
+    while True:
+        chunk = f.read(CHUNK_SIZE)
+        if not chunk:
+            return
+        characters_read += len(chunk)
+        progress(characters_read)
+        yield chunk
+
+
+def parse_pgn_file(filename):
+    """Parse PGN file and extract moves"""
+    return [move for game in read_pgn_games(filename, keep_annotations=False) for move in game.moves]
+
+
+def translate_move(notation, mode="simple"):
+    """Compile a single SAN move into its Simple or Verbose translation"""
+    compiled = compile_move(notation)
+    
+    if mode == "simple":
+        return compiled.simple
+    return compiled.verbose
+
+
+def format_pgn_headers(headers):
+    """Build the output lines for the tag pairs of a game"""
+    return [f"{name}: {value}" for name, value in headers.items()]
+
+
+def resolve_moves(moves, fen=None, diagnostics=None):
+    """Replay a game on a Board, yields each move's node with its origin resolved, or the error it raised
+    
+    With a diagnostics list, a move that does not compile is yielded as its Diagnostic instead.
+    A bad fen is the error of the first move, the rest of the game is then not resolved.
+    """
+    board = None
+    replaying = True
+    for move_notation in moves:
+        try:
+            compiled = compile_move(move_notation, diagnostics)
+        except Exception as e:
+            compiled = e
+        if not isinstance(compiled, CompiledMove):
+            # the position is unknown after a move that does not compile
+            replaying = False
+            yield diagnostics[-1] if compiled is None else compiled
+            continue
+        node = compiled.ast
+        
+        if not replaying:
+            yield node
+            continue
+        try:
+            if board is None:
+                board = Board(fen)
+            yield board.play(node)
+        except ValueError as e:
+            replaying = False
+            yield e
+
+
+def report(diagnostics, ply, error):
+    """Records a failed move in diagnostics (when given) with its ply, returns its error message"""
+    if isinstance(error, Diagnostic):
+        diagnostics[-1] = Diagnostic(error.stage, error.position, error.message, ply)
+        return error.message
+    if diagnostics is not None:
+        # board errors are found after parsing, they are raised in recovery mode as well
+        diagnostics.append(Diagnostic('board', None, str(error), ply))
+    return str(error)
+
+
+def compile_game(moves, mode="simple", resolve=False, fen=None, diagnostics=None):
+    """Compile every move of a game, failed moves become "Error: ..." texts
+    
+    With resolve, the game is replayed from fen (or the starting position) and
+    moves name their origin square; moves after an illegal one are not resolved.
+    
+    With a diagnostics list (recovery mode for bulk jobs), lexer and parser
+    errors are not raised: every failed move is appended to it as a
+    Diagnostic with its ply, and still gets its "Error: ..." text.
+    """
+    if resolve:
+        render = renderer.renderSimple if mode == "simple" else renderer.renderVerbose
+        return [render(node) if isinstance(node, MoveNode) else f"Error: {report(diagnostics, ply, node)}"
+                for ply, node in enumerate(resolve_moves(moves, fen, diagnostics), start=1)]
+    
+    translations = []
+    if diagnostics is not None:
+        for ply, move_notation in enumerate(moves, start=1):
+            compiled = compile_move(move_notation, diagnostics)
+            if compiled is None:
+                translations.append(f"Error: {report(diagnostics, ply, diagnostics[-1])}")
+            else:
+                translations.append(compiled.simple if mode == "simple" else compiled.verbose)
+        return translations
+    
+    for move_notation in moves:
+        try:
+            translations.append(translate_move(move_notation, mode))
+        except Exception as e:
+            translations.append(f"Error: {str(e)}")
+    return translations
+
+
+def compile_game_all(moves, resolve=False, fen=None):
+    """Compile every move of a game into both modes at once, returns {"simple": [...], "verbose": [...]}"""
+    simple = []
+    verbose = []
+    if resolve:
+        for node in resolve_moves(moves, fen):
+            if isinstance(node, Exception):
+                error = f"Error: {str(node)}"
+                simple.append(error)
+                verbose.append(error)
+            else:
+                simple_text, verbose_text = renderer.render(node)
+                simple.append(simple_text)
+                verbose.append(verbose_text)
+        return {"simple": simple, "verbose": verbose}
+    
+    for move_notation in moves:
+        try:
+            compiled = compile_move(move_notation)
+            simple.append(compiled.simple)
+            verbose.append(compiled.verbose)
+        except Exception as e:
+            error = f"Error: {str(e)}"
+            simple.append(error)
+            verbose.append(error)
+    return {"simple": simple, "verbose": verbose}
+
+
+def move_record(ply, notation, node, simple, verbose):
+    """Tuple of RECORD_FIELDS for a compiled move, fields the node type does not have are None"""
+    return (ply, notation, NODE_TYPES[type(node)], getattr(node, 'piece', None), getattr(node, 'square', None),
+            getattr(node, 'origin', None), getattr(node, 'disambig', None), getattr(node, 'file', None),
+            getattr(node, 'capture', False), getattr(node, 'promotion', None), getattr(node, 'side', None),
+            node.check, node.checkmate, simple, verbose, None)
+
+
+def move_records(moves, resolve=False, fen=None, diagnostics=None):
+    """One tuple of RECORD_FIELDS per move, plies numbered from 1
+    
+    Records hold plain values only, so they can leave worker processes.
+    A failed move keeps its ply and SAN text, its error message and None
+    everywhere else. With a diagnostics list, errors are collected there
+    too, as in compile_game.
+    """
+    resolved = resolve_moves(moves, fen, diagnostics) if resolve else None
+    records = []
+    for ply, move_notation in enumerate(moves, start=1):
+        if resolved is not None:
+            node = next(resolved)
+            compiled = CompiledMove(node, *renderer.render(node)) if isinstance(node, MoveNode) else node
+        elif diagnostics is not None:
+            compiled = compile_move(move_notation, diagnostics)
+            if compiled is None:
+                compiled = diagnostics[-1]
+        else:
+            try:
+                compiled = compile_move(move_notation)
+            except Exception as e:
+                compiled = e
+        
+        if isinstance(compiled, CompiledMove):
+            records.append(move_record(ply, move_notation, *compiled))
+        else:
+            error = report(diagnostics, ply, compiled)
+            records.append((ply, move_notation) + (None,) * (len(RECORD_FIELDS) - 3) + (error,))
+    return records
+
+
+def column_widths(mode):
+    """White column width and separator position for an output mode"""
+    # adjust column width based on mode
+    white_col_width = 70 if mode == "verbose" else 50
+    separator_pos = 80 if mode == "verbose" else 60
+    return white_col_width, separator_pos
+
+
+def format_column_header(mode="simple"):
+    """Build the column header lines of the White | Black table"""
+    white_col_width, separator_pos = column_widths(mode)
+    return [
+        f"{'Move':<6} {'White':<{white_col_width}} | {'Black'}",
+        "-" * (separator_pos + 50),
+    ]
+
+
+def format_move_row(move_number, white_move, black_move=None, mode="simple"):
+    """Build one White | Black row, black_move is None when the game ends on white's move"""
+    if black_move is None:
+        return f"{move_number:<6} {white_move}"
+    white_col_width = column_widths(mode)[0]
+    return f"{move_number:<6} {white_move:<{white_col_width}} | {black_move}"
+
+
+def format_pgn_output(moves, mode="simple", translations=None):
+    """Build the White | Black output lines for a list of moves"""
+    # moves may have been compiled already, e.g. by a worker process
+    if translations is None:
+        translations = compile_game(moves, mode)
+    
+    output = []
+    output.append(f"Total moves: {len(moves)}")
+    output.append(f"Output mode: {mode}")
+    output.append("")
+    
+    # column headers
+    output.extend(format_column_header(mode))
+    
+    move_number = 1
+    white_move = ""
+    
+    for i, (move_notation, translation) in enumerate(zip(moves, translations)):
+        # format notation with translation
+        move_text = f"{move_notation} - {translation}"
+        
+        if i % 2 == 0:
+            # white's move, store it
+            white_move = move_text
+        else:
+            # black's move, print both
+            output.append(format_move_row(move_number, white_move, move_text, mode))
+            move_number += 1
+            white_move = ""
+    
+    # if game ends on white's move
+    if white_move:
+        output.append(format_move_row(move_number, white_move))
+    
+    return output
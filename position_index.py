@@ -0,0 +1,321 @@
+# Position Index - on-disk map from Zobrist position hash to (game, ply), with duplicate-game detection
+'''
+Every game is replayed on a Board and every position it reaches (ply 0 is
+the start position) becomes one 16-byte record:
+    uint64 Zobrist hash, uint64 game << 32 | ply
+Records are sorted by hash, so all games reaching a position are found
+with a binary search over the memory-mapped file. Each game also gets a
+signature, a hash of its whole sequence of positions, kept in a second
+sorted section; games with equal signatures are exact duplicates.
+
+Records are sorted in bounded runs on temporary files and merged at the
+end, so building needs constant memory apart from one run.
+
+    python position_index.py build games.pgn games.pos       (or an archive from archive.py)
+    python position_index.py find games.pos --moves "e4 e5 Nf3 Nc6"
+    python position_index.py find games.pos --fen "<FEN>"
+    python position_index.py duplicates games.pos
+'''
+import argparse
+import hashlib
+import heapq
+import mmap
+import struct
+import sys
+import tempfile
+import time
+from array import array
+
+from board import Board
+from pipeline import compile_move, read_pgn_games
+
+MAGIC = b'CHESSPOS'
+INDEX_VERSION = 1
+# magic, version, records, games, then the offsets of the position and signature sections
+HEADER = struct.Struct('<8sIQQQQ')
+RECORD = struct.Struct('<QQ')
+RUN_SIZE = 1 << 20      # records sorted in memory at a time
+LOW_BITS = (1 << 64) - 1
+
+
+def position_hashes(moves, fen=None):
+    """Hashes of the start position and of the position after each move, up to the first illegal move"""
+    board = Board(fen)
+    hashes = [board.hash]
+    for move_notation in moves:
+        try:
+            board.play(compile_move(move_notation).ast)
+        except Exception:
+            break
+        hashes.append(board.hash)
+    return hashes
+
+
+def game_signature(moves, fen=None, hashes=None):
+    """64-bit signature of a game, equal for games that go through the same positions in the same order"""
+    if hashes is None:
+        hashes = position_hashes(moves, fen)
+    digest = hashlib.blake2b(digest_size=8)
+    digest.update(array('Q', hashes).tobytes())
+    # moves after an illegal one are not replayed, their text still tells games apart
+    for move_notation in moves[len(hashes) - 1:]:
+        digest.update(move_notation.encode('utf-8') + b' ')
+    return int.from_bytes(digest.digest(), 'little')
+
+
+def read_games(path):
+    """Games of a PGN file or of a game archive"""
+    with open(path, 'rb') as f:
+        magic = f.read(8)
+    
+    from archive import MAGIC as ARCHIVE_MAGIC, ArchiveReader
+    if magic == ARCHIVE_MAGIC:
+        with ArchiveReader(path) as reader:
+            for game in range(reader.gameCount()):
+                yield reader.game(game)
+    else:
+        yield from read_pgn_games(path, keep_annotations=False)
+
+
+def write_records(f, keys):
+    """Writes sorted (high << 64 | low) keys as 16-byte records"""
+    words = array('Q')
+    for key in keys:
+        words.append(key >> 64)
+        words.append(key & LOW_BITS)
+        if len(words) >= 2 * RUN_SIZE:
+            flush_words(f, words)
+    flush_words(f, words)
+
+
+def flush_words(f, words):
+    if sys.byteorder == 'big':
+        words.byteswap()
+    words.tofile(f)
+    del words[:]
+
+
+def read_records(f):
+    """Yields the keys of a file of 16-byte records, reading it in blocks"""
+    f.seek(0)
+    while True:
+        block = f.read(RECORD.size * 4096)
+        if not block:
+            return
+        words = array('Q')
+        words.frombytes(block)
+        if sys.byteorder == 'big':
+            words.byteswap()
+        for index in range(0, len(words), 2):
+            yield (words[index] << 64) | words[index + 1]
+
+
+class PositionIndexWriter:
+    def __init__(self, path, run_size=RUN_SIZE):
+        self.path = path
+        self.run_size = run_size
+        self.keys = []          # current run of hash << 64 | game << 32 | ply
+        self.runs = []          # sorted runs spilled to temporary files
+        self.signatures = []    # signature << 64 | game << 32 | plies
+        self.records = 0
+        self.games = 0
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, *exc_info):
+        if exc_type is None:
+            self.close()
+        else:
+            for run in self.runs:
+                run.close()
+    
+    def addGame(self, game):
+        """Indexes every position of a GameNode"""
+        fen = game.headers.get('FEN')
+        hashes = position_hashes(game.moves, fen)
+        game_bits = self.games << 32
+        for ply, position in enumerate(hashes):
+            self.keys.append((position << 64) | game_bits | ply)
+        self.signatures.append((game_signature(game.moves, fen, hashes) << 64) | game_bits | len(game.moves))
+        
+        self.records += len(hashes)
+        self.games += 1
+        if len(self.keys) >= self.run_size:
+            self.spill()
+    
+    def spill(self):
+        self.keys.sort()
+        run = tempfile.TemporaryFile()
+        write_records(run, self.keys)
+        self.runs.append(run)
+        self.keys = []
+    
+    def close(self):
+        self.keys.sort()
+        self.signatures.sort()
+        with open(self.path, 'wb') as f:
+            f.write(b'\0' * HEADER.size)
+            positions_offset = f.tell()
+            write_records(f, heapq.merge(self.keys, *(read_records(run) for run in self.runs)))
+            signatures_offset = f.tell()
+            write_records(f, self.signatures)
+            
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, INDEX_VERSION, self.records, self.games, positions_offset,
+                                signatures_offset))
+        for run in self.runs:
+            run.close()
+        self.runs = []
+
+
+class PositionIndex:
+    """Lookups over an index file, only the probed records are read"""
+    def __init__(self, path):
+        self.path = path
+        self.data = None
+        self.file = open(path, 'rb')
+        try:
+            # an empty file cannot be mapped
+            if self.file.seek(0, 2) < HEADER.size:
+                self.raiseError("not a position index")
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.readHeader()
+        except BaseException:
+            # the caller never gets the index, nothing else could close them
+            self.close()
+            raise
+    
+    def readHeader(self):
+        magic, version, self.records, self.games, self.positions_offset, self.signatures_offset = \
+            HEADER.unpack_from(self.data)
+        if magic != MAGIC:
+            self.raiseError("not a position index")
+        if version != INDEX_VERSION:
+            self.raiseError(f"position index version {version}, expected {INDEX_VERSION}")
+    
+    def raiseError(self, message):
+        raise ValueError(f"{self.path}: {message}")
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def close(self):
+        if self.data is not None:
+            self.data.close()
+        self.file.close()
+    
+    def record(self, offset, index):
+        return RECORD.unpack_from(self.data, offset + index * RECORD.size)
+    
+    def lookup(self, offset, count, key):
+        """Second words of every record whose first word is key, by binary search"""
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            if self.record(offset, middle)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        
+        found = []
+        while low < count:
+            first, second = self.record(offset, low)
+            if first != key:
+                break
+            found.append(second)
+            low += 1
+        return found
+    
+    def find(self, position_hash):
+        """(game, ply) of every occurrence of a position, games numbered from 0"""
+        return [(location >> 32, location & 0xFFFFFFFF)
+                for location in self.lookup(self.positions_offset, self.records, position_hash)]
+    
+    def findFEN(self, fen):
+        return self.find(Board(fen).hash)
+    
+    def findMoves(self, moves, fen=None):
+        """Occurrences of the position reached after playing moves, which must all be legal"""
+        board = Board(fen)
+        for move_notation in moves:
+            board.play(compile_move(move_notation).ast)
+        return self.find(board.hash)
+    
+    def findGame(self, moves, fen=None):
+        """Indexed games identical to the given one"""
+        signature = game_signature(moves, fen)
+        return [location >> 32 for location in self.lookup(self.signatures_offset, self.games, signature)]
+    
+    def duplicates(self):
+        """Yields lists of games with identical moves, each list sorted"""
+        group = []
+        previous = None
+        for index in range(self.games):
+            signature, location = self.record(self.signatures_offset, index)
+            if signature != previous:
+                if len(group) > 1:
+                    yield group
+                group = []
+                previous = signature
+            group.append(location >> 32)
+        if len(group) > 1:
+            yield group
+
+
+def build_index(source, index_path, progress=None):
+    """Indexes every game of a PGN file or archive, returns (games, positions)"""
+    with PositionIndexWriter(index_path) as writer:
+        for game in read_games(source):
+            writer.addGame(game)
+            if progress is not None and writer.games % 10000 == 0:
+                progress(writer.games)
+        return writer.games, writer.records
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(prog="position_index.py", description="Build or query a position index.")
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="index every position of a PGN file or game archive")
+    build.add_argument("source")
+    build.add_argument("index")
+    find = commands.add_parser("find", help="list the games reaching a position")
+    find.add_argument("index")
+    position = find.add_mutually_exclusive_group(required=True)
+    position.add_argument("--fen", help="the position as FEN")
+    position.add_argument("--moves", help="SAN moves from the starting position, e.g. \"e4 e5 Nf3\"")
+    duplicates = commands.add_parser("duplicates", help="list groups of identical games")
+    duplicates.add_argument("index")
+    args = arg_parser.parse_args(argv)
+    
+    start = time.perf_counter()
+    try:
+        if args.command == "build":
+            games, positions = build_index(args.source, args.index)
+            print(f"Indexed {positions} positions of {games} games in {time.perf_counter() - start:.2f}s")
+            return 0
+        
+        with PositionIndex(args.index) as index:
+            if args.command == "find":
+                found = index.findFEN(args.fen) if args.fen else index.findMoves(args.moves.split())
+                for game, ply in found:
+                    print(f"Game {game + 1}, ply {ply}")
+                summary = f"{len({game for game, _ in found})} games, {len(found)} occurrences"
+            else:
+                groups = list(index.duplicates())
+                for group in groups:
+                    print("Games " + ", ".join(str(game + 1) for game in group))
+                summary = f"{len(groups)} groups of duplicate games"
+    except (OSError, ValueError, SyntaxError) as e:
+        # bad moves or FEN, unreadable or broken files
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    print(f"{summary} ({(time.perf_counter() - start) * 1000:.1f} ms)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
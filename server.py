@@ -0,0 +1,366 @@
+# Translation Server - asyncio HTTP/JSON service over the compiler, with request micro-batching
+'''
+Endpoints (JSON in, JSON out, HTTP/1.1 keep-alive):
+    POST /move      {"san": "Nf3"}
+                    → one move record
+    POST /game      {"moves": ["e4", "e5"], "resolve": false, "fen": null}
+                    or {"movetext": "1. e4 e5 2. Nf3 *"}
+                    → {"moves": [move records], "result": "*"}
+    GET  /stats     request, batch and cache counters
+    GET  /health    {"status": "ok"}
+
+A move record holds the fields of pipeline.RECORD_FIELDS: the AST fields,
+both translations and, for a move that fails, its error message.
+
+Requests are not compiled one by one. They wait in a bounded queue and a
+single batcher takes whatever is waiting (up to --batch-size, waiting at
+most --batch-window for more) and compiles the whole batch on a worker
+thread, so the event loop stays free for I/O. Moves go through the shared
+compilation cache, so repeated SAN strings are compiled once, and through
+the recovery mode of the Lexer and Parser, so bad moves cost no exceptions.
+
+Backpressure: when --max-pending requests are already waiting, new ones
+are answered 503 with Retry-After right away; bodies over MAX_BODY get 413.
+
+    python server.py --port 8642
+    python server.py --unix /tmp/chess.sock
+    python loadtest.py --port 8642 -c 64 -n 50000
+'''
+import argparse
+import asyncio
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from pipeline import (RECORD_FIELDS, move_records, set_cache_size, set_lexer, set_move_table, cache_stats,
+                      DEFAULT_CACHE_SIZE, DEFAULT_LEXER)
+from pgn_lexer import PGNLexer
+from pgn_parser import PGNParser
+from move_table import LazyMoveTable, DEFAULT_TABLE_PATH
+from lexer import LEXERS
+from board import Board
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8642
+DEFAULT_BATCH_SIZE = 256        # requests compiled together
+DEFAULT_BATCH_WINDOW = 0.002    # seconds a small batch waits for more requests
+DEFAULT_MAX_PENDING = 1024      # queued requests before new ones get 503
+MAX_BODY = 1 << 20              # bytes
+MAX_HEADER = 16 << 10           # bytes of request line and headers
+
+STATUS_TEXT = {
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    411: 'Length Required',
+    413: 'Payload Too Large',
+    431: 'Request Header Fields Too Large',
+    500: 'Internal Server Error',
+    503: 'Service Unavailable',
+}
+
+
+class HTTPError(Exception):
+    """A request answered with an error status"""
+    def __init__(self, status, message, close=False):
+        super().__init__(message)
+        self.status = status
+        self.close = close      # the connection cannot be reused, e.g. the body was not read
+
+
+def record_dict(record):
+    """JSON object of a move record, without its ply (the position in the list)"""
+    return dict(zip(RECORD_FIELDS[1:], record[1:]))
+
+
+def compile_batch(requests):
+    """Compiles a batch of (moves, resolve, fen) requests
+    
+    Returns (records, diagnostics count) per request, or the exception it
+    raised, so one broken request does not fail the others.
+    """
+    results = []
+    for moves, resolve, fen in requests:
+        diagnostics = []
+        try:
+            records = move_records(moves, resolve, fen, diagnostics)
+        except Exception as e:
+            results.append(e)
+            continue
+        results.append(([record_dict(record) for record in records], len(diagnostics)))
+    return results
+
+
+def parse_movetext(text):
+    """(SAN moves, result, FEN or None) of the first game of a PGN text"""
+    try:
+        game = next(iter(PGNParser(PGNLexer(text).tokenize(), keep_annotations=False).parseGames()), None)
+    except (ValueError, SyntaxError) as e:
+        # e.g. an unterminated comment or variation, the client sent broken PGN
+        raise HTTPError(400, f"bad movetext: {e}")
+    if game is None:
+        raise HTTPError(400, "movetext holds no game")
+    return game.moves, game.result, game.headers.get('FEN')
+
+
+class TranslationServer:
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, batch_window=DEFAULT_BATCH_WINDOW,
+                 max_pending=DEFAULT_MAX_PENDING):
+        self.batch_size = max(1, batch_size)
+        self.batch_window = batch_window
+        self.queue = asyncio.Queue(maxsize=max_pending)
+        # one thread, so the shared compilation cache is only touched by one batch at a time
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='compile')
+        self.batcher = None
+        self.counters = {'requests': 0, 'rejected': 0, 'errors': 0, 'batches': 0, 'batched': 0,
+                         'moves': 0, 'diagnostics': 0}
+    
+    def start(self):
+        self.batcher = asyncio.get_running_loop().create_task(self.runBatches())
+    
+    def close(self):
+        if self.batcher is not None:
+            self.batcher.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+    
+    async def compile(self, moves, resolve=False, fen=None):
+        """Queues a request and waits for its batch, returns the move records"""
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((moves, resolve, fen, future))
+        except asyncio.QueueFull:
+            self.counters['rejected'] += 1
+            raise HTTPError(503, "too many pending requests")
+        return await future
+    
+    async def runBatches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.batch_size:
+                if not self.queue.empty():
+                    batch.append(self.queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            # requests whose client went away are not compiled
+            batch = [request for request in batch if not request[3].done()]
+            if not batch:
+                continue
+            self.counters['batches'] += 1
+            self.counters['batched'] += len(batch)
+            try:
+                results = await loop.run_in_executor(self.executor, compile_batch,
+                                                     [request[:3] for request in batch])
+            except Exception as e:
+                for request in batch:
+                    if not request[3].done():
+                        request[3].set_exception(e)
+                continue
+            
+            for request, result in zip(batch, results):
+                future = request[3]
+                if isinstance(result, Exception):
+                    if not future.done():
+                        future.set_exception(result)
+                    continue
+                records, diagnostics = result
+                self.counters['moves'] += len(records)
+                self.counters['diagnostics'] += diagnostics
+                if not future.done():
+                    future.set_result(records)
+    
+    def stats(self):
+        batches = self.counters['batches']
+        return dict(self.counters,
+                    pending=self.queue.qsize(),
+                    mean_batch=self.counters['batched'] / batches if batches else 0.0,
+                    cache=cache_stats())
+    
+    async def handleConnection(self, reader, writer):
+        try:
+            while True:
+                keep_alive = True
+                try:
+                    request = await self.readRequest(reader)
+                    if request is None:
+                        break
+                    method, path, body, keep_alive = request
+                    self.counters['requests'] += 1
+                    status, response = 200, await self.route(method, path, body)
+                except HTTPError as e:
+                    if e.status >= 500:
+                        self.counters['errors'] += 1
+                    status, response = e.status, {'error': str(e)}
+                    if e.close:
+                        keep_alive = False
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    break
+                except Exception as e:
+                    self.counters['errors'] += 1
+                    status, response, keep_alive = 500, {'error': str(e)}, False
+                
+                writer.write(self.response(status, response, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+    
+    async def readRequest(self, reader):
+        """(method, path, body, keep_alive) of the next request, None when the client is done"""
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+        except asyncio.IncompleteReadError as e:
+            if e.partial.strip():
+                raise HTTPError(400, "incomplete request", close=True)
+            return None
+        except asyncio.LimitOverrunError:
+            raise HTTPError(431, "request head too large", close=True)
+        
+        lines = head.decode('latin1').split('\r\n')
+        try:
+            method, path, version = lines[0].split(' ')
+        except ValueError:
+            raise HTTPError(400, "malformed request line", close=True)
+        headers = {}
+        for line in lines[1:]:
+            if line:
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+        
+        connection = headers.get('connection', '').lower()
+        keep_alive = connection == 'keep-alive' if version == 'HTTP/1.0' else connection != 'close'
+        if 'transfer-encoding' in headers:
+            raise HTTPError(411, "chunked bodies are not supported, send Content-Length", close=True)
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            raise HTTPError(400, "bad Content-Length", close=True)
+        if length > MAX_BODY:
+            raise HTTPError(413, f"body over {MAX_BODY} bytes", close=True)
+        body = await reader.readexactly(length) if length else b''
+        return method, path, body, keep_alive
+    
+    async def route(self, method, path, body):
+        if path in ('/move', '/game'):
+            if method != 'POST':
+                raise HTTPError(405, f"use POST for {path}")
+            try:
+                payload = json.loads(body)
+            except ValueError:
+                raise HTTPError(400, "body is not JSON")
+            if not isinstance(payload, dict):
+                raise HTTPError(400, "body must be a JSON object")
+            if path == '/move':
+                san = payload.get('san')
+                if not isinstance(san, str) or not san:
+                    raise HTTPError(400, "expected {\"san\": \"<move>\"}")
+                return (await self.compile([san]))[0]
+            return await self.routeGame(payload)
+        
+        if method != 'GET':
+            raise HTTPError(405, f"use GET for {path}")
+        if path == '/stats':
+            return self.stats()
+        if path == '/health':
+            return {'status': 'ok'}
+        raise HTTPError(404, f"no such endpoint: {path}")
+    
+    async def routeGame(self, payload):
+        resolve = bool(payload.get('resolve', False))
+        fen = payload.get('fen')
+        result = None
+        if isinstance(payload.get('movetext'), str):
+            moves, result, game_fen = parse_movetext(payload['movetext'])
+            fen = fen or game_fen
+        else:
+            moves = payload.get('moves')
+            if not isinstance(moves, list) or not all(isinstance(move, str) for move in moves):
+                raise HTTPError(400, "expected {\"moves\": [\"e4\", ...]} or {\"movetext\": \"1. e4 ...\"}")
+        if fen is not None and not isinstance(fen, str):
+            raise HTTPError(400, "fen must be a string")
+        if fen is not None and not resolve:
+            fen = None      # only the board needs the start position
+        if fen is not None:
+            try:
+                Board(fen)
+            except ValueError as e:
+                raise HTTPError(400, str(e))
+        
+        return {'moves': await self.compile(moves, resolve, fen), 'result': result}
+    
+    def response(self, status, body, keep_alive):
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        headers = [
+            f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}",
+            "Content-Type: application/json",
+            f"Content-Length: {len(data)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        if status == 503:
+            headers.append("Retry-After: 1")
+        return ('\r\n'.join(headers) + '\r\n\r\n').encode('latin1') + data
+
+
+async def serve(args):
+    server = TranslationServer(args.batch_size, args.batch_window / 1000, args.max_pending)
+    server.start()
+    if args.unix:
+        listener = await asyncio.start_unix_server(server.handleConnection, args.unix, limit=MAX_HEADER)
+        where = args.unix
+    else:
+        listener = await asyncio.start_server(server.handleConnection, args.host, args.port, limit=MAX_HEADER)
+        where = f"http://{args.host}:{args.port}"
+    print(f"Serving on {where} (batch size {server.batch_size}, window {args.batch_window} ms, "
+          f"{args.max_pending} pending max)", file=sys.stderr)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close()
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(prog="server.py", description="Serve the compiler over HTTP/JSON.")
+    arg_parser.add_argument("--host", default=DEFAULT_HOST, help=f"address to listen on (default: {DEFAULT_HOST})")
+    arg_parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"TCP port (default: {DEFAULT_PORT})")
+    arg_parser.add_argument("--unix", metavar="PATH", default=None, help="listen on a Unix socket instead of TCP")
+    arg_parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                            help=f"requests compiled together at most (default: {DEFAULT_BATCH_SIZE})")
+    arg_parser.add_argument("--batch-window", type=float, default=DEFAULT_BATCH_WINDOW * 1000, metavar="MS",
+                            help=f"milliseconds a small batch waits for more requests "
+                                 f"(default: {DEFAULT_BATCH_WINDOW * 1000:g})")
+    arg_parser.add_argument("--max-pending", type=int, default=DEFAULT_MAX_PENDING,
+                            help=f"queued requests before new ones get 503 (default: {DEFAULT_MAX_PENDING})")
+    arg_parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE,
+                            help=f"distinct moves kept compiled (default: {DEFAULT_CACHE_SIZE})")
+    arg_parser.add_argument("--lexer", choices=sorted(LEXERS), default=DEFAULT_LEXER,
+                            help=f"lexer implementation (default: {DEFAULT_LEXER})")
+    arg_parser.add_argument("--table", nargs="?", const=DEFAULT_TABLE_PATH, default=None, metavar="PATH",
+                            help="look moves up in the precompiled move table")
+    args = arg_parser.parse_args(argv)
+    
+    set_lexer(args.lexer)
+    set_cache_size(args.cache_size)
+    if args.table:
+        set_move_table(LazyMoveTable(args.table))
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+# Synthetic Corpus - seeded generator of grammatically valid SAN games and PGN databases
+'''
+Moves are drawn from the SAN grammar with rough real-game frequencies
+(piece moves, pawn pushes and captures, castling, checks, promotions).
+Real games reuse a small vocabulary of moves, so by default every game
+draws from a fixed pool of moves generated up front; --vocabulary 0 draws
+every move from the grammar instead. The same seed always writes the same
+file, so corpora can be regenerated rather than stored.
+
+Write a database with:
+    python synthetic.py out.pgn --moves 1000000 [--seed 1]
+'''
+import argparse
+import random
+import sys
+
+FILES       = 'abcdefgh'
+RANKS       = '12345678'
+PIECES      = 'NBRQK'
+PIECE_WEIGHTS = (25, 22, 20, 15, 18)
+RESULTS     = ('1-0', '0-1', '1/2-1/2')
+
+DEFAULT_SEED        = 1
+DEFAULT_VOCABULARY  = 4096      # distinct moves per corpus, 0 draws every move from the grammar
+DEFAULT_GAME_PLIES  = (20, 120)
+LINE_WIDTH          = 80
+
+
+def random_square(rng, ranks=RANKS):
+    return rng.choice(FILES) + rng.choice(ranks)
+
+
+def random_check(rng):
+    roll = rng.random()
+    if roll < 0.003:
+        return '#'
+    if roll < 0.073:
+        return '+'
+    return ''
+
+
+def random_move(rng):
+    """One SAN string accepted by the grammar"""
+    roll = rng.random()
+    
+    # <castle>
+    if roll < 0.03:
+        return ('O-O' if rng.random() < 0.8 else 'O-O-O') + random_check(rng)
+    
+    # <pawn_move>
+    if roll < 0.38:
+        if rng.random() < 0.25:
+            # captures go to a neighbouring file
+            target = rng.randrange(8)
+            file = FILES[target - 1] if target and (target == 7 or rng.random() < 0.5) else FILES[target + 1]
+            move = file + 'x' + FILES[target] + rng.choice('234567')
+        elif rng.random() < 0.01:
+            return rng.choice(FILES) + rng.choice('18') + '=' + rng.choice('QQQNRB') + random_check(rng)
+        else:
+            move = random_square(rng, '34567')
+        return move + random_check(rng)
+    
+    # <piece_move>
+    piece = rng.choices(PIECES, PIECE_WEIGHTS)[0]
+    disambig = ''
+    if piece != 'K' and rng.random() < 0.05:
+        kind = rng.random()
+        if kind < 0.6:
+            disambig = rng.choice(FILES)
+        elif kind < 0.9:
+            disambig = rng.choice(RANKS)
+        else:
+            disambig = random_square(rng)
+    capture = 'x' if rng.random() < 0.25 else ''
+    return piece + disambig + capture + random_square(rng) + random_check(rng)
+
+
+class CorpusGenerator:
+    """Seeded source of synthetic games, the same seed always gives the same games"""
+    def __init__(self, seed=DEFAULT_SEED, vocabulary=DEFAULT_VOCABULARY, plies=DEFAULT_GAME_PLIES):
+        self.rng = random.Random(seed)
+        self.plies = plies
+        self.vocabulary = [random_move(self.rng) for _ in range(vocabulary)]
+        self.games = 0
+    
+    def moves(self, count):
+        if self.vocabulary:
+            return self.rng.choices(self.vocabulary, k=count)
+        return [random_move(self.rng) for _ in range(count)]
+    
+    def movetext(self, moves, result=None):
+        """Numbered movetext wrapped at LINE_WIDTH, e.g. "1. e4 e5 2. Nf3 ..." """
+        words = []
+        for i, move in enumerate(moves):
+            if i % 2 == 0:
+                words.append(f"{i // 2 + 1}.")
+            words.append(move)
+        if result:
+            words.append(result)
+        
+        lines = []
+        line = []
+        width = 0
+        for word in words:
+            if line and width + 1 + len(word) > LINE_WIDTH:
+                lines.append(' '.join(line))
+                line = []
+                width = 0
+            width += len(word) + (1 if line else 0)
+            line.append(word)
+        if line:
+            lines.append(' '.join(line))
+        return '\n'.join(lines)
+    
+    def game(self, plies=None, tags=True):
+        """Text of one game ending in its result, with a tag section unless tags is False"""
+        if plies is None:
+            plies = self.rng.randint(*self.plies)
+        self.games += 1
+        moves = self.moves(plies)
+        result = self.rng.choice(RESULTS)
+        if not tags:
+            return f"{self.movetext(moves, result)}\n"
+        
+        headers = [
+            ('Event', 'Synthetic'),
+            ('Site', '?'),
+            ('Date', '2000.01.01'),
+            ('Round', str(self.games)),
+            ('White', f'Player {self.rng.randrange(1000)}'),
+            ('Black', f'Player {self.rng.randrange(1000)}'),
+            ('Result', result),
+        ]
+        tag_section = '\n'.join(f'[{name} "{value}"]' for name, value in headers)
+        return f"{tag_section}\n\n{self.movetext(moves, result)}\n"
+
+
+def write_corpus(f, total_moves, seed=DEFAULT_SEED, vocabulary=DEFAULT_VOCABULARY,
+                 plies=DEFAULT_GAME_PLIES, tags=True):
+    """Streams games to an open text file until total_moves moves are written, returns (games, moves)"""
+    generator = CorpusGenerator(seed, vocabulary, plies)
+    written = 0
+    while written < total_moves:
+        game_plies = min(generator.rng.randint(*plies), total_moves - written)
+        f.write(generator.game(game_plies, tags))
+        f.write('\n')
+        written += game_plies
+    return generator.games, written
+
+
+def parse_size(text):
+    """Move counts with an optional k/M/G suffix, e.g. 10k or 100M"""
+    suffixes = {'k': 10**3, 'm': 10**6, 'g': 10**9}
+    if text and text[-1].lower() in suffixes:
+        return int(float(text[:-1]) * suffixes[text[-1].lower()])
+    return int(text)
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(prog="synthetic.py", description="Write a synthetic PGN database.")
+    arg_parser.add_argument("output", help="file to write, - for stdout")
+    arg_parser.add_argument("-n", "--moves", type=parse_size, default=10**4,
+                            help="total moves to write, accepts k/M/G suffixes (default: 10k)")
+    arg_parser.add_argument("-s", "--seed", type=int, default=DEFAULT_SEED)
+    arg_parser.add_argument("--vocabulary", type=int, default=DEFAULT_VOCABULARY,
+                            help=f"distinct moves to draw from, 0 for no limit (default: {DEFAULT_VOCABULARY})")
+    arg_parser.add_argument("--plies", type=int, nargs=2, default=DEFAULT_GAME_PLIES, metavar=("MIN", "MAX"),
+                            help="moves per game")
+    arg_parser.add_argument("--no-tags", action="store_true",
+                            help="write movetext only, like the sample files")
+    args = arg_parser.parse_args(argv)
+    
+    if args.output == '-':
+        games, moves = write_corpus(sys.stdout, args.moves, args.seed, args.vocabulary, args.plies, not args.no_tags)
+    else:
+        with open(args.output, 'w') as f:
+            games, moves = write_corpus(f, args.moves, args.seed, args.vocabulary, args.plies, not args.no_tags)
+    print(f"{games} games, {moves} moves", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
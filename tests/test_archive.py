@@ -0,0 +1,164 @@
+# Game Archive Tests - games survive the round trip through a file, broken archives are refused and closed
+import contextlib
+import io
+import os
+import struct
+import tempfile
+import unittest
+
+import archive
+from archive import ArchiveReader, ArchiveWriter, HEADER, MAGIC, build_archive
+from ast_nodes import GameNode
+from pipeline import read_pgn_games
+
+TEST_FILES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'test_files')
+PGN = '[Event "a"]\n[White "Ölmez"]\n1. e4 e5 2. Nf3 Zz9 3. Bb5 1-0\n\n1. d4 d5 *\n\n[Event "c"]\n1. e4 Ke2 1/2-1/2\n'
+FD_DIRECTORY = '/proc/self/fd'
+
+
+def open_files():
+    return len(os.listdir(FD_DIRECTORY))
+
+
+class ArchiveTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.pgn = os.path.join(self.directory.name, 'games.pgn')
+        self.path = os.path.join(self.directory.name, 'games.chsa')
+        with open(self.pgn, 'w', encoding='utf-8') as f:
+            f.write(PGN)
+    
+    def tearDown(self):
+        self.directory.cleanup()
+    
+    def assertRoundTrip(self, pgn, resolve=False):
+        games = list(read_pgn_games(pgn, keep_annotations=False))
+        self.assertEqual(build_archive(pgn, self.path, resolve), len(games))
+        with ArchiveReader(self.path) as reader:
+            self.assertEqual(reader.gameCount(), len(games))
+            self.assertEqual(reader.moveCount(), sum(len(game.moves) for game in games))
+            for index, game in enumerate(games):
+                stored = reader.game(index)
+                self.assertEqual((stored.headers, stored.moves, stored.result),
+                                 (game.headers, game.moves, game.result))
+    
+    def test_round_trip(self):
+        for resolve in (False, True):
+            with self.subTest(resolve=resolve):
+                self.assertRoundTrip(self.pgn, resolve)
+        for name in sorted(os.listdir(TEST_FILES)):
+            with self.subTest(file=name):
+                self.assertRoundTrip(os.path.join(TEST_FILES, name), resolve=True)
+    
+    def test_origins_and_extras(self):
+        build_archive(self.pgn, self.path, resolve=True)
+        with ArchiveReader(self.path) as reader:
+            nodes = reader.gameNodes(0)
+            self.assertEqual([getattr(node, 'origin', None) for node in nodes[:3]], ['e2', 'e7', 'g1'])
+            # the move that did not compile keeps its text, the board stops resolving after it
+            self.assertEqual(nodes[3], 'Zz9')
+            self.assertIsNone(nodes[4].origin)
+            # an illegal move is stored as text too
+            self.assertEqual(reader.gameNodes(2)[1], 'Ke2')
+            with self.assertRaises(IndexError):
+                reader.game(3)
+    
+    def test_empty_archive(self):
+        with ArchiveWriter(self.path):
+            pass
+        with ArchiveReader(self.path) as reader:
+            self.assertEqual((reader.gameCount(), reader.moveCount()), (0, 0))
+    
+    def corrupt(self, data):
+        with open(self.path, 'wb') as f:
+            f.write(data)
+    
+    def test_broken_archives(self):
+        with ArchiveWriter(self.path) as writer:
+            writer.addGame(GameNode({'Event': 'a'}, ['e4', 'e5'], '1-0'))
+        with open(self.path, 'rb') as f:
+            good = f.read()
+        magic, version, *rest = HEADER.unpack_from(good)
+        for name, data, message in [
+            ('empty', b'', "not a game archive"),
+            ('short', good[:HEADER.size - 1], "not a game archive"),
+            ('magic', b'NOTCHESS' + good[8:], "not a game archive"),
+            ('version', HEADER.pack(MAGIC, version + 1, *rest) + good[HEADER.size:], "archive version 2, expected 1"),
+            ('truncated', good[:-8], "truncated or corrupt archive"),
+            ('moves', HEADER.pack(MAGIC, version, rest[0], rest[1], 1 << 20, *rest[3:]) + good[HEADER.size:],
+             "truncated or corrupt archive"),
+        ]:
+            self.corrupt(data)
+            with self.subTest(name):
+                with self.assertRaisesRegex(ValueError, message):
+                    ArchiveReader(self.path)
+    
+    def test_every_truncation(self):
+        # whatever the length it is cut to, an archive is refused rather than read wrong
+        build_archive(self.pgn, self.path)
+        with open(self.path, 'rb') as f:
+            good = f.read()
+        for length in range(len(good)):
+            self.corrupt(good[:length])
+            with self.subTest(length=length):
+                with self.assertRaises(ValueError):
+                    ArchiveReader(self.path)
+    
+    @unittest.skipUnless(os.path.isdir(FD_DIRECTORY), "counts the open file descriptors of the process")
+    def test_refused_archive_is_closed(self):
+        for data in (b'', b'NOTCHESS' + bytes(HEADER.size)):
+            self.corrupt(data)
+            before = open_files()
+            with self.assertRaises(ValueError):
+                ArchiveReader(self.path)
+            self.assertEqual(open_files(), before)
+    
+    def test_byte_order(self):
+        # codes and index entries are little-endian whatever the machine
+        with ArchiveWriter(self.path) as writer:
+            writer.addGame(GameNode({}, ['e4'], None))
+        with ArchiveReader(self.path) as reader:
+            code = reader.codes(0, 1)[0]
+            self.assertEqual(struct.unpack_from('<I', reader.data, reader.moves_offset)[0], code)
+            self.assertEqual(reader.entry(reader.index_offset, 1), 1)
+
+
+class ArchiveCLITest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.pgn = os.path.join(self.directory.name, 'games.pgn')
+        self.path = os.path.join(self.directory.name, 'games.chsa')
+        with open(self.pgn, 'w', encoding='utf-8') as f:
+            f.write(PGN)
+    
+    def tearDown(self):
+        self.directory.cleanup()
+    
+    def run_main(self, *argv):
+        out, err = io.StringIO(), io.StringIO()
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+            status = archive.main(list(argv))
+        return status, out.getvalue(), err.getvalue()
+    
+    def test_build_and_show(self):
+        self.assertEqual(self.run_main('build', self.pgn, self.path)[:2], (0, f"Wrote 3 games to {self.path}\n"))
+        status, out, _ = self.run_main('show', self.path, '1')
+        self.assertEqual(status, 0)
+        self.assertEqual(out, '[Event "a"]\n[White "Ölmez"]\n\ne4 e5 Nf3 Zz9 Bb5 1-0\n')
+    
+    def test_errors(self):
+        self.run_main('build', self.pgn, self.path)
+        broken = os.path.join(self.directory.name, 'broken.pgn')
+        with open(broken, 'w') as f:
+            f.write('1. e4 {never closed')
+        for argv in [('show', self.path, '4'), ('show', self.pgn, '1'),
+                     ('show', os.path.join(self.directory.name, 'missing.chsa'), '1'),
+                     ('build', broken, os.path.join(self.directory.name, 'broken.chsa'))]:
+            with self.subTest(argv=argv[:2]):
+                status, out, err = self.run_main(*argv)
+                self.assertEqual(status, 1)
+                self.assertTrue(err.startswith("Error: "), err)
+
+
+if __name__ == '__main__':
+    unittest.main()
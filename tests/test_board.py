@@ -0,0 +1,111 @@
+# Board Tests - origin squares, illegal moves, FEN positions and Zobrist hashes of replayed games
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+import batch
+import pipeline
+from board import Board, START_FEN
+from pipeline import compile_move, read_pgn_games
+
+TEST_FILES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'test_files')
+
+
+def play(board, moves):
+    """Origin squares of the moves played on board, None for castles"""
+    return [getattr(board.play(compile_move(move_notation).ast), 'origin', None) for move_notation in moves]
+
+
+class BoardTest(unittest.TestCase):
+    def test_origins(self):
+        board = Board()
+        moves = ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'a6', 'Bxc6', 'dxc6', 'O-O', 'Bg4']
+        self.assertEqual(play(board, moves), ['e2', 'e7', 'g1', 'b8', 'f1', 'a7', 'b5', 'd7', None, 'c8'])
+    
+    def test_en_passant_and_promotion(self):
+        board = Board('4k3/1P6/8/3pP3/8/8/8/4K3 w - d6 0 1')
+        self.assertEqual(play(board, ['exd6', 'Kf7', 'b8=Q']), ['e5', 'e8', 'b7'])
+        self.assertIsNone(board.squares[35])    # the captured pawn on d5
+        self.assertEqual(board.squares[57], 'Q')
+    
+    def test_errors(self):
+        for fen, move_notation, message in [
+            (None, 'Nf6', "Illegal move: no Knight can reach f6"),
+            (None, 'e5', "Illegal move: no pawn can reach e5"),
+            (None, 'O-O', "Illegal move: cannot castle kingside through pieces"),
+            ('4k3/8/8/8/8/8/8/R3K2R w - - 0 1', 'O-O', "Illegal move: cannot castle kingside"),
+            ('4k3/8/8/8/8/8/8/1N3N2 w - - 0 1', 'Nd2', "Ambiguous move"),
+        ]:
+            with self.subTest(fen=fen, move=move_notation):
+                with self.assertRaisesRegex(ValueError, message):
+                    Board(fen).play(compile_move(move_notation).ast)
+    
+    def test_invalid_fen(self):
+        for fen in ('garbage', '8/8/8 w', 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNX w'):
+            with self.subTest(fen=fen):
+                with self.assertRaisesRegex(ValueError, "Invalid FEN"):
+                    Board(fen)
+    
+    def test_incremental_hash(self):
+        for name in sorted(os.listdir(TEST_FILES)):
+            for game in read_pgn_games(os.path.join(TEST_FILES, name), keep_annotations=False):
+                board = Board(game.headers.get('FEN'))
+                with self.subTest(file=name):
+                    for move_notation in game.moves:
+                        board.play(compile_move(move_notation).ast)
+                        self.assertEqual(board.hash, board.computeHash())
+    
+    def test_transpositions(self):
+        first, second = Board(), Board()
+        play(first, ['Nf3', 'Nf6', 'Nc3', 'Nc6'])
+        play(second, ['Nc3', 'Nc6', 'Nf3', 'Nf6'])
+        self.assertEqual(first.hash, second.hash)
+        self.assertEqual(Board().hash, Board(START_FEN).hash)
+        # the side to move and castling rights are part of the position
+        self.assertNotEqual(Board().hash, Board(START_FEN.replace(' w ', ' b ')).hash)
+        self.assertNotEqual(Board().hash, Board(START_FEN.replace('KQkq', 'Qkq')).hash)
+    
+    def test_en_passant_hash(self):
+        # an en passant square no pawn can capture on does not change the position
+        played, loaded = Board(), Board('rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1')
+        play(played, ['e4'])
+        self.assertEqual(played.hash, loaded.hash)
+        capturable = Board('4k3/8/8/8/3p4/8/4P3/4K3 w - - 0 1')
+        play(capturable, ['e4'])
+        self.assertNotEqual(capturable.hash, Board('4k3/8/8/8/3pP3/8/8/4K3 b - - 0 1').hash)
+
+
+class ResolveFENTest(unittest.TestCase):
+    MOVES = ['e4', 'e5', 'Nf3']
+    
+    def test_bad_fen(self):
+        # the game reports the FEN once and is compiled without origins, it is not aborted
+        translations = pipeline.compile_game(self.MOVES, resolve=True, fen='garbage')
+        self.assertEqual(translations, ["Error: Invalid FEN: garbage", "Pawn to e5", "Knight to f3"])
+        self.assertEqual(pipeline.compile_game_all(self.MOVES, resolve=True, fen='garbage')['verbose'][0],
+                         "Error: Invalid FEN: garbage")
+    
+    def test_bad_fen_recovery(self):
+        diagnostics = []
+        records = pipeline.move_records(self.MOVES, resolve=True, fen='garbage', diagnostics=diagnostics)
+        self.assertEqual([record[-1] for record in records], ["Invalid FEN: garbage", None, None])
+        self.assertEqual([(d.stage, d.ply) for d in diagnostics], [('board', 1)])
+    
+    def test_batch(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'games.pgn')
+            with open(filename, 'w') as f:
+                f.write('[FEN "garbage"]\n1. e4 e5 2. Nf3 1-0\n[Event "b"]\n1. d4 d5 0-1\n')
+            for options in ([], ['--recover'], ['-j', '2']):
+                out = io.StringIO()
+                with self.subTest(options=options), contextlib.redirect_stdout(out), \
+                        contextlib.redirect_stderr(io.StringIO()):
+                    self.assertEqual(batch.main([filename, '--resolve'] + options), 0)
+                    self.assertIn("Error: Invalid FEN: garbage", out.getvalue())
+                    self.assertIn("Pawn from d2 to d4", out.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+# Bulk Lexer Tests - BulkLexer gives PGNByteLexer's tokens and errors at any window size
+import os
+import subprocess
+import sys
+import unittest
+
+from bulk_lexer import BulkLexer, np
+from pgn_lexer import PGNByteLexer
+
+# an error after the last complete game, the games before it must not end the file quietly
+ERROR_AFTER_GAMES = b'$12[A "b\\"c"]*\n[Event "x"][Bad\n\n({ ...'
+WINDOWS = (1, 5, 11, 1 << 18)
+
+
+def lex(lexer_class, data, **kwargs):
+    """(kind, offset, length) of every token, or the error message"""
+    lexer = lexer_class(data, **kwargs)
+    try:
+        lexer.tokenize()
+    except ValueError as e:
+        return str(e)
+    return list(zip(lexer.kinds, lexer.offsets, lexer.lengths))
+
+
+def parse(lexer_class, data, **kwargs):
+    """(headers, moves, result) of every game, or the error message"""
+    try:
+        return [(game.headers, game.moves, game.result)
+                for game, _ in lexer_class(data, **kwargs).parseGames()]
+    except (ValueError, SyntaxError) as e:
+        return str(e)
+
+
+@unittest.skipIf(np is None, "the bulk lexer needs NumPy")
+class BulkLexerTest(unittest.TestCase):
+    def assertSameTokens(self, data):
+        expected = lex(PGNByteLexer, data)
+        for window in WINDOWS:
+            with self.subTest(window=window):
+                self.assertEqual(lex(BulkLexer, data, window=window), expected)
+    
+    def test_tokens(self):
+        self.assertSameTokens(b'[Event "a"]\n[Site "b\\"c"]\n1. e4 {best} e5 $1 2. Nf3!? (2. f4 exf4) Nc6 ; line\n'
+                              b'3... O-O-O 1-0e4 1.1-0 1/2-1/2 * 12...Bb5+ e8=Q#')
+    
+    def test_unicode_whitespace(self):
+        self.assertSameTokens('1. e4 e5 2.　Nf3\x1cNc6 é5 ° e4 *'.encode())
+    
+    def test_errors(self):
+        for data in (b'1. e4 } e5', b'1. e4 $ e5', b'e4 {open', b'[Event "a', b'[Event a] e4', ERROR_AFTER_GAMES):
+            with self.subTest(data=data):
+                self.assertIsInstance(lex(PGNByteLexer, data), str)
+                self.assertSameTokens(data)
+    
+    def test_error_after_last_game(self):
+        expected = parse(PGNByteLexer, ERROR_AFTER_GAMES)
+        self.assertEqual(expected, "26: Unrecognized character '['")
+        for window in WINDOWS:
+            with self.subTest(window=window):
+                self.assertEqual(parse(BulkLexer, ERROR_AFTER_GAMES, window=window), expected)
+
+
+
+class LazyImportTest(unittest.TestCase):
+    def test_numpy_not_imported(self):
+        # only the NumPy lexer and enabled metrics load bulk_lexer, and with it NumPy
+        code = ("import sys, batch, server, follow, position_index, disk_cache, parallel; "
+                "sys.exit('numpy' in sys.modules or 'bulk_lexer' in sys.modules)")
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.assertEqual(subprocess.run([sys.executable, '-c', code], cwd=root).returncode, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+# Move Column Tests - rows parsed straight into columns match the object AST and render the same
+import os
+import unittest
+
+from ast_nodes import GameNode
+from code_gen import renderer
+from columnar import MoveColumns, compile_columns, np
+from pipeline import compile_move, read_pgn_games
+
+TEST_FILES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'test_files')
+MOVES = ['e4', 'e5', 'Nf3', 'Nbd7', 'R1e2+', 'Qh4xe1#', 'exd5', 'e8=Q+', 'O-O', 'O-O-O#', 'Zz9', 'e4e5', 'e4']
+
+
+def compiled_node(move_notation):
+    try:
+        return compile_move(move_notation).ast
+    except (ValueError, SyntaxError):
+        return None
+
+
+class MoveColumnsTest(unittest.TestCase):
+    def test_rows_match_nodes(self):
+        columns = compile_columns([GameNode(moves=MOVES)])
+        self.assertEqual(len(columns), len(MOVES))
+        for row, move_notation in enumerate(MOVES):
+            with self.subTest(move=move_notation):
+                self.assertEqual(repr(columns.node(row)), repr(compiled_node(move_notation)))
+    
+    def test_render(self):
+        columns = compile_columns([GameNode(moves=MOVES)])
+        expected = [None if node is None else renderer.render(node) for node in map(compiled_node, MOVES)]
+        self.assertEqual(renderer.renderColumns(columns), expected)
+    
+    def test_test_files(self):
+        for name in sorted(os.listdir(TEST_FILES)):
+            games = list(read_pgn_games(os.path.join(TEST_FILES, name), keep_annotations=False))
+            columns = compile_columns(games)
+            with self.subTest(file=name):
+                self.assertEqual(columns.gameCount(), len(games))
+                from_nodes = MoveColumns()
+                for game_index, game in enumerate(games):
+                    from_nodes.startGame()
+                    from_nodes.extend(map(compiled_node, game.moves))
+                    self.assertEqual(columns.gameRange(game_index)[1] - columns.gameRange(game_index)[0],
+                                     len(game.moves))
+                self.assertEqual([columns.row(row) for row in range(len(columns))],
+                                 [from_nodes.row(row) for row in range(len(from_nodes))])
+    
+    @unittest.skipIf(np is None, "column arrays need NumPy")
+    def test_arrays_round_trip(self):
+        columns = compile_columns([GameNode(moves=MOVES[:5]), GameNode(moves=MOVES[5:])])
+        copy = MoveColumns.fromArrays(columns.arrays())
+        self.assertEqual(list(copy.game_starts), [0, 5])
+        self.assertEqual(renderer.renderColumns(copy), renderer.renderColumns(columns))
+
+
+if __name__ == '__main__':
+    unittest.main()
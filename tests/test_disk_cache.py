@@ -0,0 +1,122 @@
+# Disk Cache Tests - entries are found again by later instances, changes miss them, broken files are ignored
+import os
+import tempfile
+import unittest
+
+import disk_cache
+from disk_cache import CachedPGNIndex, DiskCache, FILES_NAME
+from pgn_index import PGNIndex
+
+PGN = '[Event "a"]\n1. e4 e5 2. Nf3 Zz9 1-0\n\n[Event "b"]\n1. d4 d5 2. c4 Qx 0-1\n'
+
+
+class DiskCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.directory.name, 'cache')
+        self.pgn = os.path.join(self.directory.name, 'games.pgn')
+        self.writePGN(PGN)
+    
+    def tearDown(self):
+        self.directory.cleanup()
+    
+    def writePGN(self, text):
+        with open(self.pgn, 'w') as f:
+            f.write(text)
+    
+    def assertCached(self, cache):
+        index = cache.open(self.pgn)
+        self.assertIsInstance(index, CachedPGNIndex)
+        with index, PGNIndex(self.pgn) as expected:
+            expected.build()
+            self.assertEqual(index.gameCount(), expected.gameCount())
+            for game in range(expected.gameCount()):
+                cached_game, translations = index.compileGame(game)
+                game_node, expected_translations = expected.compileGame(game)
+                self.assertEqual((cached_game.headers, cached_game.moves), (game_node.headers, game_node.moves))
+                self.assertEqual(translations, expected_translations)
+    
+    def test_hit_across_instances(self):
+        self.assertIsNone(DiskCache(self.cache_dir).open(self.pgn))
+        key = DiskCache(self.cache_dir).build(self.pgn)
+        self.assertCached(DiskCache(self.cache_dir))
+        # building again finds the entry instead of compiling the file twice
+        self.assertEqual(DiskCache(self.cache_dir).build(self.pgn), key)
+        self.assertEqual(DiskCache(self.cache_dir).stats()['entries'], 1)
+    
+    def test_content_change(self):
+        cache = DiskCache(self.cache_dir)
+        key = cache.build(self.pgn)
+        self.writePGN(PGN.replace('Nf3', 'Nc3'))
+        # the stamp changed and open never hashes, so the file is a miss until it is built again
+        self.assertIsNone(cache.open(self.pgn))
+        self.assertNotEqual(cache.build(self.pgn), key)
+        self.assertCached(cache)
+    
+    def test_compiler_version_change(self):
+        cache = DiskCache(self.cache_dir)
+        cache.build(self.pgn)
+        compiler_version = disk_cache.COMPILER_VERSION
+        disk_cache.COMPILER_VERSION = 'edited'
+        try:
+            self.assertIsNone(cache.open(self.pgn))
+        finally:
+            disk_cache.COMPILER_VERSION = compiler_version
+        self.assertCached(cache)
+    
+    def test_cache_version_change(self):
+        cache = DiskCache(self.cache_dir)
+        cache.build(self.pgn)
+        cache_version = disk_cache.CACHE_VERSION
+        disk_cache.CACHE_VERSION = cache_version + 1
+        try:
+            # the key is the same, the stored index has the old layout version
+            self.assertIsNone(cache.open(self.pgn))
+        finally:
+            disk_cache.CACHE_VERSION = cache_version
+    
+    def test_corrupt_entries(self):
+        cache = DiskCache(self.cache_dir)
+        key = cache.build(self.pgn)
+        index_path, archive_path = cache.entryPaths(key)
+        for path in (index_path, archive_path):
+            with open(path, 'rb') as f:
+                good = f.read()
+            for name, data in (('empty', b''), ('truncated', good[:len(good) - 4]), ('garbage', b'x' * len(good))):
+                with self.subTest(file=os.path.basename(path)[-4:], data=name):
+                    with open(path, 'wb') as f:
+                        f.write(data)
+                    self.assertIsNone(cache.open(self.pgn))
+            with open(path, 'wb') as f:
+                f.write(good)
+        self.assertCached(cache)
+    
+    def test_corrupt_files_list(self):
+        cache = DiskCache(self.cache_dir)
+        cache.build(self.pgn)
+        for data in ('{not json', '[]', ''):
+            with self.subTest(data=data):
+                with open(os.path.join(self.cache_dir, FILES_NAME), 'w') as f:
+                    f.write(data)
+                # the content hash is forgotten, building hashes the file again and finds the entry
+                self.assertIsNone(cache.open(self.pgn))
+                cache.build(self.pgn)
+                self.assertCached(cache)
+    
+    def test_eviction(self):
+        cache = DiskCache(self.cache_dir)
+        first = cache.build(self.pgn)
+        size = cache.stats()['bytes']
+        self.writePGN(PGN + '\n[Event "c"]\n1. c4 *\n')
+        # room for the new entry, not for both
+        cache.max_bytes = 2 * size - 1
+        second = cache.build(self.pgn)
+        # the least recently used entry goes, the one just built stays
+        self.assertEqual([key for _, _, key in cache.entries()], [second])
+        self.assertNotEqual(first, second)
+        cache.clear()
+        self.assertEqual(cache.stats()['entries'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
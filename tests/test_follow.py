@@ -0,0 +1,127 @@
+# Follow Mode Tests - appended data gives the events of reading the whole file once, whatever the writes
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+
+import follow
+from follow import PGNFollower
+from pipeline import read_pgn_games
+
+PGN = ('[Event "Ölmez Open"]\n[White "a"]\n1. e4 {book} e5 2. Nf3 (2. f4 exf4) Nc6 3. Bb5 a6 1-0\n\n'
+       '1. d4 d5 2. c4 Qx *\n'
+       '[Event "c"]\n1. c4 e5 $1 2. Nc3 0-1\n')
+
+
+class FollowTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'live.pgn')
+        self.write(b'')
+    
+    def tearDown(self):
+        self.directory.cleanup()
+    
+    def write(self, data, mode='wb'):
+        with open(self.path, mode) as f:
+            f.write(data)
+    
+    def append(self, data):
+        self.write(data, 'ab')
+    
+    def follow(self, chunks, resolve=False):
+        """Events of a follower polled after every appended chunk, and once more at the end"""
+        follower = PGNFollower(self.path, resolve)
+        events = []
+        for chunk in chunks:
+            self.append(chunk)
+            events += follower.poll()
+        return events + follower.poll(final=True)
+    
+    def test_whole_file(self):
+        events = self.follow([PGN.encode()])
+        moves = [[event.content[0] for event in events if event.kind == 'move' and event.game == game]
+                 for game in (1, 2, 3)]
+        self.write(PGN.encode())
+        games = list(read_pgn_games(self.path, keep_annotations=False))
+        self.assertEqual(moves, [game.moves for game in games])
+        self.assertEqual([event.content for event in events if event.kind == 'result'],
+                         [game.result for game in games])
+        self.assertEqual([event.content for event in events if event.kind == 'tag'],
+                         [tag for game in games for tag in game.headers.items()])
+        self.assertEqual(events[3].content, ('e4', 'Pawn to e4', 'Pawn moves to e4'))
+    
+    def test_appended_data(self):
+        follower = PGNFollower(self.path)
+        self.append('[Event "a"]\n1. e4 e5 '.encode())
+        first = follower.poll()
+        self.assertEqual([event.kind for event in first], ['game', 'tag', 'move', 'move'])
+        self.append(b'2. Nf3 ')
+        # only the appended move comes back
+        self.assertEqual(follower.poll(), [follow.FollowEvent('move', 1, 3, ('Nf3', 'Knight to f3',
+                                                                           'Knight moves to f3'))])
+        self.assertEqual(follower.poll(), [])
+        self.assertEqual((follower.games, follower.moves), (1, 3))
+    
+    def test_every_split(self):
+        # a write can stop anywhere, even inside a token or a UTF-8 character
+        expected = self.follow([PGN.encode()])
+        data = PGN.encode()
+        for split in range(1, len(data)):
+            self.write(b'')
+            with self.subTest(split=split):
+                self.assertEqual(self.follow([data[:split], data[split:]]), expected)
+        self.write(b'')
+        self.assertEqual(self.follow([bytes([byte]) for byte in data]), expected)
+    
+    def test_partial_trailing_game(self):
+        follower = PGNFollower(self.path)
+        self.append(b'[Event "a"]\n1. e4 e5 2. Nf')
+        self.assertEqual([event.content[0] for event in follower.poll() if event.kind == 'move'], ['e4', 'e5'])
+        # "Nf3" may still become "Nf3+", it waits for the byte after it
+        self.append(b'3')
+        self.assertEqual(follower.poll(), [])
+        self.append(b'+ {still')
+        self.assertEqual([event.content[0] for event in follower.poll()], ['Nf3+'])
+        self.append(b' thinking} Nc6 [Event "b')
+        events = follower.poll()
+        self.assertEqual([event.content[0] for event in events], ['Nc6'])
+        self.append(b'"]\n')
+        self.assertEqual([event.kind for event in follower.poll()], ['game', 'tag'])
+    
+    def test_rewritten_file(self):
+        follower = PGNFollower(self.path)
+        self.append(b'1. e4 e5 ')
+        follower.poll()
+        self.write(b'1. d4 ')
+        events = follower.poll()
+        self.assertEqual([event.kind for event in events], ['reset', 'game', 'move'])
+        self.assertEqual(events[-1].content[0], 'd4')
+    
+    def test_invalid_fen(self):
+        events = self.follow([b'[FEN "garbage"]\n1. e4 e5 2. Nf3 *\n[Event "b"]\n1. e4 *\n'], resolve=True)
+        moves = [event.content[1] for event in events if event.kind == 'move']
+        # the FEN is the error of the first move, the rest of the game is compiled without origins
+        self.assertEqual(moves, ["Error: Invalid FEN: garbage", "Pawn to e5", "Knight to f3", "Pawn from e2 to e4"])
+    
+    def test_once(self):
+        self.write(PGN.encode())
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            self.assertEqual(follow.main([self.path, '--once', '--format', 'jsonl']), 0)
+        records = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(records[0], {'event': 'game', 'game': 1})
+        self.assertEqual(records[1], {'event': 'tag', 'game': 1, 'name': 'Event', 'value': 'Ölmez Open'})
+        self.assertEqual(records[-1], {'event': 'result', 'game': 3, 'result': '0-1'})
+    
+    def test_missing_file(self):
+        err = io.StringIO()
+        with contextlib.redirect_stderr(err):
+            self.assertEqual(follow.main([self.path + '.missing', '--once']), 1)
+        self.assertTrue(err.getvalue().startswith("Error: "))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+# Metrics Tests - every lexing path shows up in the stage counters
+import unittest
+
+import metrics
+import pipeline
+from bulk_lexer import PGN_BYTE_LEXERS, np
+from pgn_lexer import PGNLexer
+from pgn_parser import PGNParser
+
+PGN = b'[Event "a"] 1. e4 e5 2. Nf3 Zz9 1-0\n[Event "b"] 1. d4 d5 0-1\n'
+MAPPED_LEXERS = ('regex', 'numpy') if np is not None else ('regex',)
+
+
+class MetricsTest(unittest.TestCase):
+    def setUp(self):
+        metrics.reset()
+        pipeline.compile_cache.clear()
+        pipeline.byte_cache.clear()
+        metrics.enable()
+    
+    def tearDown(self):
+        metrics.disable()
+        metrics.reset()
+    
+    def assertStagesRecorded(self):
+        stages = metrics.snapshot()['stages']
+        for stage in metrics.STAGES:
+            self.assertGreater(stages[stage]['calls'], 0, stage)
+        self.assertGreater(stages['lexer']['errors'], 0)
+    
+    def test_text(self):
+        games = PGNParser(PGNLexer(PGN.decode()).tokenize()).parseGames()
+        for game in games:
+            pipeline.compile_game_all(game.moves)
+        self.assertStagesRecorded()
+        self.assertEqual(metrics.snapshot()['cache']['misses'], 6)
+    
+    def test_mapped(self):
+        for lexer in MAPPED_LEXERS:
+            with self.subTest(lexer=lexer):
+                metrics.reset()
+                pipeline.byte_cache.clear()
+                for _, spans in PGN_BYTE_LEXERS[lexer](PGN).parseGames():
+                    pipeline.compile_spans_all(PGN, spans)
+                self.assertStagesRecorded()
+                cache = metrics.snapshot()['cache']
+                self.assertEqual((cache['hits'], cache['misses']), (0, 6))
+    
+    def test_cache_capacity(self):
+        # both caches share the configured size, it is reported once
+        try:
+            pipeline.set_cache_size(100)
+            self.assertEqual(metrics.snapshot()['cache']['maxsize'], 100)
+        finally:
+            pipeline.set_cache_size(pipeline.DEFAULT_CACHE_SIZE)
+    
+    def test_disable_restores(self):
+        metrics.disable()
+        self.assertFalse(metrics.metrics.isEnabled())
+        for cls, name, _ in metrics.instrumented():
+            self.assertFalse(hasattr(cls.__dict__[name], '__wrapped__'), f"{cls.__name__}.{name}")
+
+
+if __name__ == '__main__':
+    unittest.main()
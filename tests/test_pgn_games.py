@@ -0,0 +1,113 @@
+# PGN Game Splitting Tests - the text reader and the game index split databases into the same games
+import os
+import tempfile
+import unittest
+
+from bulk_lexer import np
+from pgn_index import PGNIndex
+from pipeline import read_pgn_games, read_pgn_games_mapped
+
+# byte lexers read_pgn_games_mapped is run with, the NumPy one only where NumPy is installed
+MAPPED_LEXERS = ('regex', 'numpy') if np is not None else ('regex',)
+TEST_FILES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'test_files')
+
+# tokens between games that belong to none of them
+BETWEEN_GAMES = '[Event "a"] 1. e4 e5 1-0\n{between games}\n[Event "b"] 1. d4 0-1\n\n[Event "c"] 1. c4 *'
+
+
+def write_pgn(text):
+    """Path of a temporary PGN file holding text, removed by the caller"""
+    fd, path = tempfile.mkstemp(suffix='.pgn')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(text)
+    return path
+
+
+def game_tuples(games):
+    return [(game.headers, game.moves, game.result) for game in games]
+
+
+class GameSplittingTest(unittest.TestCase):
+    def assertGames(self, text, expected):
+        """Both readers split text into the expected (headers, moves, result) games"""
+        path = write_pgn(text)
+        try:
+            self.assertEqual(game_tuples(read_pgn_games(path)), expected)
+            for lexer in MAPPED_LEXERS:
+                with self.subTest(lexer=lexer):
+                    self.assertEqual(game_tuples(read_pgn_games_mapped(path, lexer=lexer)), expected)
+            with PGNIndex(path) as index:
+                index.build()
+                self.assertEqual(game_tuples(index.readGame(game) for game in range(index.gameCount())),
+                                 expected)
+        finally:
+            os.remove(path)
+    
+    def test_comment_between_games(self):
+        self.assertGames(BETWEEN_GAMES, [
+            ({'Event': 'a'}, ['e4', 'e5'], '1-0'),
+            ({'Event': 'b'}, ['d4'], '0-1'),
+            ({'Event': 'c'}, ['c4'], '*'),
+        ])
+    
+    def test_leading_and_trailing_comments(self):
+        self.assertGames('{intro} $1 ; line\n[Event "a"] 1. e4 *\n{the end}', [({'Event': 'a'}, ['e4'], '*')])
+    
+    def test_stray_tokens_between_games(self):
+        self.assertGames('1. e4 1-0 3. (1... c5) ) [Event "b"] d4 *', [
+            ({}, ['e4'], '1-0'),
+            ({'Event': 'b'}, ['d4'], '*'),
+        ])
+    
+    def test_games_without_results(self):
+        self.assertGames('[Event "a"] 1. e4 e5 [Event "b"] 1. d4', [
+            ({'Event': 'a'}, ['e4', 'e5'], None),
+            ({'Event': 'b'}, ['d4'], None),
+        ])
+    
+    def test_only_comments(self):
+        self.assertGames('{nothing} ; here\n', [])
+    
+    def test_test_files(self):
+        for name in sorted(os.listdir(TEST_FILES)):
+            path = os.path.join(TEST_FILES, name)
+            expected = [(game.headers, game.moves, game.result, game.annotations) for game in read_pgn_games(path)]
+            with self.subTest(file=name):
+                self.assertTrue(expected)
+                for lexer in MAPPED_LEXERS:
+                    self.assertEqual([(game.headers, game.moves, game.result, game.annotations)
+                                      for game in read_pgn_games_mapped(path, lexer=lexer)], expected, lexer)
+                with PGNIndex(path) as index:
+                    index.build()
+                    self.assertEqual(game_tuples(index.readGame(game) for game in range(index.gameCount())),
+                                     [game[:3] for game in expected])
+    
+    def assertSameError(self, text, error_type):
+        """Every reader fails on text with the same error, also when it comes after the last game"""
+        path = write_pgn(text)
+        try:
+            with self.assertRaises(error_type) as expected:
+                list(read_pgn_games(path))
+            for lexer in MAPPED_LEXERS:
+                with self.subTest(lexer=lexer), self.assertRaises(error_type) as raised:
+                    list(read_pgn_games_mapped(path, lexer=lexer))
+                self.assertEqual(str(raised.exception), str(expected.exception))
+        finally:
+            os.remove(path)
+    
+    def test_errors_after_last_game(self):
+        for text in ('[Event "a"] 1. e4 *\n[Event "b"] 1. d4 } *', '[Event "a"] 1. e4 *\n{never closed',
+                     '[Event "a"] 1. e4 *\n[Event "b', '[Event "a"] 1. e4 1-0 $ e5'):
+            with self.subTest(text=text):
+                self.assertSameError(text, ValueError)
+        self.assertSameError('[Event "a"] 1. e4 *\n(1. d4', SyntaxError)
+    
+    def test_unicode_whitespace(self):
+        # the bytes of a no-break space or an ideographic space separate moves as the decoded text does
+        self.assertGames('[Event\u00a0"a"] 1. e4\u00a0e5 2.\u3000Nf3\x1cNc6 \u00e95 *', [
+            ({'Event': 'a'}, ['e4', 'e5', 'Nf3', 'Nc6', '\u00e95'], '*'),
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
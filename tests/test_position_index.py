@@ -0,0 +1,77 @@
+# Position Index Tests - bad input ends with an error message and exit status 1, broken index files are closed
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+import position_index
+
+FD_DIRECTORY = '/proc/self/fd'
+PGN = '[Event "a"] 1. e4 e5 2. Nf3 Nc6 1-0\n[Event "b"] 1. e4 e5 2. Nf3 Nc6 0-1\n'
+
+
+def open_files():
+    """Open file descriptors of the process, 0 where they cannot be counted"""
+    return len(os.listdir(FD_DIRECTORY)) if os.path.isdir(FD_DIRECTORY) else 0
+
+
+class PositionIndexCLITest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.pgn = os.path.join(self.directory.name, 'games.pgn')
+        self.index = os.path.join(self.directory.name, 'games.pos')
+        with open(self.pgn, 'w') as f:
+            f.write(PGN)
+    
+    def tearDown(self):
+        self.directory.cleanup()
+    
+    def run_main(self, *argv):
+        """(exit status, stdout, stderr) of position_index.main"""
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            status = position_index.main(list(argv))
+        return status, stdout.getvalue(), stderr.getvalue()
+    
+    def test_find(self):
+        self.assertEqual(self.run_main('build', self.pgn, self.index)[0], 0)
+        status, out, _ = self.run_main('find', self.index, '--moves', 'e4 e5 Nf3')
+        self.assertEqual(status, 0)
+        self.assertEqual(out.splitlines(), ['Game 1, ply 3', 'Game 2, ply 3'])
+    
+    def test_bad_input(self):
+        self.assertEqual(self.run_main('build', self.pgn, self.index)[0], 0)
+        for argv in (('find', self.index, '--moves', 'e4 Nx'),        # SAN parser error
+                     ('find', self.index, '--moves', 'e4 e4'),        # illegal move
+                     ('find', self.index, '--fen', 'not a fen'),
+                     ('find', self.index + '.missing', '--moves', 'e4'),
+                     ('build', self.pgn + '.missing', self.index)):
+            with self.subTest(argv=argv):
+                status, _, err = self.run_main(*argv)
+                self.assertEqual(status, 1)
+                self.assertTrue(err.startswith('Error: '))
+
+    
+    def test_refused_index_is_closed(self):
+        self.assertEqual(self.run_main('build', self.pgn, self.index)[0], 0)
+        with open(self.index, 'rb') as f:
+            good = f.read()
+        magic, version, *rest = position_index.HEADER.unpack_from(good)
+        for name, data, message in [
+            ('empty', b'', "not a position index"),
+            ('magic', b'NOTCHESS' + good[8:], "not a position index"),
+            ('version', position_index.HEADER.pack(magic, version + 1, *rest) + good[position_index.HEADER.size:],
+             "position index version 2, expected 1"),
+        ]:
+            with open(self.index, 'wb') as f:
+                f.write(data)
+            with self.subTest(name):
+                before = open_files()
+                with self.assertRaisesRegex(ValueError, message):
+                    position_index.PositionIndex(self.index)
+                self.assertEqual(open_files(), before)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+# Recovery Mode Tests - with a diagnostics list, bad moves become Diagnostics and the good ones still compile
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+import batch
+import pipeline
+from chess_token import Diagnostic
+from columnar import np
+from lexer import LEXERS
+
+MOVES = ['e4', 'Zz9', 'Nf3', 'e5e6', 'O-O']
+PGN = '[Event "a"] 1. e4 Zz9 2. Nf3 e5e6 3. O-O 1-0\n[Event "b"] 1. d4 d5 2. c4 Qx 0-1\n'
+MAPPED_LEXERS = ('regex', 'numpy') if np is not None else ('regex',)
+
+
+class RecoveryTest(unittest.TestCase):
+    def setUp(self):
+        pipeline.compile_cache.clear()
+    
+    def tearDown(self):
+        pipeline.set_lexer(pipeline.DEFAULT_LEXER)
+    
+    def test_parse_game(self):
+        for name in LEXERS:
+            pipeline.set_lexer(name)
+            with self.subTest(lexer=name):
+                diagnostics = []
+                moves, result = pipeline.parse_game('1. e4 Zz9 2. Nf3 e5e6 3. O-O 1-0', diagnostics)
+                self.assertEqual(len(moves), 5)
+                self.assertEqual([i for i, move in enumerate(moves) if move is None], [1, 3])
+                self.assertEqual(result, '1-0')
+                self.assertEqual([d.stage for d in diagnostics], ['lexer', 'parser'])
+    
+    def test_parse_game_raises(self):
+        with self.assertRaises(ValueError):
+            pipeline.parse_game('1. e4 Zz9 1-0')
+    
+    def test_compile_game(self):
+        for resolve in (False, True):
+            with self.subTest(resolve=resolve):
+                diagnostics = []
+                translations = pipeline.compile_game(MOVES, resolve=resolve, diagnostics=diagnostics)
+                self.assertEqual(len(translations), len(MOVES))
+                self.assertEqual([i for i, text in enumerate(translations) if text.startswith("Error: ")], [1, 3])
+                self.assertEqual([(d.stage, d.ply) for d in diagnostics], [('lexer', 2), ('parser', 4)])
+                self.assertTrue(all(isinstance(d, Diagnostic) for d in diagnostics))
+    
+    def test_cached_failure(self):
+        # the first failure is cached, later lookups raise or report it the same way
+        diagnostics = []
+        self.assertIsNone(pipeline.compile_move('Zz9', diagnostics))
+        with self.assertRaises(ValueError):
+            pipeline.compile_move('Zz9')
+        self.assertIsNone(pipeline.compile_move('Zz9', diagnostics))
+        self.assertEqual(len(diagnostics), 2)
+        self.assertEqual(diagnostics[0], diagnostics[1])
+    
+    def test_batch(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'games.pgn')
+            with open(filename, 'w') as f:
+                f.write(PGN)
+            outputs = []
+            for mapped in [[]] + [['--mmap', lexer] for lexer in MAPPED_LEXERS]:
+                out, err = io.StringIO(), io.StringIO()
+                with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+                    status = batch.main([filename, '--recover'] + mapped)
+                self.assertEqual(status, 0)
+                self.assertIn("Diagnostics: 3 errors in 2 games", err.getvalue())
+                outputs.append(out.getvalue())
+            self.assertEqual(outputs[0].count("Error: "), 3)
+            self.assertEqual(outputs[1:], outputs[:1] * len(MAPPED_LEXERS))
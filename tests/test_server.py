@@ -0,0 +1,68 @@
+# Translation Server Tests - requests over a real keep-alive connection, client errors get 4xx
+import asyncio
+import json
+import unittest
+
+from server import TranslationServer
+
+
+class ServerTest(unittest.TestCase):
+    def exchange(self, requests):
+        """(status, body) of every (method, path, payload) request, all sent on one keep-alive connection"""
+        async def run():
+            server = TranslationServer(batch_window=0)
+            server.start()
+            listener = await asyncio.start_server(server.handleConnection, '127.0.0.1', 0)
+            port = listener.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            responses = []
+            try:
+                for method, path, payload in requests:
+                    body = b'' if payload is None else json.dumps(payload).encode()
+                    writer.write(f"{method} {path} HTTP/1.1\r\nHost: test\r\nContent-Length: {len(body)}\r\n\r\n"
+                                 .encode('latin1') + body)
+                    await writer.drain()
+                    head = (await reader.readuntil(b'\r\n\r\n')).decode('latin1').split('\r\n')
+                    headers = dict(line.split(': ', 1) for line in head[1:] if line)
+                    data = await reader.readexactly(int(headers['Content-Length']))
+                    responses.append((int(head[0].split(' ')[1]), json.loads(data)))
+            finally:
+                writer.close()
+                listener.close()
+                server.close()
+            return responses, server.counters
+        return asyncio.run(run())
+    
+    def test_game(self):
+        (status, body), = self.exchange([('POST', '/game', {'movetext': '1. e4 e5 2. Nf3 *'})])[0]
+        self.assertEqual(status, 200)
+        self.assertEqual([move['san'] for move in body['moves']], ['e4', 'e5', 'Nf3'])
+        self.assertEqual(body['result'], '*')
+    
+    def test_bad_movetext(self):
+        # each answered 400 on the same connection, which then still serves the next request
+        texts = ('1. e4 {unterminated', '1. e4 (e5', '{}', '{ abc', '[Event "x')
+        requests = [('POST', '/game', {'movetext': text}) for text in texts]
+        responses, counters = self.exchange(requests + [('POST', '/move', {'san': 'Nf3'})])
+        self.assertEqual([status for status, _ in responses], [400, 400, 400, 400, 400, 200])
+        self.assertEqual(responses[-1][1]['simple'], 'Knight to f3')
+        self.assertEqual(counters['errors'], 0)
+    
+    def test_client_errors(self):
+        responses, _ = self.exchange([
+            ('POST', '/move', {}),
+            ('POST', '/game', {'moves': 'e4'}),
+            ('POST', '/game', {'moves': ['e4'], 'resolve': True, 'fen': 'not a fen'}),
+            ('GET', '/move', None),
+            ('GET', '/nowhere', None),
+        ])
+        self.assertEqual([status for status, _ in responses], [400, 400, 400, 405, 404])
+    
+    def test_bad_move_is_a_record(self):
+        (status, body), = self.exchange([('POST', '/move', {'san': 'Zz9'})])[0]
+        self.assertEqual(status, 200)
+        self.assertTrue(body['error'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+# Record Writer Tests - JSONL, CSV and columnar .npy output read back to the records written
+import ast
+import csv
+import json
+import os
+import struct
+import tempfile
+import unittest
+from array import array
+
+import writers
+from columnar import np
+from pipeline import RECORD_FIELDS, move_records
+from writers import FIELDS, NPY_HEADER_SIZE, NUMERIC_COLUMNS, open_writer
+
+GAMES = [['e4', 'e5', 'Nf3', 'Zz9', 'O-O'], ['d4', 'Nf6', 'c4', 'e5e6', 'e8=Q+']]
+
+
+def game_records():
+    """(game, record) pairs of GAMES, with a hand-made record whose texts need quoting"""
+    pairs = [(game, record) for game, moves in enumerate(GAMES, start=1)
+             for record in move_records(moves, resolve=True)]
+    quoted = pairs[0][1][:-3] + ('Pawn "to" e4, at last', 'line one\nline two', None)
+    return pairs + [(3, quoted)]
+
+
+def write(output_format, path, pairs):
+    with open_writer(output_format, path) as writer:
+        for game, record in pairs:
+            writer.writeGame(game, [record])
+    return writer
+
+
+def read_npy(path):
+    """(descr, shape, raw data) of a .npy file, without NumPy"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    header_size = struct.unpack_from('<H', data, 8)[0]
+    header = ast.literal_eval(data[10:10 + header_size].decode('latin1'))
+    return header['descr'], header['shape'], data[10 + header_size:]
+
+
+class WritersTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.pairs = game_records()
+    
+    def tearDown(self):
+        self.directory.cleanup()
+    
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+    
+    def test_jsonl(self):
+        write('jsonl', self.path('moves.jsonl'), self.pairs)
+        with open(self.path('moves.jsonl'), encoding='utf-8') as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual([list(line) for line in lines], [list(FIELDS)] * len(self.pairs))
+        self.assertEqual([tuple(line.values()) for line in lines],
+                         [(game,) + tuple(record) for game, record in self.pairs])
+        self.assertEqual(lines[0]['origin'], 'e2')
+        self.assertIsNone(lines[3]['type'])
+        self.assertTrue(lines[3]['error'])
+    
+    def test_csv(self):
+        write('csv', self.path('moves.csv'), self.pairs)
+        with open(self.path('moves.csv'), newline='', encoding='utf-8') as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows[0], list(FIELDS))
+        # None becomes an empty field, commas, quotes and newlines survive quoting
+        expected = [['' if value is None else str(value) for value in (game,) + tuple(record)]
+                    for game, record in self.pairs]
+        self.assertEqual(rows[1:], expected)
+        self.assertEqual(rows[-1][FIELDS.index('simple')], 'Pawn "to" e4, at last')
+        self.assertEqual(rows[-1][FIELDS.index('verbose')], 'line one\nline two')
+    
+    def test_npy_layout(self):
+        write('npy', self.path('moves.columns'), self.pairs)
+        count = len(self.pairs)
+        for field in FIELDS:
+            with self.subTest(field=field):
+                if field in NUMERIC_COLUMNS:
+                    descr, shape, data = read_npy(self.path(f'moves.columns/{field}.npy'))
+                    self.assertEqual((descr, shape), (NUMERIC_COLUMNS[field][1], (count,)))
+                    self.assertEqual(len(data), count * array(NUMERIC_COLUMNS[field][0]).itemsize)
+                else:
+                    descr, shape, data = read_npy(self.path(f'moves.columns/{field}.offsets.npy'))
+                    self.assertEqual((descr, shape), ('<u8', (count + 1,)))
+                    offsets = struct.unpack(f'<{count + 1}Q', data)
+                    descr, shape, data = read_npy(self.path(f'moves.columns/{field}.data.npy'))
+                    self.assertEqual((descr, shape), ('|u1', (offsets[-1],)))
+                    index = FIELDS.index(field)
+                    self.assertEqual([data[start:stop].decode('utf-8') for start, stop in zip(offsets, offsets[1:])],
+                                     ['' if record[index - 1] is None else str(record[index - 1])
+                                      for _, record in self.pairs])
+        with open(self.path('moves.columns/ply.npy'), 'rb') as f:
+            self.assertEqual(len(f.read(NPY_HEADER_SIZE)), NPY_HEADER_SIZE)
+    
+    @unittest.skipIf(np is None, "loads the columns with NumPy")
+    def test_npy_numpy(self):
+        write('npy', self.path('moves.columns'), self.pairs)
+        square = np.load(self.path('moves.columns/square.npy'))
+        self.assertEqual((square.dtype, square.shape), (np.dtype('i1'), (len(self.pairs),)))
+        self.assertEqual(square[0], 28)     # e4
+        self.assertEqual(square[3], -1)     # the move that did not compile
+        game = np.load(self.path('moves.columns/game.npy'))
+        self.assertEqual(game.tolist(), [game_number for game_number, _ in self.pairs])
+        check = np.load(self.path('moves.columns/check.npy'))
+        self.assertEqual(check.dtype, np.dtype(bool))
+        self.assertEqual(check.tolist(), [bool(record[RECORD_FIELDS.index('check')]) for _, record in self.pairs])
+    
+    def test_buffered(self):
+        # records reach the file in bulk writes, the result does not depend on the buffer size
+        write('jsonl', self.path('whole.jsonl'), self.pairs)
+        buffer_records = writers.BUFFER_RECORDS
+        writers.BUFFER_RECORDS = 2
+        try:
+            writer = write('jsonl', self.path('buffered.jsonl'), self.pairs)
+        finally:
+            writers.BUFFER_RECORDS = buffer_records
+        self.assertEqual(writer.records, len(self.pairs))
+        with open(self.path('whole.jsonl'), 'rb') as whole, open(self.path('buffered.jsonl'), 'rb') as buffered:
+            self.assertEqual(buffered.read(), whole.read())
+    
+    def test_npy_needs_directory(self):
+        with self.assertRaises(ValueError):
+            open_writer('npy', None)
+
+
+if __name__ == '__main__':
+    unittest.main()
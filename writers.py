@@ -0,0 +1,218 @@
+# Writers - streaming machine-readable output of compiled moves (JSONL, CSV, columnar .npy)
+'''
+Every compiled move becomes one record: the game number followed by the
+fields of pipeline.RECORD_FIELDS (ply, SAN text, AST fields, Simple and
+Verbose text, error message). Records are buffered and written in bulk
+every BUFFER_RECORDS moves, so memory stays constant however large the
+input is.
+
+    jsonl   one JSON object per line
+    csv     header line, then one row per move
+    npy     a directory with one NumPy .npy file per column, no NumPy needed
+            to write it; text columns are stored Arrow-style as
+            <field>.offsets.npy (uint64, one more than the records) and
+            <field>.data.npy (UTF-8 bytes), numeric columns as <field>.npy
+    
+    with open_writer("jsonl", "games.jsonl") as writer:
+        writer.writeGame(1, pipeline.move_records(game.moves))
+'''
+import csv
+import json
+import os
+import struct
+import sys
+from array import array
+
+from board import SQUARE_INDEX
+from pipeline import RECORD_FIELDS
+
+FIELDS = ('game',) + RECORD_FIELDS
+BUFFER_RECORDS = 8192   # records held before a bulk write
+
+
+class RecordWriter:
+    """Buffers records and hands them to writeRecords in bulk"""
+    def __init__(self, path):
+        self.path = path
+        self.buffer = []
+        self.records = 0
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def writeGame(self, game, records):
+        """Adds the move records of one game, game numbers are written as given"""
+        for record in records:
+            self.buffer.append((game,) + tuple(record))
+        if len(self.buffer) >= BUFFER_RECORDS:
+            self.flush()
+    
+    def flush(self):
+        if self.buffer:
+            self.writeRecords(self.buffer)
+            self.records += len(self.buffer)
+            self.buffer = []
+    
+    def close(self):
+        self.flush()
+    
+    def writeRecords(self, records):
+        raise NotImplementedError
+
+
+class TextRecordWriter(RecordWriter):
+    """Writes to a text file, or to stdout when the path is None"""
+    def __init__(self, path):
+        super().__init__(path)
+        if path is None:
+            self.file = sys.stdout
+        else:
+            self.file = open(path, 'w', newline='', encoding='utf-8')
+    
+    def close(self):
+        self.flush()
+        if self.file is not sys.stdout:
+            self.file.close()
+
+
+class JSONLWriter(TextRecordWriter):
+    def writeRecords(self, records):
+        encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+        self.file.write(''.join(encode(dict(zip(FIELDS, record))) + '\n' for record in records))
+
+
+class CSVWriter(TextRecordWriter):
+    def __init__(self, path):
+        super().__init__(path)
+        self.writer = csv.writer(self.file, lineterminator='\n')
+        self.writer.writerow(FIELDS)
+    
+    def writeRecords(self, records):
+        # None becomes an empty field
+        self.writer.writerows(records)
+
+
+# columnar layout: field -> array typecode and .npy descr of numeric columns
+# squares are stored as 0 (a1) .. 63 (h8), -1 when the move has none
+NUMERIC_COLUMNS = {
+    'game': ('I', '<u4'),
+    'ply': ('I', '<u4'),
+    'square': ('b', '|i1'),
+    'origin': ('b', '|i1'),
+    'capture': ('B', '|b1'),
+    'check': ('B', '|b1'),
+    'checkmate': ('B', '|b1'),
+}
+SQUARE_COLUMNS = ('square', 'origin')
+NPY_MAGIC = b'\x93NUMPY\x01\x00'
+NPY_HEADER_SIZE = 128   # fixed, so the length can be filled in once it is known
+
+
+class NPYColumn:
+    """One 1-dimensional .npy file written in appends, its shape is patched in on close"""
+    def __init__(self, path, descr):
+        self.descr = descr
+        self.length = 0
+        self.file = open(path, 'wb')
+        self.file.write(self.header())
+    
+    def header(self):
+        header = f"{{'descr': '{self.descr}', 'fortran_order': False, 'shape': ({self.length},), }}"
+        padding = NPY_HEADER_SIZE - len(NPY_MAGIC) - 2 - len(header) - 1
+        return NPY_MAGIC + struct.pack('<H', NPY_HEADER_SIZE - len(NPY_MAGIC) - 2) + \
+            (header + ' ' * padding + '\n').encode('latin1')
+    
+    def append(self, values):
+        """Appends an array (or bytes) of values matching descr"""
+        if isinstance(values, array):
+            if sys.byteorder == 'big' and values.itemsize > 1:
+                values.byteswap()
+            self.length += len(values)
+            values.tofile(self.file)
+        else:
+            self.length += len(values)
+            self.file.write(values)
+    
+    def close(self):
+        self.file.seek(0)
+        self.file.write(self.header())
+        self.file.close()
+
+
+class ColumnarWriter(RecordWriter):
+    """Writes one .npy file per column into the directory at path"""
+    def __init__(self, path):
+        super().__init__(path)
+        os.makedirs(path, exist_ok=True)
+        self.columns = {}
+        self.offsets = {}   # text field -> bytes written so far
+        for field in FIELDS:
+            if field in NUMERIC_COLUMNS:
+                self.columns[field] = NPYColumn(os.path.join(path, f"{field}.npy"), NUMERIC_COLUMNS[field][1])
+            else:
+                self.columns[field] = (NPYColumn(os.path.join(path, f"{field}.offsets.npy"), '<u8'),
+                                       NPYColumn(os.path.join(path, f"{field}.data.npy"), '|u1'))
+                self.columns[field][0].append(array('Q', [0]))
+                self.offsets[field] = 0
+    
+    def writeRecords(self, records):
+        for index, field in enumerate(FIELDS):
+            values = [record[index] for record in records]
+            if field in NUMERIC_COLUMNS:
+                if field in SQUARE_COLUMNS:
+                    values = [SQUARE_INDEX.get(value, -1) for value in values]
+                else:
+                    # flags of failed moves are None
+                    values = [0 if value is None else value for value in values]
+                self.columns[field].append(array(NUMERIC_COLUMNS[field][0], values))
+            else:
+                self.writeText(field, values)
+    
+    def writeText(self, field, values):
+        offsets, data = self.columns[field]
+        ends = array('Q')
+        chunks = []
+        end = self.offsets[field]
+        for value in values:
+            if value is not None:
+                encoded = str(value).encode('utf-8')
+                chunks.append(encoded)
+                end += len(encoded)
+            ends.append(end)
+        self.offsets[field] = end
+        offsets.append(ends)
+        data.append(b''.join(chunks))
+    
+    def close(self):
+        self.flush()
+        for column in self.columns.values():
+            if isinstance(column, tuple):
+                for part in column:
+                    part.close()
+            else:
+                column.close()
+
+
+# output formats by name, used by batch.py --format
+WRITERS = {
+    'jsonl': JSONLWriter,
+    'csv': CSVWriter,
+    'npy': ColumnarWriter,
+}
+
+# file (or directory) name suffix of each format
+EXTENSIONS = {
+    'jsonl': '.jsonl',
+    'csv': '.csv',
+    'npy': '.columns',
+}
+
+
+def open_writer(output_format, path):
+    """Writer for a format name, path None writes JSONL and CSV to stdout"""
+    if path is None and output_format == 'npy':
+        raise ValueError("npy output needs an output directory")
+    return WRITERS[output_format](path)